@@ -0,0 +1,80 @@
+import fnmatch
+import json
+import logging
+import os
+from renderer import extract_date
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+class BackgroundRules:
+    """
+    Picks the background image of each track, from a rules file or from a folder of images.
+
+    A rules file is a JSON list of {"image": path, ...conditions}; the first rule whose conditions all hold wins:
+        "pattern": shell pattern the audio file name must match, e.g. "Rabbi Cohen*"
+        "speaker": the text before the date, compared ignoring case
+        "from", "to": first and last date (YYYY-MM-DD) of the tracks the rule is for
+    Relative image paths are relative to the rules file.
+
+    In a folder every image is matched by its name without extension, ignoring case, against in order:
+    the audio file name, its date as YYYY-MM-DD, YYYY-MM, the speaker, and YYYY.
+    Tracks nothing matches keep the default image.
+    """
+    def __init__(self, source):
+        self.source = source
+        self.rules = []
+        self.names = {}  # lower-case image name -> path, for folders
+        if os.path.isdir(source):
+            for name in sorted(os.listdir(source)):
+                stem, extension = os.path.splitext(name)
+                if extension.lower() in IMAGE_EXTENSIONS:
+                    self.names[stem.lower()] = os.path.join(source, name)
+            if not self.names:
+                raise ValueError(f"No images in the backgrounds folder {source}")
+        else:
+            with open(source) as f:
+                self.rules = json.load(f)
+            if not isinstance(self.rules, list):
+                raise ValueError(f"{source} must hold a list of rules")
+            base = os.path.dirname(os.path.abspath(source))
+            for rule in self.rules:
+                if "image" not in rule:
+                    raise ValueError(f"A rule in {source} has no image: {rule}")
+                rule["image"] = os.path.join(base, rule["image"])
+                if not os.path.isfile(rule["image"]):
+                    raise FileNotFoundError(f"No background image at {rule['image']}")
+
+    def _matches(self, rule, file_name, date, speaker):
+        if "pattern" in rule and not fnmatch.fnmatch(file_name, rule["pattern"]):
+            return False
+        if "speaker" in rule and rule["speaker"].lower() != speaker.lower():
+            return False
+        if ("from" in rule or "to" in rule) and date is None:
+            return False
+        if "from" in rule and date < rule["from"]:
+            return False
+        if "to" in rule and date > rule["to"]:
+            return False
+        return True
+
+    def pick(self, file_name, default):
+        '''
+            Returns the background image path for an audio file, or default when no rule or image matches
+        '''
+        DD, MM, YYYY, [speaker, _] = extract_date(file_name)
+        date = f"{YYYY}-{MM}-{DD}" if DD is not None else None
+        if self.names:
+            candidates = [os.path.splitext(file_name)[0]]
+            if date is not None:
+                candidates += [date, f"{YYYY}-{MM}", speaker, YYYY]
+            for candidate in candidates:
+                path = self.names.get(candidate.lower())
+                if path:
+                    return path
+            return default
+        for rule in self.rules:
+            if self._matches(rule, file_name, date, speaker):
+                return rule["image"]
+        return default
@@ -0,0 +1,391 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pipeline import Pipeline
+from instrumentation import span
+from renderer import (prepare_base_image, render_track, encode_outputs, list_audio_files, get_layout,
+                      get_outputs, output_path)
+from embed_artwork import embed_artwork_file
+from render_cache import render_key, settings_fingerprint, image_digest
+from backgrounds import BackgroundRules
+from tag_metadata import get_metadata_index, metadata_name
+from catalog import record_track, resolve_catalog, SHARED_CATALOG
+from naming import NameTemplate, find_collisions, collision_message, get_file_indexes
+
+logger = logging.getLogger(__name__)
+
+# Memory the prepared base images may use together, one 3000px template is about 26 MB
+DEFAULT_TEMPLATE_MEGABYTES = 256
+
+def default_render_workers():
+    return max(1, (os.cpu_count() or 2) - 1)
+
+def write_file(path, content):
+    '''
+        Writes next to the final file and renames, so a stopped run never leaves a truncated image
+    '''
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+def write_track(track):
+    '''
+        Writes every encoded output of a track and embeds the one marked for embedding
+    '''
+    artworks = track.pop("artworks")
+    with span("save"):
+        for output, artwork in artworks:
+            write_file(track["artwork_paths"][output["name"]], artwork)
+    track["status"] = "written"
+    embedded = next(((output, artwork) for output, artwork in artworks if output.get("embed")), None)
+    if embedded:
+        output, artwork = embedded
+        with span("tag_embed"):
+            track["status"] = embed_artwork_file(track["audio_path"], artwork, output.get("format", "PNG"))
+        if track.get("from_tags"):
+            get_metadata_index().refresh(track["audio_path"])
+    record_track(track, artworks)
+    return track
+
+class TemplateCache:
+    """
+    Prepared base images keyed by image file and image settings, shared by the folders and tracks using them.
+    The least recently used templates are dropped once together they take more than max_bytes.
+    A template being prepared by one worker is waited for by the others rather than prepared twice,
+    so tracks that share an image decode and crop it once in whatever order they arrive.
+    """
+    def __init__(self, max_bytes=DEFAULT_TEMPLATE_MEGABYTES * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.templates = OrderedDict()  # key -> (base image, image_digest of it, bytes)
+        self.bytes = 0
+        self.preparing = {}  # key -> Event set once the template is ready or failed
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, data):
+        '''
+            Returns (base image, image_digest of it), preparing the base the first time
+        '''
+        image_path = data["image_path"]
+        key = (image_path, os.stat(image_path).st_mtime_ns, data["darkness"], data["aspect_ratio"],
+               get_outputs(data)[0]["size"])
+        while True:
+            with self.lock:
+                if key in self.templates:
+                    self.templates.move_to_end(key)
+                    self.hits += 1
+                    base_image, digest, _ = self.templates[key]
+                    return base_image, digest
+                ready = self.preparing.get(key)
+                if ready is None:
+                    ready = self.preparing[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another worker is preparing it; if that failed, the loop prepares it here
+            ready.wait()
+        try:
+            base_image = prepare_batch_base(data)
+            digest = image_digest(base_image)
+            with self.lock:
+                size = base_image.width * base_image.height * len(base_image.getbands())
+                self.templates[key] = (base_image, digest, size)
+                self.bytes += size
+                # The newest template is always kept, even when it alone is over the budget
+                while self.bytes > self.max_bytes and len(self.templates) > 1:
+                    _, (_, _, evicted) = self.templates.popitem(last=False)
+                    self.bytes -= evicted
+            return base_image, digest
+        finally:
+            with self.lock:
+                del self.preparing[key]
+            ready.set()
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.templates), "bytes": self.bytes}
+
+def make_job(data, base_image=None, render_cache=None, base_digest=None, templates=None, catalog=SHARED_CATALOG,
+             create_folders=True):
+    '''
+        Returns what the pipeline stages need to render one folder
+        Pass base_image (from prepare_batch_base) to reuse one prepared for an earlier run with the same settings,
+        and its image_digest as base_digest if it is already known
+        With data["backgrounds"] (a rules file or a folder of images) tracks can use different images,
+        their bases come from templates (a TemplateCache), which a new one is made for if not given
+        Written and failed tracks are recorded in catalog (a catalog.Catalog), the shared one by default, None for none
+        Dry runs pass create_folders=False, so the output folders are not made
+    '''
+    if create_folders:
+        prepare_output_folders(data)
+    backgrounds = BackgroundRules(data["backgrounds"]) if data.get("backgrounds") else None
+    if backgrounds is not None and templates is None:
+        templates = TemplateCache()
+    if render_cache is not None and data["bottom_bar"]["color"] == "random":
+        # Every track gets its own colour, a cached render would repeat another track's one
+        render_cache = None
+    if base_image is None:
+        if templates is not None:
+            base_image, base_digest = templates.get(data)
+        else:
+            base_image = prepare_batch_base(data)
+    return {
+        "data": data,
+        "base_image": base_image,
+        "layout": get_layout(base_image.size),
+        "outputs": get_outputs(data),
+        "render_cache": render_cache,
+        "fingerprint": settings_fingerprint(data, base_image, base_digest),
+        "backgrounds": backgrounds,
+        "templates": templates,
+        "fingerprints": {},  # image path -> fingerprint, for tracks with their own background
+        "catalog": resolve_catalog(catalog),
+    }
+
+def track_base(job, track):
+    '''
+        Returns the base image and render cache fingerprint of a track
+        They are the job's unless the track has its own background image
+    '''
+    image_path = track.get("image_path")
+    if image_path is None or image_path == job["data"]["image_path"]:
+        return job["base_image"], job["fingerprint"]
+    data = {**job["data"], "image_path": image_path}
+    base_image, digest = job["templates"].get(data)
+    fingerprint = job["fingerprints"].get(image_path)
+    if fingerprint is None:
+        fingerprint = job["fingerprints"][image_path] = settings_fingerprint(data, base_image, digest)
+    return base_image, fingerprint
+
+def track_render_keys(job, track, fingerprint=None):
+    '''
+        Returns the render cache key of every output of a track, None for each when its name has no date
+    '''
+    if fingerprint is None:
+        fingerprint = track_base(job, track)[1]
+    data = job["data"]
+    fonts = (data["title"]["font_family"], data["bottom_bar"]["font_family"])
+    return [render_key(fingerprint, track["name"], output, fonts) for output in job["outputs"]]
+
+def render_or_load(job, track):
+    '''
+        Renders the track, or takes every output from the render cache when all of them are there
+    '''
+    render_cache = job["render_cache"]
+    base_image, fingerprint = track_base(job, track)
+    # Kept for the catalog, to tell which tracks were rendered with older settings
+    track["style"] = fingerprint
+    if render_cache is not None:
+        track["cache_keys"] = track_render_keys(job, track, fingerprint)
+        if all(track["cache_keys"]):
+            cached = []
+            for key in track["cache_keys"]:
+                content = render_cache.get(key)
+                if content is None:
+                    break
+                cached.append(content)
+            else:
+                track["artworks"] = list(zip(job["outputs"], cached))
+                return track
+    track["image"] = render_track(job["data"], track["name"], base_image, job["layout"])
+    return track
+
+def encode_and_store(job, track):
+    '''
+        Encodes a rendered track and adds the result to the render cache, cache hits pass through
+    '''
+    if "artworks" in track:
+        return track
+    with span("encode"):
+        track["artworks"] = encode_outputs(track.pop("image"), job["outputs"])
+    if job["render_cache"] is not None and all(track["cache_keys"]):
+        for key, (output, artwork) in zip(track["cache_keys"], track["artworks"]):
+            job["render_cache"].put(key, artwork)
+    return track
+
+def process_track(job, track):
+    '''
+        Renders, encodes and writes one track on the calling thread, for callers that handle a few files at a time
+    '''
+    render_or_load(job, track)
+    encode_and_store(job, track)
+    return write_track(track)
+
+def prepare_batch_base(data):
+    '''
+        Prepares the base image at the largest output size
+    '''
+    largest = get_outputs(data)[0]["size"]
+    return prepare_base_image(data, get_layout((largest, largest)))
+
+def build_track_pipeline(render_workers=None, encode_workers=None, write_workers=2, queue_size=8):
+    '''
+        Builds the render -> encode -> embed pipeline
+        Every item is a dict describing one track, each stage adds to it and drops what the next stage no longer needs
+        track["job"] (from make_job) holds the settings and base image, so tracks of several folders can share workers
+    '''
+    render_workers = render_workers or default_render_workers()
+    encode_workers = encode_workers or max(1, render_workers // 2)
+
+    def render(track):
+        return render_or_load(track["job"], track)
+
+    def encode(track):
+        return encode_and_store(track["job"], track)
+
+    return Pipeline([
+        ("render", render, render_workers),
+        ("encode", encode, encode_workers),
+        ("write", write_track, write_workers),
+    ], queue_size=queue_size)
+
+def plan_tracks(data, files=None, job=None):
+    '''
+        Returns one track item per audio file in the folder
+        track["name"] is what the title and date are read from: the file name, or with data["title"]["from_tags"]
+        a name built from the title, artist and date tags of the file
+        With per-track backgrounds in the job, every track also names its background image
+        Artwork is named by data["naming"] (see naming.NameTemplate), compiled once for all tracks
+    '''
+    folder = data["audio_folder"]
+    files = files if files is not None else list_audio_files(folder)
+    outputs = get_outputs(data)
+    template = NameTemplate(data.get("naming"))
+    # Numbered over the whole folder, so a file keeps its number when processed on its own or after others arrive
+    positions = get_file_indexes().assign(folder, list_audio_files(folder)) if template.uses_index else {}
+    backgrounds = job["backgrounds"] if job else None
+    from_tags = bool(data["title"].get("from_tags"))
+    metadata = {}
+    if from_tags:
+        with span("tag_read"):
+            metadata = get_metadata_index().get_many([os.path.join(folder, file) for file in files])
+    tracks = []
+    for file in files:
+        audio_path = os.path.join(folder, file)
+        name = metadata_name(file, metadata[audio_path]) if from_tags else file
+        stem = template.stem(file, name, positions.get(file))
+        track = {
+            "file": file,
+            "name": name,
+            "audio_path": audio_path,
+            "artwork_paths": {output["name"]: output_path(folder, file, output, stem) for output in outputs},
+            "job": job,
+            "from_tags": from_tags,
+        }
+        if backgrounds is not None:
+            track["image_path"] = backgrounds.pick(track["name"], data["image_path"])
+        tracks.append(track)
+    return tracks
+
+def output_collisions(data, tracks, files=None):
+    '''
+        Returns {artwork path: [audio files]} for the artwork files of the planned tracks that another track writes too
+        When only some files are planned, the rest of the folder is planned as well, a new song.m4a must not
+        overwrite the artwork of the song.mp3 next to it
+    '''
+    if files is None:
+        return find_collisions(tracks)
+    planned = {track["file"] for track in tracks}
+    return {path: writers for path, writers in find_collisions(plan_tracks(data)).items()
+            if planned.intersection(writers)}
+
+def check_collisions(data, tracks, files=None):
+    '''
+        Raises ValueError when two tracks would write the same artwork file, before anything is rendered
+    '''
+    collisions = output_collisions(data, tracks, files)
+    if collisions:
+        raise ValueError(collision_message(collisions))
+
+def prepare_output_folders(data):
+    for output in get_outputs(data):
+        os.makedirs(os.path.dirname(output_path(data["audio_folder"], "track", output)), exist_ok=True)
+
+def new_summary(tracks=0):
+    return {"tracks": tracks, "embedded": 0, "rewritten": 0, "unchanged": 0, "written": 0, "failed": 0,
+            "errors": [], "rewritten_files": []}
+
+def count_result(summary, track):
+    summary[track["status"] or "failed"] += 1
+    if track["status"] == "rewritten":
+        summary["rewritten_files"].append(track["file"])
+
+def count_error(summary, track, stage, error):
+    summary["failed"] += 1
+    summary["errors"].append({"file": track["file"], "stage": stage, "error": str(error)})
+
+def finish_summary(summary, cancel_event, started):
+    summary["cancelled"] = bool(cancel_event is not None and cancel_event.is_set())
+    summary["skipped"] = (summary["tracks"] - summary["embedded"] - summary["rewritten"] - summary["unchanged"]
+                          - summary["written"] - summary["failed"])
+    summary["elapsed"] = time.perf_counter() - started
+    return summary
+
+def run_batch(data, files=None, cancel_event=None, on_track_done=None, on_track_error=None, render_workers=None,
+              base_image=None, render_cache=None, catalog=SHARED_CATALOG):
+    '''
+        Renders and embeds the artwork for every audio file in data["audio_folder"]
+        Pass base_image (from prepare_batch_base) to reuse one prepared for an earlier run with the same settings
+        and render_cache (a RenderCache) to reuse artwork rendered for any earlier folder
+        catalog records the tracks, see make_job
+        Returns a summary with per-track results and the pipeline counters
+    '''
+    started = time.perf_counter()
+    job = make_job(data, base_image, render_cache, catalog=catalog)
+    tracks = plan_tracks(data, files, job)
+    check_collisions(data, tracks, files)
+    pipeline = build_track_pipeline(render_workers=render_workers)
+
+    summary = new_summary(len(tracks))
+    # The callbacks run on the pipeline's worker threads
+    summary_lock = threading.Lock()
+
+    def on_result(track):
+        with summary_lock:
+            count_result(summary, track)
+        if on_track_done:
+            on_track_done(track)
+
+    def on_error(stage, track, error):
+        with summary_lock:
+            count_error(summary, track, stage, error)
+        record_track(track, error=f"{stage}: {error}")
+        logger.warning("Error processing %s in %s: %s", track["file"], stage, error)
+        if on_track_error:
+            on_track_error(track, stage, error)
+
+    pipeline.run(tracks, on_result=on_result, on_error=on_error, cancel_event=cancel_event)
+    get_metadata_index().save()
+    finish_summary(summary, cancel_event, started)
+    summary["stages"] = pipeline.get_stats()
+    if render_cache is not None:
+        summary["render_cache"] = render_cache.stats()
+    if job["templates"] is not None:
+        summary["templates"] = job["templates"].stats()
+    return summary
+
+def print_summary(summary):
+    print(f"Processed {summary['tracks']} tracks in {summary['elapsed']:.2f}s: "
+          f"{summary['embedded'] + summary['rewritten']} embedded, {summary['unchanged']} unchanged, "
+          f"{summary['failed']} failed")
+    if summary["rewritten_files"]:
+        # These had no room left in their tag, the next run with new artwork can update them in place
+        print(f"{len(summary['rewritten_files'])} files were rewritten in full to make room for the cover:")
+        for file in sorted(summary["rewritten_files"]):
+            print(f"  {file}")
+    if summary["cancelled"]:
+        print(f"Cancelled, {summary['skipped']} tracks were not started")
+    if "render_cache" in summary:
+        cache = summary["render_cache"]
+        print(f"Render cache: {cache['hits']} hits, {cache['misses']} misses, "
+              f"{cache['entries']} entries using {cache['bytes'] / 1024 / 1024:.1f} MB")
+    if "templates" in summary:
+        templates = summary["templates"]
+        print(f"Background templates: {templates['misses']} prepared, {templates['hits']} reused, "
+              f"{templates['entries']} kept using {templates['bytes'] / 1024 / 1024:.1f} MB")
+    for name, stats in summary["stages"].items():
+        print(f"  {name:<8} workers={stats['workers']} processed={stats['processed']} failed={stats['failed']} "
+              f"busy={stats['busy_seconds']:.2f}s throughput={stats['throughput']:.1f}/s max_queue={stats['max_queue_depth']}")
@@ -0,0 +1,266 @@
+"""
+Benchmarks for the rendering and tagging hot paths.
+
+Generates synthetic audio folders (silent MP3/M4A files with dated names) and source
+images of several sizes, times the hot functions at 10, 100 and 1,000 tracks and
+compares the results with a saved baseline.
+
+Usage:
+    python benchmark.py --font /path/to/font.ttf --save-baseline
+    python benchmark.py --font /path/to/font.ttf            # compare with the baseline
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from PIL import Image, ImageDraw
+import renderer
+from renderer import (IMAGE_WIDTH, prepare_base_image, apply_image_modifications, wrap_text,
+                      place_text_on_image, list_audio_files)
+from embed_artwork import embed_artwork
+from batch_runner import run_batch
+
+DEFAULT_TRACK_COUNTS = [10, 100, 1000]
+DEFAULT_IMAGE_SIZES = ["800x600", "2000x1500", "4000x3000"]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+SEED = 1234
+
+WORDS = ["grace", "faith", "morning", "service", "the", "of", "and", "hope", "sunday", "evening",
+         "prayer", "gospel", "walking", "in", "light", "chapter", "study", "youth", "special", "message"]
+
+def write_silent_mp3(path, frames=10):
+    '''
+        Writes a silent MPEG-1 Layer III file (128 kbps, 44.1 kHz, 417 byte frames)
+    '''
+    header = bytes([0xFF, 0xFB, 0x90, 0x64])
+    with open(path, "wb") as f:
+        f.write((header + bytes(413)) * frames)
+
+def _atom(name, payload):
+    return struct.pack(">I4s", 8 + len(payload), name) + payload
+
+def _full_atom(name, version_flags, payload):
+    return _atom(name, struct.pack(">I", version_flags) + payload)
+
+def write_silent_m4a(path):
+    '''
+        Writes the smallest M4A that mutagen accepts: one empty AAC track and no samples
+    '''
+    ftyp = _atom(b"ftyp", b"M4A \x00\x00\x02\x00M4A mp42isom")
+    matrix = struct.pack(">9I", 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+    mvhd = _full_atom(b"mvhd", 0, struct.pack(">IIII", 0, 0, 44100, 0) + b"\x00\x01\x00\x00\x01\x00"
+                      + bytes(10) + matrix + bytes(24) + struct.pack(">I", 2))
+    mdhd = _full_atom(b"mdhd", 0, struct.pack(">IIIIHH", 0, 0, 44100, 0, 0x55c4, 0))
+    hdlr = _full_atom(b"hdlr", 0, b"\x00\x00\x00\x00soun" + bytes(12) + b"\x00")
+    esds = _full_atom(b"esds", 0, bytes([3, 25, 0, 1, 0, 4, 17, 0x40, 0x15, 0, 0, 0, 0, 0, 0xfa, 0,
+                                         0, 0, 0xfa, 0, 5, 2, 0x12, 0x10, 6, 1, 2]))
+    mp4a = _atom(b"mp4a", bytes(6) + struct.pack(">H", 1) + bytes(8)
+                 + struct.pack(">HHHHI", 2, 16, 0, 0, 44100 << 16) + esds)
+    stbl = _atom(b"stbl", _full_atom(b"stsd", 0, struct.pack(">I", 1) + mp4a)
+                 + _full_atom(b"stts", 0, struct.pack(">I", 0))
+                 + _full_atom(b"stsc", 0, struct.pack(">I", 0))
+                 + _full_atom(b"stsz", 0, struct.pack(">II", 0, 0))
+                 + _full_atom(b"stco", 0, struct.pack(">I", 0)))
+    minf = _atom(b"minf", _full_atom(b"smhd", 0, bytes(4)) + stbl)
+    trak = _atom(b"trak", _full_atom(b"tkhd", 7, bytes(80)) + _atom(b"mdia", mdhd + hdlr + minf))
+    with open(path, "wb") as f:
+        f.write(ftyp + _atom(b"moov", mvhd + trak) + _atom(b"mdat", bytes(16)))
+
+def make_title(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 12))).title()
+
+def make_audio_folder(folder, count, seed=SEED):
+    '''
+        Fills folder with count silent tracks named "<speaker> - YYYY-MM-DD - <title>"
+        Every fourth track is an M4A, the rest are MP3s
+    '''
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    for i in range(count):
+        date = f"{2000 + i // 336:04d}-{i // 28 % 12 + 1:02d}-{i % 28 + 1:02d}"
+        name = f"Speaker {rng.randint(1, 9)} - {date} - {make_title(rng)}"
+        if i % 4 == 3:
+            write_silent_m4a(os.path.join(folder, f"{name}.m4a"))
+        else:
+            write_silent_mp3(os.path.join(folder, f"{name}.mp3"))
+
+def make_source_image(path, size, seed=SEED):
+    '''
+        Writes a JPEG with a gradient and random shapes, so it compresses like a photo rather than a flat color
+    '''
+    rng = random.Random(seed)
+    width, height = size
+    image = Image.linear_gradient("L").resize(size).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for _ in range(200):
+        x, y = rng.randrange(width), rng.randrange(height)
+        w, h = rng.randrange(width // 4 + 1), rng.randrange(height // 4 + 1)
+        color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        draw.ellipse((x, y, x + w, y + h), fill=color)
+    image.save(path, quality=90)
+
+def make_settings(audio_folder, image_path, font_path):
+    return {
+        "audio_folder": audio_folder,
+        "image_path": image_path,
+        "title": {
+            "color": "#ffffff",
+            "position": {"type": "preset", "preset_id": 5, "position_name": "middle-center", "row": 1, "col": 1},
+            "font_family": font_path,
+            "font_size": 50,
+            "word_spacing": 1.0,
+            "casing": "Normal",
+        },
+        "bottom_bar": {
+            "color": "#ff8000",
+            "font_family": font_path,
+            "font_size": 67,
+            "word_spacing": 1.0,
+            "casing": "Normal",
+        },
+        "darkness": 0.5,
+        "aspect_ratio": "crop",
+    }
+
+def find_font():
+    from font_mapping import get_fonts_mapping
+    fonts = get_fonts_mapping()
+    return next(iter(sorted(fonts.values())), None)
+
+def timed(func, repeat=1):
+    '''
+        Runs func repeat times and returns the total seconds, output of the function is discarded
+    '''
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return time.perf_counter() - start
+
+def record(results, name, seconds, ops):
+    results[name] = {"seconds": seconds, "ops": ops, "per_op_ms": seconds / ops * 1000 if ops else 0.0}
+    print(f"{name:<40}{ops:>7} ops {seconds:>9.3f}s {results[name]['per_op_ms']:>10.3f} ms/op")
+
+def run_benchmarks(track_counts, image_sizes, font_path, workdir):
+    results = {}
+
+    try:
+        from font_mapping import get_fonts_mapping
+        record(results, "get_fonts_mapping", timed(get_fonts_mapping), 1)
+    except ImportError as e:
+        print(f"Skipping get_fonts_mapping: {e}")
+
+    for size_text in image_sizes:
+        size = tuple(int(v) for v in size_text.split("x"))
+        image_path = os.path.join(workdir, f"source_{size_text}.jpg")
+        make_source_image(image_path, size)
+        data = make_settings(workdir, image_path, font_path)
+        record(results, f"apply_image_modifications[{size_text}]", timed(lambda: apply_image_modifications(data), 3), 3)
+
+    image_path = os.path.join(workdir, f"source_{image_sizes[0]}.jpg")
+    for count in track_counts:
+        folder = os.path.join(workdir, f"tracks_{count}")
+        make_audio_folder(folder, count)
+        data = make_settings(folder, image_path, font_path)
+        files = list_audio_files(folder)
+        titles = [os.path.splitext(file)[0].split(" - ", 2)[-1] for file in files]
+        base_image = prepare_base_image(data)
+
+        def modify_all():
+            for _ in files:
+                apply_image_modifications(data, base_image)
+        record(results, f"apply_image_modifications[base]@{count}", timed(modify_all), count)
+
+        def wrap_all():
+            # Start cold, otherwise every run after the first only measures the text size cache
+            renderer._text_sizes.clear()
+            return [wrap_text(title, font_path, data["title"]["font_size"], IMAGE_WIDTH) for title in titles]
+        record(results, f"wrap_text@{count}", timed(wrap_all), count)
+
+        wrapped = wrap_all()
+        def place_all():
+            for lines in wrapped:
+                place_text_on_image(data, lines, [], base_image.copy())
+        record(results, f"place_text_on_image@{count}", timed(place_all), count)
+
+        # Without a catalog, the synthetic tracks stay out of the user's one and its writes out of the timings
+        record(results, f"run_batch@{count}", timed(lambda: run_batch(data, catalog=None)), count)
+
+        # Rewrite the audio files without tags so the artwork left by run_batch has to be embedded again
+        make_audio_folder(folder, count)
+        record(results, f"embed_artwork@{count}", timed(lambda: embed_artwork(folder)), count)
+        # Every cover is now in place, so this measures the skip-if-identical path
+        record(results, f"embed_artwork[unchanged]@{count}", timed(lambda: embed_artwork(folder)), count)
+        shutil.rmtree(folder)
+    return results
+
+def compare(results, baseline, tolerance):
+    '''
+        Returns the names of benchmarks that got slower than the baseline by more than tolerance
+    '''
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous or not previous["per_op_ms"]:
+            continue
+        change = current["per_op_ms"] / previous["per_op_ms"] - 1
+        marker = "REGRESSION" if change > tolerance else ""
+        print(f"{name:<40}{previous['per_op_ms']:>10.3f} -> {current['per_op_ms']:>10.3f} ms/op {change:>+8.1%} {marker}")
+        if change > tolerance:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the rendering and tagging hot paths")
+    parser.add_argument("--font", help="TTF/OTF font used for rendering (default: first font found on the system)")
+    parser.add_argument("--tracks", type=int, nargs="+", default=DEFAULT_TRACK_COUNTS, help="folder sizes to benchmark")
+    parser.add_argument("--image-sizes", nargs="+", default=DEFAULT_IMAGE_SIZES, help="source image sizes, e.g. 800x600")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file to compare with or save to")
+    parser.add_argument("--save-baseline", action="store_true", help="save the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown before failing (default: 0.15)")
+    args = parser.parse_args(argv)
+
+    font_path = args.font or find_font()
+    if not font_path:
+        print("No font found, pass one with --font")
+        return 2
+
+    workdir = tempfile.mkdtemp(prefix="audio_imager_bench_")
+    try:
+        results = run_benchmarks(args.tracks, args.image_sizes, font_path, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "font": os.path.basename(font_path),
+        "results": results,
+    }
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(output, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline first")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} benchmarks regressed by more than {args.tolerance:.0%}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,17 +4,19 @@ from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QFont, QColor
 from ColorPicker import ColorPicker
 from font_style_selector import FontStyleSelector
+from live_preview import LivePreview
 import random
 
 class BottomBarFormatter(QDialog):
     # Signal to emit the data when OK is clicked
     dataReady = pyqtSignal(dict)
     
-    def __init__(self, parent=None, cached_data=None):
+    def __init__(self, parent=None, cached_data=None, preview_data=None):
         super().__init__(parent)
         self.setWindowTitle("Bottom Bar Formatter")
-        self.setMinimumSize(900, 700)  # Set a reasonable minimum size
+        self.setMinimumSize(1150, 700)  # Set a reasonable minimum size
         self.cached_data = cached_data
+        self.preview_data = preview_data
         self.initUI()
         
     def initUI(self):
@@ -68,8 +70,29 @@ class BottomBarFormatter(QDialog):
         self.color_picker = ColorPicker(cached_data=self.cached_data)
         components_layout.addWidget(self.color_picker)
         
-        # Add the components frame to main layout
-        main_layout.addWidget(components_frame)
+        # Live preview column, rendered by the same code as the batch
+        preview_column = QFrame()
+        preview_column.setFrameStyle(QFrame.StyledPanel)
+        preview_column.setStyleSheet("""
+            QFrame {
+                background-color: #f8f8f8;
+                border: 1px solid #ddd;
+                border-radius: 8px;
+            }
+        """)
+        preview_layout = QVBoxLayout(preview_column)
+        preview_label = QLabel("Live Preview")
+        preview_label.setFont(QFont("Arial", 12, QFont.Bold))
+        preview_layout.addWidget(preview_label)
+        self.live_preview = LivePreview(preview_data=self.preview_data)
+        preview_layout.addWidget(self.live_preview)
+        preview_layout.addStretch()
+
+        # Add the components frame and the preview side by side
+        columns_layout = QHBoxLayout()
+        columns_layout.addWidget(components_frame)
+        columns_layout.addWidget(preview_column)
+        main_layout.addLayout(columns_layout)
         
         # Create button layout
         button_layout = QHBoxLayout()
@@ -130,6 +153,22 @@ class BottomBarFormatter(QDialog):
         # Apply cached settings
         if self.cached_data:
             self.apply_cached_settings()
+
+        # Re-render the preview whenever a setting changes
+        self.color_picker.colorChanged.connect(self.update_preview)
+        self.random_color_checkbox.toggled.connect(self.update_preview)
+        self.font_selector.fontChanged.connect(self.update_preview)
+        self.update_preview()
+
+    def update_preview(self, *args):
+        """Send the current settings to the live preview"""
+        self.live_preview.update_settings(bottom_bar=self.get_all_data())
+
+    def done(self, result):
+        """Stop the preview workers before the dialog closes"""
+        self.live_preview.shutdown()
+        self.font_selector.shutdown()
+        super().done(result)
     
     def apply_cached_settings(self):
         """Apply cached settings to UI elements"""
@@ -153,11 +192,8 @@ class BottomBarFormatter(QDialog):
             
         # Set font settings if available
         if "font_family" in self.cached_data:
-            # Find the family in the combobox and select it
-            index = self.font_selector.family_combo.findText(self.cached_data["font_family"])
-            if index >= 0:
-                self.font_selector.family_combo.setCurrentIndex(index)
-                print(f"Set font family to index {index}: {self.cached_data['font_family']}")
+            # The saved value is the font file, select its family and bold state
+            self.font_selector.select_font_path(self.cached_data["font_family"])
         
         if "font_size" in self.cached_data:
             size = self.cached_data["font_size"]
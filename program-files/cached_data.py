@@ -2,6 +2,9 @@ import json
 import os
 import stat
 import platform
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Define the cache file name - hidden on Windows with dot prefix
 CACHE_FILE = ".cache.json"
@@ -21,9 +24,9 @@ def make_file_hidden(file_path):
             import ctypes
             # Set file as hidden on Windows
             ctypes.windll.kernel32.SetFileAttributesW(file_path, 2)  # 2 = FILE_ATTRIBUTE_HIDDEN
-            print(f"Successfully made file hidden: {file_path}")
+            logger.debug("Successfully made file hidden: %s", file_path)
         except Exception as e:
-            print(f"Warning: Failed to make file hidden: {e}")
+            logger.warning("Failed to make file hidden: %s", e)
     # On Unix/Linux/Mac, files starting with '.' are already hidden by convention
 
 def load_cache(folder_path):
@@ -32,42 +35,42 @@ def load_cache(folder_path):
     Returns an empty dict if the file doesn't exist or can't be read
     """
     cache_path = get_cache_path(folder_path)
-    print(f"Loading cache from: {cache_path}")
+    logger.debug("Loading cache from: %s", cache_path)
     
     # Check for the main cache file
     if os.path.exists(cache_path):
         try:
             with open(cache_path, 'r') as f:
                 data = json.load(f)
-                print(f"Successfully loaded cache data: {data}")
+                logger.debug("Successfully loaded cache data: %s", data)
                 return data
         except Exception as e:
-            print(f"Error loading main cache file: {e}")
+            logger.error("Error loading main cache file: %s", e)
             # Continue to check for temp file
     
     # If main file doesn't exist or couldn't be read, try the temp file
     temp_cache_path = cache_path + ".tmp"
     if os.path.exists(temp_cache_path):
-        print(f"Main cache file not found, trying temp file: {temp_cache_path}")
+        logger.debug("Main cache file not found, trying temp file: %s", temp_cache_path)
         try:
             with open(temp_cache_path, 'r') as f:
                 data = json.load(f)
-                print(f"Successfully loaded cache data from temp file: {data}")
+                logger.debug("Successfully loaded cache data from temp file: %s", data)
                 
                 # Try to recover by saving this data to the main cache file
                 try:
                     with open(cache_path, 'w') as main_f:
                         json.dump(data, main_f, indent=2)
-                    print("Recovered cache data by copying from temp file to main file")
+                    logger.debug("Recovered cache data by copying from temp file to main file")
                 except Exception as e:
-                    print(f"Could not recover cache file: {e}")
+                    logger.warning("Could not recover cache file: %s", e)
                 
                 return data
         except Exception as e:
-            print(f"Error loading temp cache file: {e}")
+            logger.error("Error loading temp cache file: %s", e)
     
     # If we get here, neither file could be read successfully
-    print("No valid cache file found, returning empty dict")
+    logger.debug("No valid cache file found, returning empty dict")
     return {}
 
 def save_cache(folder_path, data):
@@ -79,8 +82,8 @@ def save_cache(folder_path, data):
         os.makedirs(folder_path, exist_ok=True)  # Ensure folder exists
         cache_path = get_cache_path(folder_path)
         is_new_file = not os.path.exists(cache_path)
-        print(f"Saving cache to: {cache_path}")
-        print(f"Cache data: {data}")
+        logger.debug("Saving cache to: %s", cache_path)
+        logger.debug("Cache data: %s", data)
         
         # First try to write to a temporary file, then rename it
         # This is more atomic and can prevent corruption
@@ -95,43 +98,43 @@ def save_cache(folder_path, data):
             try:
                 os.remove(cache_path)
             except (IOError, PermissionError) as e:
-                print(f"Warning: Could not remove old cache file: {e}")
+                logger.warning("Could not remove old cache file: %s", e)
         
         # Rename the temporary file to the actual cache file
         try:
             os.rename(temp_path, cache_path)
-            print(f"Successfully renamed temp file to {cache_path}")
+            logger.debug("Successfully renamed temp file to %s", cache_path)
         except (IOError, PermissionError) as e:
-            print(f"Error renaming temp file: {e}")
+            logger.error("Error renaming temp file: %s", e)
             # Try copying content instead if rename fails
             try:
                 with open(temp_path, 'r') as src, open(cache_path, 'w') as dst:
                     dst.write(src.read())
                 os.remove(temp_path)  # Remove temp file after copying
-                print(f"Successfully copied content to {cache_path}")
+                logger.debug("Successfully copied content to %s", cache_path)
             except Exception as e2:
-                print(f"Error copying content to final file: {e2}")
+                logger.error("Error copying content to final file: %s", e2)
                 return False
         
         # Make the file hidden if it's newly created
         if is_new_file:
             make_file_hidden(cache_path)
         
-        print(f"Successfully saved cache to {cache_path}")
+        logger.debug("Successfully saved cache to %s", cache_path)
         return True
     except Exception as e:
-        print(f"Error saving cache: {e}")
+        logger.error("Error saving cache: %s", e)
         # Try an alternative approach - write directly to the file
         try:
             if not os.path.exists(folder_path):
-                print(f"Creating directory: {folder_path}")
+                logger.debug("Creating directory: %s", folder_path)
                 os.makedirs(folder_path, exist_ok=True)
                 
             cache_path = get_cache_path(folder_path)
-            print(f"Trying direct write to: {cache_path}")
+            logger.debug("Trying direct write to: %s", cache_path)
             with open(cache_path, 'w') as f:
                 json.dump(data, f, indent=2)
-            print(f"Alternative save method succeeded for {cache_path}")
+            logger.debug("Alternative save method succeeded for %s", cache_path)
             
             # Also try to remove any lingering temp file
             try:
@@ -142,7 +145,7 @@ def save_cache(folder_path, data):
                 
             return True
         except Exception as e2:
-            print(f"Alternative save method also failed: {e2}")
+            logger.error("Alternative save method also failed: %s", e2)
             return False
 
 def get_component_cache(folder_path, component_name, default_values=None):
@@ -154,17 +157,17 @@ def get_component_cache(folder_path, component_name, default_values=None):
     
     # Verify we have data for this component
     if component_name not in cache:
-        print(f"No cache data found for component {component_name}")
+        logger.debug("No cache data found for component %s", component_name)
         return default_values or {}
     
     result = cache.get(component_name, default_values or {})
     
     # Verify data structure
     if not isinstance(result, dict):
-        print(f"Warning: Cache for {component_name} is not a dictionary. Got {type(result)}")
+        logger.warning("Cache for %s is not a dictionary. Got %s", component_name, type(result))
         return default_values or {}
     
-    print(f"Got component cache for {component_name}: {result}")
+    logger.debug("Got component cache for %s: %s", component_name, result)
     
     # Special validation for ImageTitleFormatter to ensure font_size is properly handled
     if component_name == "ImageTitleFormatter" and "font_size" in result:
@@ -174,9 +177,9 @@ def get_component_cache(folder_path, component_name, default_values=None):
                 result["font_size"] = int(float(result["font_size"]))
             else:
                 result["font_size"] = int(result["font_size"])
-            print(f"Validated font_size for {component_name}: {result['font_size']}")
+            logger.debug("Validated font_size for %s: %s", component_name, result['font_size'])
         except (ValueError, TypeError) as e:
-            print(f"Error validating font_size: {e}")
+            logger.error("Error validating font_size: %s", e)
             
     return result
 
@@ -186,6 +189,65 @@ def update_component_cache(folder_path, component_name, component_data):
     """
     cache = load_cache(folder_path)
     cache[component_name] = component_data
-    print(f"Updating cache for {component_name} with: {component_data}")
+    logger.debug("Updating cache for %s with: %s", component_name, component_data)
     return save_cache(folder_path, cache)
 
+
+def get_cache_dir():
+    """
+    Returns the first writable cache directory for the app, creating it if needed
+    """
+    # Get the user's home directory for storing cache
+    user_home = os.path.expanduser("~")
+    # Try alternative cache directories if the default one has permission issues
+    cache_dir_options = [
+        os.path.join(user_home, ".audio_imager"),
+        os.path.join(user_home, "AppData", "Local", "audio_imager") if os.name == 'nt' else os.path.join(user_home, ".config", "audio_imager"),
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+    ]
+
+    # Try to use the first cache directory that we can write to
+    for dir_path in cache_dir_options:
+        try:
+            os.makedirs(dir_path, exist_ok=True)
+            test_file = os.path.join(dir_path, ".test_write")
+            with open(test_file, 'w') as f:
+                f.write("test")
+            os.remove(test_file)
+            return dir_path
+        except (IOError, PermissionError) as e:
+            logger.warning("Cannot use cache directory %s: %s", dir_path, e)
+
+    logger.warning("Could not find a writable cache directory. Caching will be disabled.")
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "temp_cache")
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+def get_saved_settings(folder_path):
+    """
+    Rebuilds the settings the wizard last produced from the cache, for runs without the GUI
+    Raises ValueError naming the first setting that has never been saved
+    """
+    cache = load_cache(folder_path)
+    title = cache.get("ImageTitleFormatter", {})
+    bottom_bar = cache.get("BottomBarFormatter", {})
+    image_selector = cache.get("ImageSelector", {})
+    data = {
+        "audio_folder": cache.get("FolderPickerDialog", {}).get("selected_folder"),
+        "image_path": cache.get("ImagePickerDialog", {}).get("selected_image"),
+        "title": title,
+        "bottom_bar": bottom_bar,
+        "darkness": image_selector.get("darkness_level"),
+        "aspect_ratio": image_selector.get("aspect_ratio_option"),
+        "outputs": cache.get("Outputs", {}).get("outputs"),
+        "naming": cache.get("Outputs", {}).get("naming"),
+        "backgrounds": cache.get("ImagePickerDialog", {}).get("backgrounds"),
+    }
+    required = [("audio_folder", data["audio_folder"]), ("image_path", data["image_path"]),
+                ("title font", title.get("font_family")), ("title position", title.get("position")),
+                ("bottom bar font", bottom_bar.get("font_family")), ("darkness", data["darkness"]),
+                ("aspect ratio", data["aspect_ratio"])]
+    for name, value in required:
+        if value in (None, ""):
+            raise ValueError(f"No saved {name}, run the wizard once to choose it")
+    return data
@@ -0,0 +1,180 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from embed_artwork import artwork_digest
+from renderer import extract_date
+
+logger = logging.getLogger(__name__)
+
+CATALOG_FILE = "catalog.sqlite"
+CATALOG_VERSION = 1
+# Stands for the shared catalog (get_catalog) where a catalog is passed in, None turns recording off
+SHARED_CATALOG = object()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    path TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    file TEXT NOT NULL,
+    date TEXT,
+    speaker TEXT,
+    title TEXT,
+    style TEXT,
+    artwork_hash TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tracks_folder_updated ON tracks(folder, updated);
+CREATE INDEX IF NOT EXISTS tracks_style ON tracks(style);
+CREATE INDEX IF NOT EXISTS tracks_status ON tracks(status);
+CREATE INDEX IF NOT EXISTS tracks_date ON tracks(date);
+"""
+
+# Questions the query subcommand answers, {where} is replaced by the optional folder filter
+QUERIES = {
+    "no-artwork": """
+        SELECT path, status, error, updated FROM tracks
+        WHERE artwork_hash IS NULL {where}
+        ORDER BY path""",
+    # Tracks whose style differs from the one their folder was last rendered with
+    "old-style": """
+        SELECT path, status, style, updated FROM tracks AS track
+        WHERE style IS NOT (SELECT latest.style FROM tracks AS latest WHERE latest.folder = track.folder
+                            AND latest.status != 'failed' ORDER BY latest.updated DESC LIMIT 1) {where}
+        ORDER BY path""",
+    "failed": """
+        SELECT path, error, updated FROM tracks WHERE status = 'failed' {where} ORDER BY path""",
+    "folders": """
+        SELECT folder, COUNT(*) AS tracks, SUM(status = 'failed') AS failed,
+               COUNT(DISTINCT style) AS styles, MAX(updated) AS updated
+        FROM tracks WHERE 1 {where} GROUP BY folder ORDER BY folder""",
+    "search": """
+        SELECT path, date, speaker, title, status FROM tracks
+        WHERE (title LIKE :text OR speaker LIKE :text OR file LIKE :text) {where}
+        ORDER BY date, path""",
+}
+
+class Catalog:
+    """
+    Every track the batch has rendered or failed on, across all folders, in a SQLite file in the cache directory.
+    One row per audio file with its parsed date, speaker and title, the settings fingerprint it was rendered with,
+    the hash of its artwork and the last result, so questions about the library never open an audio file.
+    Safe to use from several pipeline workers at once.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock, self.connection:
+            # WAL keeps the one-row commits of the write workers cheap and lets queries run during a batch
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(SCHEMA)
+            self.connection.execute(f"PRAGMA user_version={CATALOG_VERSION}")
+
+    def record(self, row):
+        '''
+            Adds or replaces the row of a track
+            A failed row only updates the result of a track already in the catalog, the artwork it was given
+            by an earlier run is still there, so its style and hash are kept
+        '''
+        conflict = ("DO UPDATE SET status = excluded.status, error = excluded.error, updated = excluded.updated"
+                    if row["error"] is not None else
+                    "DO UPDATE SET folder = excluded.folder, file = excluded.file, date = excluded.date, "
+                    "speaker = excluded.speaker, title = excluded.title, style = excluded.style, "
+                    "artwork_hash = excluded.artwork_hash, status = excluded.status, error = excluded.error, "
+                    "updated = excluded.updated")
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO tracks (path, folder, file, date, speaker, title, style, artwork_hash, "
+                "status, error, updated) VALUES (:path, :folder, :file, :date, :speaker, :title, :style, "
+                f":artwork_hash, :status, :error, :updated) ON CONFLICT(path) {conflict}", row)
+
+    def query(self, name, folder=None, text=None):
+        '''
+            Runs one of QUERIES and returns the rows as dicts, limited to one folder if given
+        '''
+        where = "AND folder = :folder" if folder else ""
+        parameters = {"folder": os.path.abspath(folder) if folder else None, "text": f"%{text or ''}%"}
+        with self.lock:
+            rows = self.connection.execute(QUERIES[name].format(where=where), parameters).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+def track_row(track, artworks=None, error=None):
+    '''
+        Returns the catalog row of a track item after its artworks were written, or after it failed with error
+    '''
+    DD, MM, YYYY, [speaker, title] = extract_date(track.get("name", track["file"]))
+    artworks = artworks or []
+    embedded = next((artwork for output, artwork in artworks if output.get("embed")), None)
+    if embedded is None and artworks:
+        embedded = artworks[0][1]
+    audio_path = os.path.abspath(track["audio_path"])
+    return {
+        "path": audio_path,
+        "folder": os.path.dirname(audio_path),
+        "file": track["file"],
+        "date": f"{YYYY}-{MM}-{DD}" if DD is not None else None,
+        "speaker": speaker or None,
+        "title": title.strip('"') or None,
+        "style": track.get("style") or (track.get("job") or {}).get("fingerprint"),
+        "artwork_hash": artwork_digest(embedded) if embedded is not None and error is None else None,
+        "status": "failed" if error is not None else track.get("status") or "failed",
+        "error": str(error) if error is not None else None,
+        "updated": time.time(),
+    }
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_catalog():
+    '''
+        Returns the shared catalog in the cache directory, or None when it cannot be opened
+    '''
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                from cached_data import get_cache_dir
+                try:
+                    _catalog = Catalog(os.path.join(get_cache_dir(), CATALOG_FILE))
+                except sqlite3.Error as e:
+                    logger.warning("Could not open the track catalog: %s", e)
+                    return None
+    return _catalog
+
+def resolve_catalog(catalog):
+    return get_catalog() if catalog is SHARED_CATALOG else catalog
+
+def record_track(track, artworks=None, error=None):
+    '''
+        Adds or updates the row of a track in the catalog of its job, a catalog that cannot be written never
+        fails the track. Tracks of a job without a catalog are not recorded
+    '''
+    catalog = (track.get("job") or {}).get("catalog")
+    if catalog is None:
+        return
+    try:
+        catalog.record(track_row(track, artworks, error))
+    except sqlite3.Error as e:
+        logger.warning("Could not update the catalog for %s: %s", track["file"], e)
+
+def print_query(rows):
+    if not rows:
+        print("No tracks")
+        return
+    for row in rows:
+        if "updated" in row and row["updated"] is not None:
+            row["updated"] = time.strftime("%Y-%m-%d %H:%M", time.localtime(row["updated"]))
+        if row.get("style"):
+            row["style"] = row["style"][:12]
+        print("  ".join("" if value is None else str(value) for value in row.values()))
+    print(f"{len(rows)} rows")
@@ -0,0 +1,149 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Innermost Python frames of a thread that is blocked rather than working, their samples are left out
+IDLE_FRAMES = {("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("queue.py", "get"),
+               ("selectors.py", "select")}
+# Functions whose time is spent waiting, left out of the report
+IDLE_FUNCTIONS = {("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("threading.py", "join"),
+                  ("queue.py", "get"), ("selectors.py", "select"),
+                  ("~", "<method 'acquire' of '_thread.lock' objects>"), ("~", "<built-in method time.sleep>")}
+
+def is_idle_function(function):
+    '''
+        Tells if a pstats function key (file, line, name) only waits, such as a lock acquire or the Qt event loop
+    '''
+    file_name, _, name = function
+    return (os.path.basename(file_name), name) in IDLE_FUNCTIONS or name.startswith("<built-in method exec")
+
+class CpuProfiler:
+    """
+    Profiles the calling thread and every thread started while it runs, such as the pipeline workers.
+    Each thread gets its own cProfile profile (before Python 3.12 a profile only sees the thread that enabled it)
+    and the profiles are merged into one pstats file when stopped.
+    A sampling thread also records whole stacks for a collapsed-stack file that flamegraph tools read.
+    Threads blocked on a queue, lock or event are not sampled and waiting functions are left out of the report,
+    so both show the cost of the work rather than of the waits.
+    With include_caller=False the calling thread is not sampled, or profiled where Python allows it: used for the
+    GUI, whose thread spends the batch in the Qt event loop while the workers render
+    """
+    def __init__(self, sample_interval=0.005, include_caller=True):
+        self.sample_interval = sample_interval
+        self.include_caller = include_caller
+        self.profiles = []
+        self.lock = threading.Lock()
+        self.samples = Counter()
+        self.stop_event = threading.Event()
+        self.sampler = None
+        # From 3.12 cProfile uses sys.monitoring, where one profile sees every thread and only one can be enabled
+        self.per_thread = sys.version_info < (3, 12)
+
+    def _new_profile(self):
+        profile = cProfile.Profile()
+        with self.lock:
+            self.profiles.append(profile)
+        return profile
+
+    def _start_thread(self, *args):
+        # Installed with threading.setprofile, so it runs once as the first event of each new thread
+        # and replaces itself with a real profile for that thread
+        self._new_profile().enable()
+
+    def start(self):
+        # Started first so the sampler itself is not profiled
+        self.sampler = threading.Thread(target=self._sample, name="cpu-sampler", daemon=True)
+        self.sampler.start()
+        if self.per_thread:
+            threading.setprofile(self._start_thread)
+        self.caller_id = threading.get_ident()
+        self.main_profile = None
+        # Before 3.12 worker threads have their own profiles, otherwise the one profile is needed for all of them
+        if self.include_caller or not self.per_thread:
+            self.main_profile = self._new_profile()
+            self.main_profile.enable()
+
+    def stop(self):
+        if self.main_profile is not None:
+            self.main_profile.disable()
+        if self.per_thread:
+            threading.setprofile(None)
+        self.stop_event.set()
+        self.sampler.join()
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self.stop_event.wait(self.sample_interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (thread_id == self.caller_id and not self.include_caller):
+                    continue
+                if (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                # Workers of one stage share a name prefix, so their stacks merge in the flamegraph
+                thread_name = names.get(thread_id, "thread").rsplit("-", 1)[0]
+                self.samples[";".join([thread_name] + stack[::-1])] += 1
+
+    def stats(self):
+        '''
+            Returns the merged pstats.Stats of every profiled thread, or None when no Python code ran under them
+        '''
+        with self.lock:
+            profiles = list(self.profiles)
+        stats = None
+        for profile in profiles:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+            except TypeError:
+                continue  # a thread that never ran any Python code under the profile
+        return stats
+
+    def write(self, folder, prefix="cpu"):
+        '''
+            Writes <prefix>-<time>.pstats and <prefix>-<time>.collapsed to folder and returns both paths
+            Returns (None, None) when nothing was profiled, e.g. for a folder without any track to render
+        '''
+        stats = self.stats()
+        if stats is None:
+            logger.warning("No CPU profile was collected, nothing written")
+            return None, None
+        os.makedirs(folder, exist_ok=True)
+        base = os.path.join(folder, f"{prefix}-{time.strftime('%Y%m%d-%H%M%S')}")
+        stats.dump_stats(base + ".pstats")
+        with open(base + ".collapsed", "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return base + ".pstats", base + ".collapsed"
+
+    def report(self, top=20):
+        '''
+            Returns the functions with the most time spent in themselves as text, leaving out the waiting ones
+            Cumulative time would put the functions that wait for the workers on top
+        '''
+        output = io.StringIO()
+        stats = self.stats()
+        if stats is None:
+            return "No CPU profile was collected"
+        for function in [function for function in stats.stats if is_idle_function(function)]:
+            del stats.stats[function]
+        stats.stream = output
+        stats.sort_stats("tottime").print_stats(top)
+        return output.getvalue()
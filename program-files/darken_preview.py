@@ -1,15 +1,18 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
-                             QRadioButton, QButtonGroup, QPushButton)
+                             QSlider, QPushButton)
 from PyQt5.QtCore import Qt, QSize
-from PyQt5.QtGui import QPixmap, QPainter, QColor
+from PyQt5.QtGui import QPixmap
+from PIL import Image
+from live_preview import pil_to_qimage
+from renderer import darken_image, DEFAULT_DARKNESS
 
 class DarkenPreview(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
+        self.current_darkness = DEFAULT_DARKNESS
         self.initUI()
-        self.current_darkness = 0.75  # 75% by default
         self.preview_size = QSize(200, 200)
-        self.original_pixmap = None
+        self.original_image = None
         
     def initUI(self):
         layout = QVBoxLayout()
@@ -33,24 +36,17 @@ class DarkenPreview(QWidget):
         title_label = QLabel("Darken background image")
         options_layout.addWidget(title_label)
         
-        # Radio Buttons for darkness levels
-        self.button_group = QButtonGroup()
-        
-        # Create radio buttons with different darkness levels
-        darkness_levels = [
-            ("75% (selected by default)", 0.75),
-            ("65%", 0.65),
-            ("50%", 0.50),
-            ("25%", 0.25)
-        ]
-        
-        for label, value in darkness_levels:
-            radio = QRadioButton(label)
-            if value == 0.75:  # Default option
-                radio.setChecked(True)
-            self.button_group.addButton(radio)
-            options_layout.addWidget(radio)
-            radio.toggled.connect(lambda checked, v=value: checked and self.darkness_changed(v))
+        # Slider for the brightness kept, in whole percents
+        slider_layout = QHBoxLayout()
+        self.darkness_slider = QSlider(Qt.Horizontal)
+        self.darkness_slider.setRange(0, 100)
+        self.darkness_slider.setValue(round(self.current_darkness * 100))
+        self.darkness_label = QLabel(f"{self.darkness_slider.value()}%")
+        self.darkness_label.setFixedWidth(40)
+        slider_layout.addWidget(self.darkness_slider)
+        slider_layout.addWidget(self.darkness_label)
+        options_layout.addLayout(slider_layout)
+        self.darkness_slider.valueChanged.connect(lambda value: self.darkness_changed(value / 100))
         
         # Next button
        
@@ -65,46 +61,35 @@ class DarkenPreview(QWidget):
         
     def darkness_changed(self, value):
         self.current_darkness = value
+        self.darkness_label.setText(f"{round(value * 100)}%")
         self.update_preview()
+
+    def set_darkness(self, value):
+        """Move the slider to a darkness between 0 and 1"""
+        self.darkness_slider.setValue(round(value * 100))
+        # setValue does not emit when the value is unchanged, keep the exact value either way
+        self.current_darkness = round(value, 2)
         
     def update_preview(self):
-        if not self.original_pixmap:
+        if self.original_image is None:
             return
-            
-        # Create a new pixmap for the preview
-        preview_pixmap = QPixmap(self.preview_size)
-        preview_pixmap.fill(Qt.white)
-        
-        # Scale the original image to fit the preview
-        scaled_pixmap = self.original_pixmap.scaled(
-            self.preview_size,
-            Qt.KeepAspectRatio,
-            Qt.SmoothTransformation
-        )
-        
-        # Create painter and draw the darkened image
-        painter = QPainter(preview_pixmap)
-        
-        # Draw the scaled image
-        x = (self.preview_size.width() - scaled_pixmap.width()) // 2
-        y = (self.preview_size.height() - scaled_pixmap.height()) // 2
-        painter.drawPixmap(x, y, scaled_pixmap)
-        
-        # Apply darkening effect
-        darkness = int(255 * (1 - self.current_darkness))  # Convert percentage to alpha
-        painter.fillRect(
-            0, 0, 
-            self.preview_size.width(), 
-            self.preview_size.height(),
-            QColor(0, 0, 0, 255 - darkness)  # Black with alpha
-        )
-        
-        painter.end()
-        self.preview_label.setPixmap(preview_pixmap)
-        
-    def set_image(self, pixmap):
-        if pixmap is None:
-            return
-            
-        self.original_pixmap = pixmap
-        self.update_preview() 
\ No newline at end of file
+
+        # Darken with the same lookup table the batch uses, on the already downscaled copy
+        darkened = darken_image(self.original_image, self.current_darkness)
+        preview = Image.new("RGB", (self.preview_size.width(), self.preview_size.height()), "white")
+        x = (preview.width - darkened.width) // 2
+        y = (preview.height - darkened.height) // 2
+        preview.paste(darkened, (x, y))
+        self.preview_label.setPixmap(QPixmap.fromImage(pil_to_qimage(preview)))
+
+    def set_image_path(self, image_path):
+        """Load the image once, scaled down to the preview size"""
+        try:
+            with Image.open(image_path) as image:
+                image = image.convert("RGB")
+                image.thumbnail((self.preview_size.width(), self.preview_size.height()))
+        except (IOError, OSError):
+            return False
+        self.original_image = image
+        self.update_preview()
+        return True
@@ -1,90 +1,166 @@
 import os
 import sys
+import hashlib
+import logging
 from mutagen.mp4 import MP4, MP4Cover
 from mutagen.id3 import ID3, APIC, error
 
+logger = logging.getLogger(__name__)
+
+# Padding reserved after the tag when a cover does not fit, so the next cover can be written in place
+MIN_TAG_PADDING = 32 * 1024
+COVER_PADDING_RATIO = 0.5
+
+def artwork_digest(artwork_data):
+    '''
+        Returns the hash used to compare embedded covers with new artwork
+    '''
+    return hashlib.sha256(artwork_data).hexdigest()
+
+def cover_padding(artwork_data, result):
+    '''
+        Returns a mutagen padding callback that keeps the existing padding whenever the new tag fits,
+        so only the tag is written, and otherwise reserves room for a larger cover next time
+        Sets result["rewritten"] when the audio data has to be moved, i.e. the whole file is written again
+    '''
+    def padding(info):
+        if info.padding >= 0:
+            # mutagen's default would shrink large padding, which moves the audio data just like growing it
+            return info.padding
+        result["rewritten"] = True
+        return max(MIN_TAG_PADDING, int(len(artwork_data) * COVER_PADDING_RATIO))
+    return padding
+
+def _existing_mp4_cover(audio):
+    if audio.tags is None or 'covr' not in audio.tags or not audio.tags['covr']:
+        return None
+    return bytes(audio.tags['covr'][0])
+
+def _existing_id3_cover(audio):
+    # Prefer the front cover, fall back to whatever picture is there
+    pictures = audio.getall('APIC')
+    for picture in pictures:
+        if picture.type == 3:
+            return picture.data
+    return pictures[0].data if pictures else None
+
+def read_embedded_cover(file_path):
+    '''
+        Returns the cover embedded in an audio file, or None if it has none or the type is not supported
+        Only the tags are read
+    '''
+    if file_path.lower().endswith('.m4a'):
+        return _existing_mp4_cover(MP4(file_path))
+    elif file_path.lower().endswith('.mp3'):
+        try:
+            return _existing_id3_cover(ID3(file_path))
+        except error:
+            return None
+    return None
+
+def embed_artwork_mp4(file_path, artwork_data, image_format="PNG"):
+    '''
+        Embeds the artwork into an m4a file
+        Returns "unchanged" when the same cover is already embedded, "rewritten" when the tag did not fit
+        in its padding and the whole file was written again, "embedded" otherwise
+    '''
+    audio = MP4(file_path)
+    new_digest = artwork_digest(artwork_data)
+    existing = _existing_mp4_cover(audio)
+    if existing is not None and artwork_digest(existing) == new_digest:
+        return "unchanged"
+
+    cover_format = MP4Cover.FORMAT_JPEG if image_format.upper() == "JPEG" else MP4Cover.FORMAT_PNG
+    audio['covr'] = [MP4Cover(artwork_data, imageformat=cover_format)]
+    # Check the tag we are about to write instead of re-reading the file after saving
+    if artwork_digest(_existing_mp4_cover(audio)) != new_digest:
+        raise ValueError("artwork not set on the MP4 tag")
+    result = {"rewritten": False}
+    audio.save(padding=cover_padding(artwork_data, result))
+    return "rewritten" if result["rewritten"] else "embedded"
+
+def embed_artwork_mp3(file_path, artwork_data, image_format="PNG"):
+    '''
+        Embeds the artwork into an mp3 file
+        Returns "unchanged" when the same cover is already embedded, "rewritten" when the tag did not fit
+        in its padding and the whole file was written again, "embedded" otherwise
+    '''
+    # Try to open ID3 tag or create if doesn't exist
+    try:
+        audio = ID3(file_path)
+    except error:
+        logger.info("Creating new ID3 tag for %s", os.path.basename(file_path))
+        audio = ID3()
+
+    new_digest = artwork_digest(artwork_data)
+    existing = _existing_id3_cover(audio)
+    if existing is not None and artwork_digest(existing) == new_digest:
+        return "unchanged"
+
+    # setall replaces every existing picture so reruns don't stack duplicate APIC frames
+    audio.setall('APIC', [APIC(
+        encoding=3,  # UTF-8
+        mime='image/jpeg' if image_format.upper() == "JPEG" else 'image/png',
+        type=3,      # Cover (front)
+        desc='Cover',
+        data=artwork_data
+    )])
+    if artwork_digest(_existing_id3_cover(audio)) != new_digest:
+        raise ValueError("artwork not set on the ID3 tag")
+    result = {"rewritten": False}
+    audio.save(file_path, padding=cover_padding(artwork_data, result))
+    return "rewritten" if result["rewritten"] else "embedded"
+
+def embed_artwork_file(file_path, artwork_data, image_format="PNG"):
+    '''
+        Embeds the artwork bytes (PNG or JPEG) into a single audio file
+        Returns "embedded", "rewritten", "unchanged" or None if the file type is not supported
+    '''
+    if file_path.lower().endswith('.m4a'):
+        return embed_artwork_mp4(file_path, artwork_data, image_format)
+    elif file_path.lower().endswith('.mp3'):
+        return embed_artwork_mp3(file_path, artwork_data, image_format)
+    return None
+
 def embed_artwork(path):
+    results = {"embedded": 0, "rewritten": 0, "unchanged": 0, "missing": 0, "failed": 0, "rewritten_files": []}
     for filename in os.listdir(path):
-        if filename.lower().endswith('.m4a'):
-            file_path = os.path.join(path, filename)
-            artwork_filename = f"{os.path.splitext(filename)[0]}.png"
-            artwork_file_path = os.path.join(path, artwork_filename)
-            
-            if os.path.exists(artwork_file_path):
-                try:
-                    # Open the audio file
-                    audio = MP4(file_path)
-                    
-                    # Read the artwork file
-                    with open(artwork_file_path, 'rb') as f:
-                        artwork_data = f.read()
-                    
-                    # Embed the artwork
-                    audio['covr'] = [MP4Cover(artwork_data, imageformat=MP4Cover.FORMAT_PNG)]
-                    
-                    # Save the file
-                    audio.save()
-                    print(f"Successfully embedded artwork into {filename} using mutagen")
-                    
-                    # Verify if the artwork is embedded
-                    audio_check = MP4(file_path)
-                    if 'covr' in audio_check:
-                        print(f"Verified: Artwork size {len(audio_check['covr'][0])} bytes")
-                    else:
-                        print(f"Warning: Artwork not detected after embedding in {filename}")
-                        
-                except Exception as e:
-                    print(f"Error processing {filename}: {e}")
-            else:
-                print(f"No artwork found for {filename}")
-        
-        elif filename.lower().endswith('.mp3'):
-            file_path = os.path.join(path, filename)
-            artwork_filename = f"{os.path.splitext(filename)[0]}.png"
-            artwork_file_path = os.path.join(path, artwork_filename)
-            
-            if os.path.exists(artwork_file_path):
-                try:
-                    # Try to open ID3 tag or create if doesn't exist
-                    try:
-                        audio = ID3(file_path)
-                    except error:
-                        print(f"Creating new ID3 tag for {filename}")
-                        audio = ID3()
-                    
-                    # Read the artwork file
-                    with open(artwork_file_path, 'rb') as f:
-                        artwork_data = f.read()
-                    
-                    # Add the artwork to the ID3 tag
-                    audio['APIC'] = APIC(
-                        encoding=3,  # UTF-8
-                        mime='image/png',
-                        type=3,      # Cover (front)
-                        desc='Cover',
-                        data=artwork_data
-                    )
-                    
-                    # Save the file
-                    audio.save(file_path)
-                    print(f"Successfully embedded artwork into {filename} using mutagen ID3")
-                    
-                    # Verify if the artwork is embedded
-                    audio_check = ID3(file_path)
-                    if 'APIC:Cover' in audio_check or 'APIC:' in audio_check:
-                        print(f"Verified: MP3 artwork embedded successfully")
-                    else:
-                        print(f"Warning: Artwork not detected after embedding in {filename}")
-                        
-                except Exception as e:
-                    print(f"Error processing {filename}: {e}")
+        if not filename.lower().endswith(('.m4a', '.mp3')):
+            continue
+        file_path = os.path.join(path, filename)
+        artwork_filename = f"{os.path.splitext(filename)[0]}.png"
+        artwork_file_path = os.path.join(path, artwork_filename)
+
+        if not os.path.exists(artwork_file_path):
+            logger.warning("No artwork found for %s", filename)
+            results["missing"] += 1
+            continue
+
+        try:
+            # Read the artwork file
+            with open(artwork_file_path, 'rb') as f:
+                artwork_data = f.read()
+
+            status = embed_artwork_file(file_path, artwork_data)
+            if status == "unchanged":
+                logger.info("Artwork already up to date in %s, skipping save", filename)
+            elif status == "rewritten":
+                logger.info("Embedded artwork into %s, the tag outgrew its padding so the whole file was rewritten",
+                            filename)
+                results["rewritten_files"].append(filename)
             else:
-                print(f"No artwork found for {filename}")
+                logger.info("Successfully embedded artwork into %s using mutagen", filename)
+            results[status] += 1
+        except Exception as e:
+            logger.error("Error processing %s: %s", filename, e)
+            results["failed"] += 1
+    return results
 
 if __name__ == "__main__":
     if len(sys.argv) != 2:
         print("Usage: python embed_artwork.py <path_to_audio_files>")
         sys.exit(1)
-    
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     path = sys.argv[1]
-    embed_artwork(path) 
\ No newline at end of file
+    print(embed_artwork(path))
@@ -2,9 +2,21 @@ import matplotlib.font_manager
 from PIL import ImageFont
 import os
 
+def get_font_directories():
+    return [os.path.expanduser("~/AppData/Local/Microsoft/Windows/Fonts"), os.path.expanduser("~/Library/Fonts"), os.path.expanduser("C:/WINDOWS/FONTS")] if os.name == "nt" else [os.path.expanduser("~/Library/Fonts")]
+
+def get_fallback_font_paths():
+    '''
+        Every installed font, including the emoji and symbol fonts left out of the font list,
+        for drawing characters the chosen font does not have
+    '''
+    paths = set(matplotlib.font_manager.findSystemFonts())
+    paths.update(matplotlib.font_manager.findSystemFonts(fontpaths=get_font_directories()))
+    return sorted(paths)
+
 def get_fonts_mapping():
     fonts_mapping = {}
-    paths_to_check = [os.path.expanduser("~/AppData/Local/Microsoft/Windows/Fonts"), os.path.expanduser("~/Library/Fonts"), os.path.expanduser("C:/WINDOWS/FONTS")] if os.name == "nt" else [os.path.expanduser("~/Library/Fonts")]
+    paths_to_check = get_font_directories()
     
     font_paths = [path for path in matplotlib.font_manager.findSystemFonts(fontpaths=paths_to_check) if "Emoji" not in path and "18030" not in path]
 
@@ -17,6 +29,91 @@ def get_fonts_mapping():
             print(f'Error: could not load font {font_path}')
     return fonts_mapping
 
+# Styles tried in order when the bold toggle is on or off
+BOLD_STYLES = ["Bold", "SemiBold", "Semibold", "DemiBold", "Medium"]
+REGULAR_STYLES = ["Regular", "Book", "Normal", "Roman", "Medium"]
+
+def normalize_path(font_path):
+    return os.path.normcase(os.path.abspath(font_path))
+
+class FontIndex:
+    """
+    The installed fonts indexed both ways, path -> (family, style) and family -> {style: path},
+    so a saved font path is restored with a dictionary lookup instead of matching names.
+    """
+    def __init__(self, fonts_mapping=None):
+        if fonts_mapping is None:
+            fonts_mapping = get_fonts_mapping()
+        self.styles = {}  # normalized path -> (family, style)
+        self.families = {}  # family -> {style: path}
+        for (family, style), path in fonts_mapping.items():
+            self.styles[normalize_path(path)] = (family, style)
+            self.families.setdefault(family, {})[style] = path
+
+    def lookup(self, font_path):
+        '''
+            Returns (family, style) of a font path, or None if it is not an installed font
+            A font that moved to another folder is still found by the names inside the file
+        '''
+        if not font_path:
+            return None
+        found = self.styles.get(normalize_path(font_path))
+        if found is not None or not os.path.exists(font_path):
+            return found
+        try:
+            family, style = ImageFont.FreeTypeFont(font_path).getname()
+        except Exception:
+            return None
+        if style in self.families.get(family, {}):
+            return family, style
+        return None
+
+    def variant(self, family, bold):
+        '''
+            Returns the path of the bold or regular variant of a family
+            A family without a bold variant returns its regular one, which leaves the bold toggle disabled
+        '''
+        variants = self.families.get(family)
+        if not variants:
+            return None
+        for style in BOLD_STYLES if bold else REGULAR_STYLES:
+            if style in variants:
+                return variants[style]
+        upright = sorted(style for style in variants if "Italic" not in style and "Oblique" not in style)
+        if bold:
+            heavy = [style for style in upright if "Bold" in style or "Black" in style or "Heavy" in style]
+            return variants[heavy[0]] if heavy else self.variant(family, False)
+        # No regular variant, the closest is any upright one, then any at all
+        return variants[upright[0] if upright else sorted(variants)[0]]
+
+    def has_bold(self, family):
+        '''
+            True when the bold toggle picks a different file than the regular one
+        '''
+        regular = self.variant(family, False)
+        return regular is not None and self.variant(family, True) != regular
+
+    def is_bold(self, font_path):
+        '''
+            True when font_path is the file the bold toggle picks for its family
+        '''
+        found = self.lookup(font_path)
+        if found is None:
+            return False
+        family, style = found
+        return self.has_bold(family) and self.variant(family, True) == self.families[family][style]
+
+_font_index = None
+
+def get_font_index():
+    '''
+        Returns the index of the installed fonts, built once and shared by every font selector
+    '''
+    global _font_index
+    if _font_index is None:
+        _font_index = FontIndex()
+    return _font_index
+
 
 
 
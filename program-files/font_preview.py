@@ -0,0 +1,141 @@
+import collections
+import hashlib
+import logging
+import os
+import threading
+from PIL import Image, ImageDraw, ImageFont
+from PyQt5.QtCore import Qt, QThread, QAbstractListModel, QModelIndex, QSize, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap
+from live_preview import pil_to_qimage
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_FOLDER = "font_previews"
+PREVIEW_SIZE = QSize(180, 24)
+
+def preview_path(cache_dir, font_path):
+    '''
+        Returns where the preview of a font file is kept, keyed by its path and modification time
+        so a font that is replaced gets a new preview
+    '''
+    stat = os.stat(font_path)
+    key = f"{os.path.abspath(font_path)}|{stat.st_mtime_ns}|{stat.st_size}"
+    return os.path.join(cache_dir, PREVIEW_FOLDER, hashlib.sha1(key.encode()).hexdigest() + ".png")
+
+def render_font_preview(font_path, text, size=(PREVIEW_SIZE.width(), PREVIEW_SIZE.height())):
+    '''
+        Draws text in the font on a transparent image of the given size
+    '''
+    width, height = size
+    font = ImageFont.truetype(font_path, int(height * 0.7))
+    image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    draw.text((2, height / 2), text, font=font, fill=(0, 0, 0, 255), anchor="lm")
+    return image
+
+def load_or_render_preview(cache_dir, font_path, text):
+    path = preview_path(cache_dir, font_path) if cache_dir else None
+    if path and os.path.exists(path):
+        try:
+            with Image.open(path) as image:
+                return image.convert("RGBA")
+        except OSError as e:
+            logger.debug("Could not read the font preview %s: %s", path, e)
+    image = render_font_preview(font_path, text)
+    if path:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            image.save(path)
+        except OSError as e:
+            logger.debug("Could not save the font preview %s: %s", path, e)
+    return image
+
+class FontPreviewWorker(QThread):
+    """
+    Renders family previews off the GUI thread, loading them from the disk cache when they were rendered before.
+    The newest request is served first, so the rows in view after a scroll appear before the ones scrolled past.
+    """
+    rendered = pyqtSignal(str, QImage)
+    failed = pyqtSignal(str)
+
+    def __init__(self, cache_dir=None, parent=None):
+        super().__init__(parent)
+        self.cache_dir = cache_dir
+        self.condition = threading.Condition()
+        self.pending = collections.OrderedDict()  # family -> font path
+        self.stopping = False
+
+    def request(self, family, font_path):
+        with self.condition:
+            self.pending[family] = font_path
+            self.pending.move_to_end(family)
+            self.condition.notify()
+
+    def stop(self):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        self.wait()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopping:
+                    self.condition.wait()
+                if self.stopping:
+                    return
+                family, font_path = self.pending.popitem(last=True)
+            try:
+                image = load_or_render_preview(self.cache_dir, font_path, family)
+                self.rendered.emit(family, pil_to_qimage(image))
+            except Exception as e:
+                logger.debug("Could not render a preview of %s: %s", font_path, e)
+                self.failed.emit(family)
+
+class FontFamilyModel(QAbstractListModel):
+    """
+    The font families as a list model, so views only ask for the rows they show.
+    The preview of a row is requested from the worker the first time the row is drawn
+    and the row is repainted when it arrives.
+    """
+    def __init__(self, font_index, cache_dir=None, parent=None):
+        super().__init__(parent)
+        self.font_index = font_index
+        self.families = sorted(font_index.families.keys())
+        self.rows = {family: row for row, family in enumerate(self.families)}
+        self.previews = {}  # family -> QPixmap, or None when it could not be rendered
+        self.worker = FontPreviewWorker(cache_dir, parent=self)
+        self.worker.rendered.connect(self._on_rendered)
+        self.worker.failed.connect(self._on_failed)
+        self.worker.start()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.families)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        family = self.families[index.row()]
+        if role in (Qt.DisplayRole, Qt.EditRole, Qt.ToolTipRole):
+            return family
+        if role == Qt.DecorationRole:
+            if family not in self.previews:
+                self.previews[family] = None  # requested once, filled in by _on_rendered
+                font_path = self.font_index.variant(family, False)
+                if font_path:
+                    self.worker.request(family, font_path)
+            return self.previews[family]
+        if role == Qt.SizeHintRole:
+            return QSize(PREVIEW_SIZE.width() * 2, PREVIEW_SIZE.height() + 4)
+        return None
+
+    def _on_rendered(self, family, qimage):
+        self.previews[family] = QPixmap.fromImage(qimage)
+        index = self.index(self.rows[family])
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def _on_failed(self, family):
+        self.previews[family] = None
+
+    def shutdown(self):
+        self.worker.stop()
@@ -1,9 +1,12 @@
 from PyQt5.QtWidgets import (QWidget, QComboBox, QSpinBox, QPushButton, 
                             QHBoxLayout, QVBoxLayout, QLabel, QFrame,
-                            QDoubleSpinBox, QToolButton, QSizePolicy)
+                            QDoubleSpinBox, QToolButton, QSizePolicy,
+                            QListView, QStyledItemDelegate)
 from PyQt5.QtCore import pyqtSignal, Qt
 from PyQt5.QtGui import QFont, QIcon
-from font_mapping import get_fonts_mapping
+from font_mapping import get_font_index
+from font_preview import FontFamilyModel, PREVIEW_SIZE
+from cached_data import get_cache_dir
 
 class FontStyleSelector(QWidget):
     """
@@ -16,11 +19,9 @@ class FontStyleSelector(QWidget):
     def __init__(self, parent=None, min_font_size=8, max_font_size=300, default_size=12, cached_data = None):
         super().__init__(parent)
         
-        # Get font mappings
-        self.fonts_mapping = get_fonts_mapping()
+        # Installed fonts by family and by path
+        self.font_index = get_font_index()
         self.cached_data = cached_data
-        # Process font data
-        self.font_families = self._process_font_families()
         
         # Initialize UI
         self._init_ui(min_font_size, max_font_size, default_size)
@@ -29,19 +30,6 @@ class FontStyleSelector(QWidget):
         if self.cached_data:
             self.apply_cached_settings()
         
-    def _process_font_families(self):
-        """Process font mapping to extract font families and their variants"""
-        font_families = {}
-        
-        for (name, weight), path in self.fonts_mapping.items():
-            if name not in font_families:
-                font_families[name] = {'variants': set(), 'paths': {}}
-            
-            font_families[name]['variants'].add(weight)
-            font_families[name]['paths'][weight] = path
-            
-        return font_families
-    
     def _init_ui(self, min_font_size, max_font_size, default_size):
         """Initialize the UI components in a two-row toolbar-like style"""
         main_layout = QVBoxLayout(self)
@@ -57,15 +45,24 @@ class FontStyleSelector(QWidget):
         row1_layout.setContentsMargins(4, 2, 4, 2)
         
         # Font family selection with improved dropdown
+        # Sizing to contents would measure every family, size to a fixed number of characters instead
         self.family_combo = QComboBox()
-        self.family_combo.setSizeAdjustPolicy(QComboBox.AdjustToContents)
+        self.family_combo.setSizeAdjustPolicy(QComboBox.AdjustToMinimumContentsLengthWithIcon)
+        self.family_combo.setMinimumContentsLength(20)
         self.family_combo.setMinimumWidth(150)
         self.family_combo.setMaximumWidth(300)  # Set a reasonable maximum width
         self.family_combo.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Fixed)
         
-        # Sort font families alphabetically and add to combo box
-        sorted_families = sorted(self.font_families.keys())
-        self.family_combo.addItems(sorted_families)
+        # Families in alphabetical order from a list model; the list view only creates the rows in view
+        # and each row shows a preview of the family rendered in the background
+        family_view = QListView()
+        family_view.setUniformItemSizes(True)
+        family_view.setIconSize(PREVIEW_SIZE)
+        self.family_combo.setView(family_view)
+        self.family_combo.setItemDelegate(QStyledItemDelegate(family_view))
+        self.family_model = FontFamilyModel(self.font_index, get_cache_dir(), parent=self)
+        self.family_combo.setModel(self.family_model)
+        self.family_combo.setIconSize(PREVIEW_SIZE)
         row1_layout.addWidget(self.family_combo)
         
         # Add vertical separator
@@ -166,21 +163,18 @@ class FontStyleSelector(QWidget):
         # Initialize bold button state
         self._update_bold_availability(self.family_combo.currentText())
     
+    def shutdown(self):
+        """Stop the preview worker, call before the widget is destroyed"""
+        self.family_model.shutdown()
+
     def _update_bold_availability(self, font_family):
         """Enable or disable bold button based on font variants availability"""
-        if not font_family or font_family not in self.font_families:
-            self.bold_button.setEnabled(False)
-            return
-            
-        variants = self.font_families[font_family]['variants']
-        has_bold = any(v.lower() == 'bold' or v.lower() == 'semibold' or v.lower() == 'medium' for v in variants)
-        has_regular = any(v.lower() == 'regular' for v in variants)
-        
-        # Enable bold button only if the font has both regular and bold variants
-        self.bold_button.setEnabled(has_bold and has_regular)
+        # Enable bold button only if the bold toggle maps to a different variant file
+        has_bold = self.font_index.has_bold(font_family)
+        self.bold_button.setEnabled(has_bold)
         
         # If bold is not available, ensure it's not selected
-        if not (has_bold and has_regular) and self.bold_button.isChecked():
+        if not has_bold and self.bold_button.isChecked():
             self.bold_button.setChecked(False)
     
     def _emit_font_changed(self, *args):
@@ -196,17 +190,8 @@ class FontStyleSelector(QWidget):
         word_spacing = self.spacing_spin.value()
         text_case = self.casing_combo.currentText()
         
-        # Get the appropriate font path
-        font_path = None
-        if font_family in self.font_families:
-            weight = 'Bold' if is_bold else 'Regular'
-            paths = self.font_families[font_family]['paths']
-            
-            if weight in paths:
-                font_path = paths[weight]
-            elif len(paths) > 0:
-                # Fallback to any available variant
-                font_path = next(iter(paths.values()))
+        # Get the variant file the bold toggle maps to
+        font_path = self.font_index.variant(font_family, is_bold)
         
         return {
             'family': font_family,
@@ -230,6 +215,21 @@ class FontStyleSelector(QWidget):
         else:  # Normal
             return text
     
+    def select_font_path(self, font_path):
+        """Select the family and bold state of a saved font path, returns False if it is not installed"""
+        found = self.font_index.lookup(font_path)
+        if found is None:
+            print(f"Font {font_path} is not installed, keeping {self.family_combo.currentText()}")
+            return False
+        family, style = found
+        index = self.family_combo.findText(family)
+        if index < 0:
+            return False
+        self.family_combo.setCurrentIndex(index)
+        self.bold_button.setChecked(self.font_index.is_bold(font_path))
+        print(f"Setting font family to {family} ({style})")
+        return True
+
     def apply_cached_settings(self):
         """Apply font settings from cached data"""
         if not self.cached_data:
@@ -239,18 +239,7 @@ class FontStyleSelector(QWidget):
         
         # Set font family if available
         if "font_family" in self.cached_data:
-            # Extract font family name from path
-            import os
-            font_path = self.cached_data["font_family"]
-            font_filename = os.path.basename(font_path).lower()
-            
-            # Try to find a matching font in our families
-            for i in range(self.family_combo.count()):
-                family_name = self.family_combo.itemText(i)
-                if family_name.lower() in font_filename or font_filename in family_name.lower():
-                    self.family_combo.setCurrentIndex(i)
-                    print(f"Setting font family to {family_name} based on {font_filename}")
-                    break
+            self.select_font_path(self.cached_data["font_family"])
         
         # Set font size if available - even more explicit handling
         if "font_size" in self.cached_data:
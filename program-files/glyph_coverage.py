@@ -0,0 +1,201 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import unicodedata
+from fontTools.ttLib import TTFont, TTLibError
+
+logger = logging.getLogger(__name__)
+
+COVERAGE_FILE = "glyph_coverage.json"
+# Fonts tried first when a character is missing from the title font, by file name
+PREFERRED_FALLBACKS = ["NotoSans-", "NotoSansDevanagari", "NotoSansArabic", "NotoNaskhArabic",
+                       "Nirmala", "Kohinoor", "Mangal", "GeezaPro", "SegoeUI", "Arial Unicode",
+                       "DejaVuSans."]
+EMOJI_FONTS = ["Emoji"]
+# Fonts that claim every character but only draw placeholder boxes
+NEVER_FALLBACK = ["LastResort"]
+# Codepoints that are drawn in colour by emoji fonts when one is installed
+EMOJI_RANGES = [(0x2600, 0x27BF), (0x1F000, 0x1FAFF)]
+
+def read_coverage(font_path):
+    '''
+        Returns the codepoints a font has glyphs for as sorted [start, end] ranges,
+        and the bitmap sizes of colour bitmap fonts (they can only be loaded at those sizes)
+    '''
+    with TTFont(font_path, fontNumber=0, lazy=True) as font:
+        codepoints = sorted(font.getBestCmap() or {})
+        bitmap_sizes = []
+        if "CBLC" in font:
+            bitmap_sizes = sorted({strike.bitmapSizeTable.ppemY for strike in font["CBLC"].strikes})
+        elif "sbix" in font:
+            bitmap_sizes = sorted(font["sbix"].strikes)
+    ranges = []
+    for codepoint in codepoints:
+        if ranges and ranges[-1][1] == codepoint - 1:
+            ranges[-1][1] = codepoint
+        else:
+            ranges.append([codepoint, codepoint])
+    return {"ranges": ranges, "bitmap_sizes": bitmap_sizes}
+
+def is_emoji(codepoint):
+    return any(start <= codepoint <= end for start, end in EMOJI_RANGES)
+
+class GlyphCoverage:
+    """
+    Which characters every installed font can draw, read once from the fonts' cmap tables and kept
+    in the cache directory so later runs only read fonts that were added or changed.
+    Lookups per character are memoized, so splitting a title into per-font runs costs
+    a dict lookup per character.
+    """
+    def __init__(self, font_paths, cache_dir=None):
+        self.cache_path = os.path.join(cache_dir, COVERAGE_FILE) if cache_dir else None
+        self.fonts = {}  # path -> {"starts", "ends", "bitmap_sizes", "count"}
+        self.lock = threading.Lock()
+        self.fallbacks = {}  # codepoint -> font path or None
+        self.primary_cache = {}  # (font path, codepoint) -> bool
+        self.ascii_fonts = {}  # font path -> whether it has every printable ASCII character
+        self._load(font_paths)
+        # Preferred fallbacks first, then the fonts that cover the most characters
+        candidates = [path for path in self.fonts
+                      if not any(hint in os.path.basename(path) for hint in NEVER_FALLBACK)]
+        self.order = sorted(candidates, key=lambda path: (self._preference(path),
+                                                          -self.fonts[path]["count"], path))
+
+    def _preference(self, path):
+        name = os.path.basename(path)
+        for index, hint in enumerate(PREFERRED_FALLBACKS):
+            if name.startswith(hint) or hint in name:
+                return index
+        return len(PREFERRED_FALLBACKS)
+
+    def _add_font(self, path, ranges, bitmap_sizes):
+        self.fonts[path] = {
+            "starts": [start for start, _ in ranges],
+            "ends": [end for _, end in ranges],
+            "bitmap_sizes": bitmap_sizes,
+            "count": sum(end - start + 1 for start, end in ranges),
+        }
+
+    def _ensure_font(self, font_path):
+        '''
+            Reads a title font that is not among the installed fonts,
+            e.g. one picked from another folder
+        '''
+        if font_path in self.fonts:
+            return
+        try:
+            entry = read_coverage(font_path)
+        except (TTLibError, OSError, KeyError, AssertionError) as e:
+            logger.debug("Could not read the cmap of %s: %s", font_path, e)
+            return
+        with self.lock:
+            self._add_font(font_path, entry["ranges"], entry["bitmap_sizes"])
+
+    def _load(self, font_paths):
+        cached = {}
+        if self.cache_path and os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path) as f:
+                    cached = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("Could not read the glyph coverage cache: %s", e)
+        changed = False
+        entries = {}
+        for path in font_paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = cached.get(path)
+            if not entry or entry["mtime"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+                try:
+                    entry = {"mtime": stat.st_mtime_ns, "size": stat.st_size, **read_coverage(path)}
+                except (TTLibError, OSError, KeyError, AssertionError) as e:
+                    logger.debug("Could not read the cmap of %s: %s", path, e)
+                    continue
+                changed = True
+            entries[path] = entry
+            self._add_font(path, entry["ranges"], entry.get("bitmap_sizes", []))
+        if self.cache_path and (changed or len(entries) != len(cached)):
+            try:
+                with open(self.cache_path, "w") as f:
+                    json.dump(entries, f)
+            except OSError as e:
+                logger.warning("Could not save the glyph coverage cache: %s", e)
+
+    def covers(self, font_path, codepoint):
+        font = self.fonts.get(font_path)
+        if font is None:
+            return True  # a font we know nothing about, let it draw
+        index = bisect.bisect_right(font["starts"], codepoint) - 1
+        return index >= 0 and codepoint <= font["ends"][index]
+
+    def bitmap_sizes(self, font_path):
+        font = self.fonts.get(font_path)
+        return font["bitmap_sizes"] if font else []
+
+    def fallback_for(self, codepoint):
+        '''
+            Returns the font to draw a character the title font does not have,
+            or None if no font has it
+        '''
+        if codepoint in self.fallbacks:
+            return self.fallbacks[codepoint]
+        candidates = self.order
+        if is_emoji(codepoint):
+            emoji = [path for path in self.order
+                     if any(hint in os.path.basename(path) for hint in EMOJI_FONTS)]
+            candidates = emoji + [path for path in self.order if path not in emoji]
+        font_path = next((path for path in candidates if self.covers(path, codepoint)), None)
+        with self.lock:
+            self.fallbacks[codepoint] = font_path
+        return font_path
+
+    def split_runs(self, text, font_path):
+        '''
+            Splits text into [(run, font path)] so every run can be drawn with one font
+            Spaces and combining marks stay in the run they follow
+        '''
+        ascii_ok = self.ascii_fonts.get(font_path)
+        if ascii_ok is None:
+            self._ensure_font(font_path)
+            ascii_ok = self.ascii_fonts[font_path] = all(self.covers(font_path, codepoint)
+                                                         for codepoint in range(0x20, 0x7F))
+        if ascii_ok and text.isascii():
+            return [(text, font_path)]
+        runs = []
+        for char in text:
+            codepoint = ord(char)
+            key = (font_path, codepoint)
+            supported = self.primary_cache.get(key)
+            if supported is None:
+                supported = self.primary_cache[key] = self.covers(font_path, codepoint)
+            if runs and (char.isspace() or unicodedata.combining(char)):
+                run_font = runs[-1][1]
+            elif supported:
+                run_font = font_path
+            else:
+                run_font = self.fallback_for(codepoint) or font_path
+            if runs and runs[-1][1] == run_font:
+                runs[-1][0] += char
+            else:
+                runs.append([char, run_font])
+        return [(run, path) for run, path in runs]
+
+_coverage = None
+_coverage_lock = threading.Lock()
+
+def get_glyph_coverage():
+    '''
+        Returns the shared coverage index of every installed font, built on first use
+    '''
+    global _coverage
+    if _coverage is None:
+        with _coverage_lock:
+            if _coverage is None:
+                from font_mapping import get_fallback_font_paths
+                from cached_data import get_cache_dir
+                _coverage = GlyphCoverage(get_fallback_font_paths(), get_cache_dir())
+    return _coverage
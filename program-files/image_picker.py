@@ -14,6 +14,8 @@ class ImagePickerDialog(QDialog):
         if self.cached_data and "selected_image" in self.cached_data:
             self.image_path.setText(self.cached_data["selected_image"])
             self.selected_image = self.cached_data["selected_image"]
+        if self.cached_data and self.cached_data.get("backgrounds"):
+            self.backgrounds_path.setText(self.cached_data["backgrounds"])
         
     def init_ui(self):
         # Set window title and size
@@ -42,6 +44,21 @@ class ImagePickerDialog(QDialog):
         # Add image selection layout to main layout
         main_layout.addLayout(image_layout)
         
+        # Optional per-track backgrounds: a folder of images named after a speaker, month or date, or a rules file
+        backgrounds_layout = QHBoxLayout()
+        backgrounds_label = QLabel("Per-track backgrounds (optional):")
+        backgrounds_layout.addWidget(backgrounds_label)
+        self.backgrounds_path = QLineEdit()
+        self.backgrounds_path.setPlaceholderText("Folder of images or rules file, the image above is the default")
+        backgrounds_layout.addWidget(self.backgrounds_path)
+        folder_button = QPushButton("Folder")
+        folder_button.clicked.connect(self.browse_backgrounds_folder)
+        backgrounds_layout.addWidget(folder_button)
+        rules_button = QPushButton("Rules File")
+        rules_button.clicked.connect(self.browse_backgrounds_rules)
+        backgrounds_layout.addWidget(rules_button)
+        main_layout.addLayout(backgrounds_layout)
+        
         # Add OK button
         ok_button = QPushButton("OK")
         ok_button.clicked.connect(self.accept)
@@ -66,6 +83,20 @@ class ImagePickerDialog(QDialog):
             self.image_path.setText(image_path)
             self.selected_image = image_path
     
+    def browse_backgrounds_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Select Backgrounds Folder")
+        if folder:
+            self.backgrounds_path.setText(folder)
+    
+    def browse_backgrounds_rules(self):
+        rules_path, _ = QFileDialog.getOpenFileName(self, "Select Backgrounds Rules", "", "Rules (*.json);;All Files (*)")
+        if rules_path:
+            self.backgrounds_path.setText(rules_path)
+    
+    def get_backgrounds(self):
+        # Empty when every track uses the selected image
+        return self.backgrounds_path.text().strip()
+    
     def get_selected_image(self):
         # Return the path from the text field (in case user typed it manually)
         return self.image_path.text() or self.selected_image
@@ -2,6 +2,8 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QRadioButton, QButtonGroup, QFrame)
 from PyQt5.QtCore import Qt, QSize, QRect
 from PyQt5.QtGui import QPixmap, QPainter
+from PIL import Image
+from smart_crop import content_crop_box, image_key, PROXY_SIZE
 
 class ImagePreview(QWidget):
     def __init__(self, parent=None):
@@ -11,6 +13,7 @@ class ImagePreview(QWidget):
         self.preview_size = QSize(200, 200)  # Small preview size
         self.final_size = QSize(800, 800)    # Final target size
         self.original_pixmap = None  # Store the original pixmap
+        self.image_path = None
         
     def initUI(self):
         layout = QHBoxLayout()
@@ -40,23 +43,19 @@ class ImagePreview(QWidget):
         
         crop_radio = QRadioButton("Crop to AR")
         stretch_radio = QRadioButton("Stretch to AR")
+        smart_crop_radio = QRadioButton("Smart Crop to AR (keeps the detailed part)")
         nothing_radio = QRadioButton("Do Nothing (selected by default)")
         nothing_radio.setChecked(True)
         
-        self.button_group.addButton(crop_radio)
-        self.button_group.addButton(stretch_radio)
-        self.button_group.addButton(nothing_radio)
-        
-        options_layout.addWidget(crop_radio)
-        options_layout.addWidget(stretch_radio)
-        options_layout.addWidget(nothing_radio)
+        # Radio button of every option value, for restoring saved settings
+        self.option_buttons = {"crop": crop_radio, "smart_crop": smart_crop_radio,
+                               "stretch": stretch_radio, "do_nothing": nothing_radio}
+        for option, radio in self.option_buttons.items():
+            self.button_group.addButton(radio)
+            options_layout.addWidget(radio)
+            radio.toggled.connect(lambda checked, option=option: checked and self.option_changed(option))
         options_layout.addStretch()
         
-        # Connect radio buttons
-        crop_radio.toggled.connect(lambda checked: checked and self.option_changed("crop"))
-        stretch_radio.toggled.connect(lambda checked: checked and self.option_changed("stretch"))
-        nothing_radio.toggled.connect(lambda checked: checked and self.option_changed("do_nothing"))
-        
         # Add widgets to main layout
         layout.addWidget(self.preview_frame)
         layout.addWidget(options_widget)
@@ -98,6 +97,22 @@ class ImagePreview(QWidget):
             scaled_pixmap = cropped.scaled(self.preview_size, 
                                          Qt.KeepAspectRatio,
                                          Qt.SmoothTransformation)
+        elif self.current_option == "smart_crop" and self.image_path:
+            # The same window the batch picks, the result is cached so the batch does not analyse again
+            target_ratio = self.final_size.width() / self.final_size.height()
+            with Image.open(self.image_path) as image:
+                image.draft("RGB", (PROXY_SIZE, PROXY_SIZE))
+                left, top, right, bottom = content_crop_box(image.convert("RGB"), target_ratio,
+                                                            image_key(self.image_path))
+                # The box is relative to the (possibly draft-reduced) image, convert it to pixmap pixels
+                x_scale = self.original_pixmap.width() / image.width
+                y_scale = self.original_pixmap.height() / image.height
+            crop_rect = QRect(round(left * x_scale), round(top * y_scale),
+                              round((right - left) * x_scale), round((bottom - top) * y_scale))
+            cropped = self.original_pixmap.copy(crop_rect)
+            scaled_pixmap = cropped.scaled(self.preview_size, 
+                                         Qt.KeepAspectRatio,
+                                         Qt.SmoothTransformation)
         elif self.current_option == "stretch":
             # Stretch to fill the preview area
             scaled_pixmap = self.original_pixmap.scaled(self.preview_size,
@@ -117,9 +132,10 @@ class ImagePreview(QWidget):
         
         self.preview_label.setPixmap(preview_pixmap)
         
-    def set_image(self, pixmap):
+    def set_image(self, pixmap, image_path=None):
         if pixmap is None:
             return
             
         self.original_pixmap = pixmap
+        self.image_path = image_path
         self.update_preview() 
\ No newline at end of file
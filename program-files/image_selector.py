@@ -3,6 +3,7 @@ from PyQt5.QtWidgets import (QDialog, QWidget, QVBoxLayout, QHBoxLayout,
 from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QFont, QColor, QPixmap
 from darken_preview import DarkenPreview
+from renderer import DEFAULT_DARKNESS
 from image_preview import ImagePreview
 import os
 
@@ -150,42 +151,29 @@ class ImageSelector(QDialog):
         """Apply cached settings to UI elements"""
         if 'aspect_ratio_option' in self.cached_data:
             option = self.cached_data['aspect_ratio_option']
-            # Find and select the appropriate radio button
-            for btn in self.image_preview.button_group.buttons():
-                if ("crop" in btn.text().lower() and option == "crop") or \
-                   ("stretch" in btn.text().lower() and option == "stretch") or \
-                   ("nothing" in btn.text().lower() and option == "do_nothing"):
-                    btn.setChecked(True)
-                    break
+            # Select the radio button of the saved option
+            if option in self.image_preview.option_buttons:
+                self.image_preview.option_buttons[option].setChecked(True)
         
         if 'darkness_level' in self.cached_data:
-            darkness = self.cached_data['darkness_level']
-            # Find and select the appropriate radio button
-            for btn in self.darken_preview.button_group.buttons():
-                if str(int(darkness * 100)) + "%" in btn.text():
-                    btn.setChecked(True)
-                    break
+            self.darken_preview.set_darkness(self.cached_data['darkness_level'])
     
     def set_image(self, image_path):
         """Set the image for both previews"""
         pixmap = QPixmap(image_path)
         if not pixmap.isNull():
-            self.image_preview.set_image(pixmap)
-            self.darken_preview.set_image(pixmap)
+            self.image_preview.set_image(pixmap, image_path)
+            self.darken_preview.set_image_path(image_path)
             return True
         return False
     
     def reset_all(self):
         """Reset all components to their initial values"""
         # Reset image preview to "Do Nothing" option
-        nothing_radio = [btn for btn in self.image_preview.button_group.buttons() 
-                        if btn.text() == "Do Nothing (selected by default)"][0]
-        nothing_radio.setChecked(True)
-        
-        # Reset darken preview to 75%
-        seventy_five_radio = [btn for btn in self.darken_preview.button_group.buttons() 
-                            if "75%" in btn.text()][0]
-        seventy_five_radio.setChecked(True)
+        self.image_preview.option_buttons["do_nothing"].setChecked(True)
+        
+        # Reset darken preview to the default darkness
+        self.darken_preview.set_darkness(DEFAULT_DARKNESS)
     
     def get_all_data(self):
         """Collect and return all the current settings"""
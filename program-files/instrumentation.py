@@ -0,0 +1,102 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Stage names used by the renderer and the batch runner, in pipeline order
+STAGES = ["tag_read", "image_load", "base_render", "text_layout", "encode", "save", "tag_embed"]
+
+def percentile(sorted_values, pct):
+    '''
+        Nearest-rank percentile of an already sorted list
+    '''
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+class Timings:
+    """
+    Collects named durations from any thread and summarizes them at the end of a run
+    """
+    def __init__(self):
+        self.samples = {}
+        self.lock = threading.Lock()
+        self.listeners = []
+
+    def record(self, name, seconds):
+        with self.lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+    @contextmanager
+    def span(self, name):
+        for listener in self.listeners:
+            listener.span_started(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+            for listener in self.listeners:
+                listener.span_finished(name)
+
+    def add_listener(self, listener):
+        '''
+            listener gets span_started(name) and span_finished(name) calls around every span
+        '''
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def reset(self):
+        with self.lock:
+            self.samples = {}
+
+    def summary(self):
+        '''
+            Returns {name: {count, total, mean, p50, p90, p99, max}} with times in seconds
+        '''
+        with self.lock:
+            samples = {name: sorted(values) for name, values in self.samples.items()}
+        ordered = [name for name in STAGES if name in samples] + sorted(name for name in samples if name not in STAGES)
+        result = {}
+        for name in ordered:
+            values = samples[name]
+            total = sum(values)
+            result[name] = {
+                "count": len(values),
+                "total": total,
+                "mean": total / len(values),
+                "p50": percentile(values, 50),
+                "p90": percentile(values, 90),
+                "p99": percentile(values, 99),
+                "max": values[-1],
+            }
+        return result
+
+    def report(self):
+        '''
+            Returns the summary as a table, times in milliseconds
+        '''
+        lines = [f"{'stage':<14}{'count':>7}{'total':>11}{'mean':>10}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}"]
+        for name, stats in self.summary().items():
+            lines.append(f"{name:<14}{stats['count']:>7}{stats['total'] * 1000:>11.1f}{stats['mean'] * 1000:>10.2f}"
+                         f"{stats['p50'] * 1000:>10.2f}{stats['p90'] * 1000:>10.2f}{stats['p99'] * 1000:>10.2f}"
+                         f"{stats['max'] * 1000:>10.2f}")
+        return "\n".join(lines)
+
+    def write_json(self, path, extra=None):
+        '''
+            Writes the summary (and anything in extra) to a JSON file
+        '''
+        output = {"stages": self.summary()}
+        if extra:
+            output.update(extra)
+        with open(path, "w") as f:
+            json.dump(output, f, indent=2)
+
+# Shared by every module so one run produces one report
+timings = Timings()
+span = timings.span
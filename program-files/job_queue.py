@@ -0,0 +1,156 @@
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from tag_metadata import get_metadata_index
+from catalog import record_track, SHARED_CATALOG
+from batch_runner import (make_job, plan_tracks, build_track_pipeline, new_summary, count_result, count_error,
+                          finish_summary, print_summary, TemplateCache, check_collisions)
+
+logger = logging.getLogger(__name__)
+
+# Counters that are added up over every folder for the combined summary
+SUMMARY_COUNTERS = ["tracks", "embedded", "rewritten", "unchanged", "written", "failed", "skipped"]
+
+def merge_settings(base, profile):
+    '''
+        Returns base with the settings of profile on top, title and bottom_bar are merged key by key
+    '''
+    data = copy.deepcopy(base)
+    for key, value in (profile or {}).items():
+        if key in ("title", "bottom_bar") and isinstance(value, dict):
+            data[key] = {**data.get(key, {}), **value}
+        else:
+            data[key] = copy.deepcopy(value)
+    return data
+
+def load_jobs(path, shared_settings):
+    '''
+        Reads a jobs file and returns one settings dict per folder
+        The file is either a list of folders, or
+            {"profiles": {name: settings}, "jobs": [folder or {"folder", "profile"}]}
+        where a profile is a name from "profiles" or a settings dict, merged over shared_settings
+    '''
+    with open(path) as f:
+        content = json.load(f)
+    if isinstance(content, list):
+        content = {"jobs": content}
+    profiles = content.get("profiles", {})
+    jobs = []
+    for entry in content.get("jobs", []):
+        if isinstance(entry, str):
+            entry = {"folder": entry}
+        profile = entry.get("profile")
+        if isinstance(profile, str):
+            if profile not in profiles:
+                raise ValueError(f"Unknown profile {profile} for {entry['folder']}")
+            profile = profiles[profile]
+        data = merge_settings(shared_settings, profile)
+        # Relative folders are relative to the jobs file
+        data["audio_folder"] = os.path.join(os.path.dirname(os.path.abspath(path)), entry["folder"])
+        jobs.append(data)
+    return jobs
+
+def run_jobs(jobs, cancel_event=None, render_workers=None, render_cache=None, on_folder_done=None,
+             catalog=SHARED_CATALOG):
+    '''
+        Runs every folder through one pipeline, so fonts, text measurements and base images stay warm between folders
+        jobs is a list of settings dicts, one per folder, their tracks are recorded in catalog (see make_job)
+        Returns {"folders": [summary per folder], "total": combined summary}
+    '''
+    started = time.perf_counter()
+    pipeline = build_track_pipeline(render_workers=render_workers)
+    templates = TemplateCache()
+    folders = []
+    summary_lock = threading.Lock()
+
+    def finish_folder(folder):
+        finish_summary(folder, cancel_event, folder.pop("started"))
+        if on_folder_done:
+            on_folder_done(folder)
+
+    def on_result(track):
+        folder = track["job"]["summary"]
+        with summary_lock:
+            count_result(folder, track)
+            folder["remaining"] -= 1
+            done = folder["remaining"] == 0
+        if done:
+            finish_folder(folder)
+
+    def on_error(stage, track, error):
+        folder = track["job"]["summary"]
+        logger.warning("Error processing %s in %s: %s", track["audio_path"], stage, error)
+        record_track(track, error=f"{stage}: {error}")
+        with summary_lock:
+            count_error(folder, track, stage, error)
+            folder["remaining"] -= 1
+            done = folder["remaining"] == 0
+        if done:
+            finish_folder(folder)
+
+    def feed():
+        # Runs on the thread calling pipeline.run, so the next folder is prepared while the workers render this one
+        for data in jobs:
+            folder = new_summary()
+            folder["folder"] = data["audio_folder"]
+            folder["started"] = time.perf_counter()
+            folders.append(folder)
+            try:
+                if not os.path.isdir(data["audio_folder"]):
+                    raise FileNotFoundError(f"No folder at {data['audio_folder']}")
+                base_image, base_digest = templates.get(data)
+                job = make_job(data, base_image, render_cache, base_digest, templates, catalog)
+                tracks = plan_tracks(data, job=job)
+                check_collisions(data, tracks)
+            except Exception as e:
+                logger.warning("Could not start %s: %s", data["audio_folder"], e)
+                folder["errors"].append({"file": "", "stage": "setup", "error": str(e)})
+                finish_folder(folder)
+                continue
+            job["summary"] = folder
+            folder["tracks"] = folder["remaining"] = len(tracks)
+            if not tracks:
+                finish_folder(folder)
+            for track in tracks:
+                yield track
+
+    pipeline.run(feed(), on_result=on_result, on_error=on_error, cancel_event=cancel_event)
+    get_metadata_index().save()
+
+    for folder in folders:
+        # Folders cut short by cancelling never saw their last track
+        if "started" in folder:
+            finish_folder(folder)
+        folder.pop("remaining", None)
+
+    total = new_summary()
+    total["skipped"] = 0
+    for folder in folders:
+        for counter in SUMMARY_COUNTERS:
+            total[counter] += folder[counter]
+        total["errors"].extend({**error, "file": os.path.join(folder["folder"], error["file"])}
+                               for error in folder["errors"])
+        total["rewritten_files"].extend(os.path.join(folder["folder"], file) for file in folder["rewritten_files"])
+    total["folders"] = len(folders)
+    total["cancelled"] = bool(cancel_event is not None and cancel_event.is_set())
+    total["elapsed"] = time.perf_counter() - started
+    total["stages"] = pipeline.get_stats()
+    if render_cache is not None:
+        total["render_cache"] = render_cache.stats()
+    total["templates"] = templates.stats()
+    return {"folders": folders, "total": total}
+
+def print_jobs_summary(result):
+    for folder in result["folders"]:
+        setup_errors = [error["error"] for error in folder["errors"] if error["stage"] == "setup"]
+        if setup_errors:
+            print(f"{folder['folder']}: could not start: {setup_errors[0]}")
+            continue
+        print(f"{folder['folder']}: {folder['tracks']} tracks in {folder['elapsed']:.2f}s, "
+              f"{folder['embedded'] + folder['rewritten']} embedded, {folder['unchanged']} unchanged, "
+              f"{folder['failed']} failed")
+    print(f"\nAll {result['total']['folders']} folders:")
+    print_summary(result["total"])
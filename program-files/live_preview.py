@@ -0,0 +1,181 @@
+import copy
+import os
+import threading
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap
+from renderer import (prepare_base_image, render_track, get_layout, genRandomColor, extract_date,
+                      list_audio_files)
+from backgrounds import BackgroundRules
+
+SAMPLE_FILE_NAME = "Speaker Name - 01-01-2024 - Sample Title.mp3"
+
+def pil_to_qimage(image):
+    '''
+        Hands a PIL image to Qt by sharing its raw RGBA buffer, without encoding it to PNG first
+    '''
+    image = image.convert("RGBA")
+    buffer = image.tobytes("raw", "RGBA")
+    qimage = QImage(buffer, image.width, image.height, image.width * 4, QImage.Format_RGBA8888)
+    # copy() detaches the QImage from the Python buffer, which is freed when this function returns
+    return qimage.copy()
+
+def pick_sample_file(audio_folder):
+    '''
+        Returns the first audio file whose name has a date, so the preview shows a real title
+    '''
+    if audio_folder and os.path.isdir(audio_folder):
+        for file in list_audio_files(audio_folder):
+            if extract_date(file)[0] is not None:
+                return file
+    return SAMPLE_FILE_NAME
+
+def is_renderable(data):
+    return bool(data.get("image_path") and data["title"].get("font_family") and data["bottom_bar"].get("font_family")
+                and data["title"].get("position") and data.get("darkness") is not None and data.get("aspect_ratio"))
+
+class PreviewWorker(QThread):
+    """
+    Renders preview requests with the batch renderer.
+    Only the newest request is kept, requests that arrive while rendering replace each other.
+    """
+    rendered = pyqtSignal(int, QImage)
+    failed = pyqtSignal(int, str)
+
+    def __init__(self, size, parent=None):
+        super().__init__(parent)
+        self.layout = get_layout((size, size))
+        self.condition = threading.Condition()
+        self.pending = None
+        self.stopping = False
+        # The darkened and cropped base only changes when the image settings do, not on every title change
+        self.base_key = None
+        self.base_image = None
+
+    def request(self, generation, data, file_name):
+        with self.condition:
+            self.pending = (generation, data, file_name)
+            self.condition.notify()
+
+    def stop(self):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        self.wait()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.stopping:
+                    self.condition.wait()
+                if self.stopping:
+                    return
+                generation, data, file_name = self.pending
+                self.pending = None
+            try:
+                base_key = (data["image_path"], data["darkness"], data["aspect_ratio"])
+                if base_key != self.base_key:
+                    self.base_image = prepare_base_image(data, self.layout)
+                    self.base_key = base_key
+                image = render_track(data, file_name, self.base_image, self.layout)
+                self.rendered.emit(generation, pil_to_qimage(image))
+            except Exception as e:
+                self.failed.emit(generation, str(e))
+
+class LivePreview(QWidget):
+    """
+    Shows a sample track rendered by the batch renderer at thumbnail size.
+    Call update_settings() whenever a setting changes; renders are debounced and run off the GUI thread,
+    and results from outdated settings are dropped.
+    """
+    def __init__(self, preview_data=None, size=240, debounce_ms=150, parent=None):
+        super().__init__(parent)
+        self.preview_data = preview_data or {}
+        self.size = size
+        self.generation = 0
+        self.settings = None
+        self.file_name = pick_sample_file(self.preview_data.get("audio_folder"))
+        # A random bar color would change on every render, keep one for the whole preview
+        self.sample_color = genRandomColor()
+        # With per-track backgrounds, show the one the sample track gets
+        self.sample_background = None
+        if self.preview_data.get("backgrounds") and self.preview_data.get("image_path"):
+            try:
+                self.sample_background = BackgroundRules(self.preview_data["backgrounds"]).pick(
+                    self.file_name, self.preview_data["image_path"])
+            except (OSError, ValueError) as e:
+                print(f"Could not read the backgrounds: {e}")
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.image_label = QLabel("Preview")
+        self.image_label.setFixedSize(size, size)
+        self.image_label.setAlignment(Qt.AlignCenter)
+        self.image_label.setStyleSheet("""
+            QLabel {
+                color: gray;
+                border: 1px solid #ccc;
+                background-color: white;
+            }
+        """)
+        layout.addWidget(self.image_label)
+        self.caption_label = QLabel(self.file_name)
+        self.caption_label.setWordWrap(True)
+        self.caption_label.setMaximumWidth(size)
+        self.caption_label.setStyleSheet("QLabel { color: gray; font-size: 11px; }")
+        layout.addWidget(self.caption_label)
+
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(debounce_ms)
+        self.debounce_timer.timeout.connect(self._send_request)
+
+        self.worker = PreviewWorker(size, parent=self)
+        self.worker.rendered.connect(self._on_rendered)
+        self.worker.failed.connect(self._on_failed)
+        self.worker.start()
+
+    def update_settings(self, title=None, bottom_bar=None, **other):
+        '''
+            Merges the given settings over preview_data and schedules a render
+        '''
+        data = copy.deepcopy(self.preview_data)
+        if title is not None:
+            data["title"] = {**data.get("title", {}), **title}
+        if bottom_bar is not None:
+            data["bottom_bar"] = {**data.get("bottom_bar", {}), **bottom_bar}
+        data.update(other)
+        data.setdefault("title", {})
+        data.setdefault("bottom_bar", {})
+        if data["bottom_bar"].get("color") in (None, "random"):
+            data["bottom_bar"]["color"] = self.sample_color
+        if self.sample_background:
+            data["image_path"] = self.sample_background
+        self.settings = data
+        self.generation += 1
+        self.debounce_timer.start()
+
+    def _send_request(self):
+        if self.settings is None:
+            return
+        if not is_renderable(self.settings):
+            self.image_label.setText("Preview available once\nall settings are chosen")
+            return
+        self.worker.request(self.generation, self.settings, self.file_name)
+
+    def _on_rendered(self, generation, qimage):
+        if generation != self.generation:
+            return  # settings changed while this was rendering
+        self.image_label.setPixmap(QPixmap.fromImage(qimage))
+
+    def _on_failed(self, generation, message):
+        if generation != self.generation:
+            return
+        self.image_label.setText(f"Preview failed:\n{message}")
+
+    def closeEvent(self, event):
+        self.worker.stop()
+        super().closeEvent(event)
+
+    def shutdown(self):
+        self.worker.stop()
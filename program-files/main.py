@@ -1,5 +1,7 @@
-import random
 import sys
+import argparse
+import logging
+from contextlib import contextmanager
 from PyQt5.QtWidgets import QApplication, QMainWindow, QDialog, QVBoxLayout, QWidget
 import os
 from audio_folder_picker import FolderPickerDialog
@@ -8,13 +10,19 @@ from style_selector_image_title import ImageTitleFormatter
 from bottom_bar_formatter import BottomBarFormatter
 from alert_window import show_alert
 from image_selector import ImageSelector
-from PIL import Image, ImageEnhance, ImageDraw, ImageFont
-from embed_artwork import embed_artwork
-from cached_data import get_component_cache, update_component_cache
-
-BOTTOM_BAR_HEIGHT = 143
-IMAGE_WIDTH = 800
-IMAGE_HEIGHT = 800
+from cached_data import get_component_cache, update_component_cache, get_cache_dir, get_saved_settings
+from batch_runner import print_summary, run_batch
+from progress_dialog import run_batch_with_progress
+from instrumentation import timings
+from renderer import OUTPUT_PRESETS, DEFAULT_DARKNESS, is_audio_file, check_outputs
+from watch_folder import watch_folder
+from job_queue import load_jobs, run_jobs, print_jobs_summary, merge_settings
+from render_cache import RenderCache, DEFAULT_MAX_MEGABYTES
+from memory_report import MemoryProfiler
+from cpu_profile import CpuProfiler
+from planner import plan_batch, print_plan, save_run_history
+from catalog import QUERIES, get_catalog, print_query
+from naming import NAME_TOKENS, NameTemplate
 
 def get_data():
     app = QApplication([])
@@ -38,36 +46,11 @@ def get_data():
         },
         "darkness": None,
         "aspect_ratio": None,
+        "outputs": None,
+        "backgrounds": None,
     }
     
-    # Get the user's home directory for storing cache
-    user_home = os.path.expanduser("~")
-    # Try alternative cache directories if the default one has permission issues
-    cache_dir_options = [
-        os.path.join(user_home, ".audio_imager"),
-        os.path.join(user_home, "AppData", "Local", "audio_imager") if os.name == 'nt' else os.path.join(user_home, ".config", "audio_imager"),
-        os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
-    ]
-    
-    # Try to use the first cache directory that we can write to
-    cache_dir = None
-    for dir_path in cache_dir_options:
-        try:
-            os.makedirs(dir_path, exist_ok=True)
-            test_file = os.path.join(dir_path, ".test_write")
-            with open(test_file, 'w') as f:
-                f.write("test")
-            os.remove(test_file)
-            cache_dir = dir_path
-            break
-        except (IOError, PermissionError) as e:
-            print(f"Cannot use cache directory {dir_path}: {e}")
-    
-    if cache_dir is None:
-        print("WARNING: Could not find a writable cache directory. Caching will be disabled.")
-        cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "temp_cache")
-        os.makedirs(cache_dir, exist_ok=True)
-    
+    cache_dir = get_cache_dir()
     print(f"Using cache directory: {cache_dir}")
     
     # Load previously cached values
@@ -76,13 +59,16 @@ def get_data():
     title_cache = get_component_cache(cache_dir, "ImageTitleFormatter")
     bottom_bar_cache = get_component_cache(cache_dir, "BottomBarFormatter")
     image_selector_cache = get_component_cache(cache_dir, "ImageSelector")
+    # Output sizes and the name template have no dialog yet, they can be set in the cache file under "Outputs"
+    data["outputs"] = get_component_cache(cache_dir, "Outputs").get("outputs")
+    data["naming"] = get_component_cache(cache_dir, "Outputs").get("naming")
     
     # Create the folder picker dialog and get the selected folder
     audio_folder_picker = FolderPickerDialog(cached_data=folder_cache)
     if audio_folder_picker.exec_() == QDialog.Accepted:
         audio_folder = audio_folder_picker.get_selected_folder()
         if os.path.exists(audio_folder) and os.path.isdir(audio_folder):
-            if len([name for name in os.listdir(audio_folder) if name.endswith((".mp3", ".m4a"))]) > 0:
+            if len([name for name in os.listdir(audio_folder) if is_audio_file(name)]) > 0:
                 data["audio_folder"] = audio_folder
                 # Update cache with selected folder
                 update_component_cache(cache_dir, "FolderPickerDialog", {"selected_folder": audio_folder})
@@ -100,31 +86,47 @@ def get_data():
     image_picker = ImagePickerDialog(cached_data=image_cache)
     if image_picker.exec_() == QDialog.Accepted:
         image_path = image_picker.get_selected_image()
-        if os.path.exists(image_path) and os.path.isfile(image_path) and image_path.endswith(("png", "jpg", "jpeg")):
-            data["image_path"] = image_path
-            # Update cache with selected image
-            update_component_cache(cache_dir, "ImagePickerDialog", {"selected_image": image_path})
-        else:
+        backgrounds = image_picker.get_backgrounds()
+        if not (os.path.exists(image_path) and os.path.isfile(image_path) and image_path.endswith(("png", "jpg", "jpeg"))):
             show_alert("Invalid image path")
             sys.exit()
+        if backgrounds and not os.path.exists(backgrounds):
+            show_alert("Invalid backgrounds path")
+            sys.exit()
+        data["image_path"] = image_path
+        data["backgrounds"] = backgrounds or None
+        # Update cache with selected image
+        update_component_cache(cache_dir, "ImagePickerDialog", {"selected_image": image_path, "backgrounds": backgrounds})
     else:
         # show_alert("No image selected")
         sys.exit()
 
+    # Settings the live previews use for the steps that have not been shown yet
+    preview_data = {
+        "audio_folder": data["audio_folder"],
+        "image_path": data["image_path"],
+        "backgrounds": data["backgrounds"],
+        "title": dict(title_cache),
+        "bottom_bar": dict(bottom_bar_cache),
+        "darkness": image_selector_cache.get("darkness_level", DEFAULT_DARKNESS),
+        "aspect_ratio": image_selector_cache.get("aspect_ratio_option", "do_nothing"),
+    }
+
     # Create the font style selector, text location selector, color picker
-    image_title_formatter = ImageTitleFormatter(cached_data=title_cache)
+    image_title_formatter = ImageTitleFormatter(cached_data=title_cache, preview_data=preview_data)
     image_title_formatter.show()
     
     if image_title_formatter.exec_() == QDialog.Accepted:
         title_data = image_title_formatter.get_all_data()
         data["title"] = title_data
+        preview_data["title"] = title_data
         # Update cache with title formatter settings
         update_component_cache(cache_dir, "ImageTitleFormatter", title_data)
     else:
         sys.exit()
     
     # Create the bottom bar formatter
-    bottom_bar_formatter = BottomBarFormatter(cached_data=bottom_bar_cache)
+    bottom_bar_formatter = BottomBarFormatter(cached_data=bottom_bar_cache, preview_data=preview_data)
     bottom_bar_formatter.show()
     if bottom_bar_formatter.exec_() == QDialog.Accepted:
         bottom_bar_data = bottom_bar_formatter.get_all_data()
@@ -148,272 +150,175 @@ def get_data():
 
     return data
 
-def smart_center_crop(image, new_size):
-    '''
-        new_size is a tuple (width, height)
-    '''
-    width, height = image.size
-    new_width, new_height = new_size
-
-    scale_w = new_width / width
-    scale_h = new_height / height
-    final_scale = max(scale_w, scale_h)
-    new_image = image.resize((int(width * final_scale), int(height * final_scale)))
-    extra_x = (width*final_scale - new_width) / 2
-    extra_y = (height*final_scale - new_height) / 2
-    new_image = new_image.crop((extra_x, extra_y, extra_x + new_width, extra_y + new_height))
-    return new_image
-
-def extract_date(string):
-    '''
-        This method extracts the date from the string
-        The allowed formats are as follows: 
-            - MM-DD-YYYY
-            - YYYY-MM-DD
-            - MM_DD_YYYY
-            - YYYY_MM_DD
-    '''
-    import re
-    file_extention = string.split(".")[-1]
-    string = string.strip().replace(f".{file_extention}", "")
-    pattern = r'(\d{2,4})[-_/](\d{2})[-_/](\d{2,4})'
-    match = re.search(pattern, string)
-    # Extract the date and split the text before and after the date
-    if match:
-        date_str = match.group(0)  # The entire matched date string
-        parts = string.split(date_str, 1)  # Split at the first occurrence of date
-        before_text = parts[0].strip().strip("-").strip(" ") if parts[0] else ""
-        after_text = parts[1].strip().strip("-").strip(" ") if len(parts) > 1 else ""
-        text_parts = [before_text, f"\"{after_text}\"" if after_text else ""]
-        if len(match.group(1)) == 4: # if the first is 4 digits, then it is the year, then it is in this format YYYY-MM-DD
-            return match.group(3), match.group(2), match.group(1), text_parts # return the day, month, year, and the text parts
-        elif len(match.group(1)) == 2: # if the first is 2 digits, then it is the month, then it is in this format MM-DD-YYYY
-            return match.group(2), match.group(1), match.group(3), text_parts # return the day, month, year, and the text parts
-        else:
-            return None, None, None, ["", ""]   
-
-def apply_image_modifications(data):
-
-    '''
-        This method applies the image modifications to the image
-        The modifications are as follows:
-            - Darken the image
-            - Crop the image
-            - Add the bottom bar
-        This is the base image over which different titles will be written
-    '''
-
-    with Image.open(data["image_path"]) as image:
-
-        # darken the image
-        enhancer = ImageEnhance.Brightness(image)
-        image = enhancer.enhance(data["darkness"])
-
-        # crop the image
-        crop_method = data["aspect_ratio"]
-        if crop_method == "crop": # not actually crop
-            image = smart_center_crop(image, (IMAGE_WIDTH, IMAGE_HEIGHT))
-        elif crop_method == "stretch":
-            image = image.resize((IMAGE_WIDTH, IMAGE_HEIGHT))
-        elif crop_method == "do_nothing":
-            scale_factor = min(IMAGE_WIDTH/image.width, IMAGE_HEIGHT/image.height)
-            if scale_factor < 1:
-                image = image.resize((int(image.width*scale_factor), int(image.height*scale_factor)))
-            canvas = Image.new("RGB", (IMAGE_WIDTH, IMAGE_HEIGHT), "white")
-            canvas.paste(image, (int(IMAGE_WIDTH/2-image.width/2), int(IMAGE_HEIGHT/2-image.height/2 - BOTTOM_BAR_HEIGHT/2)))
-            image = canvas
-        # Add the bottom bar
-        draw = ImageDraw.Draw(image)
-        color = data["bottom_bar"]["color"]
-        if color == "random":
-            color = genRandomColor()
-        draw.rectangle((0, IMAGE_HEIGHT-BOTTOM_BAR_HEIGHT, IMAGE_WIDTH, IMAGE_HEIGHT), fill=color)
-        image.save("output.png")
-        # data["image_path"] = "output.png"
-        return "output.png", color
-
-def get_px_size(text, font_family, font_size):
-    '''
-        This method returns the size of the font in pixels
-    '''
-    font = ImageFont.truetype(font_family, font_size)
-    box = font.getbbox(text)
-    height = box[3] + box[1]  # we are adding because there is margin at top and bottom and margin is equal to the top value
-    width = box[2] + box[0] 
-    return width, height
-
-def genRandomColor():
-    '''
-        This method generates a random color
-    '''
-    color=  "#" + ''.join([random.choice('0123456789abcdef') for _ in range(6)])
-    print(color)
-    return color
-
-def write_on_bottom_bar(data, date : tuple, file_name : str):
-    '''
-        This method writes the date on the image and saves it with a new name
-    '''
-    path, color = apply_image_modifications(data)
-    with Image.open(path) as image:
-        draw = ImageDraw.Draw(image)
-        DD, MM, YYYY, [heading, subheading] = date
-        date_str=f"{MM}-{DD}-{YYYY}"
-        date_width, date_height = get_px_size(date_str, data["bottom_bar"]["font_family"], data["bottom_bar"]["font_size"])
-
-        ## Printing the date on the bottom bar
-        bottom_text_color = "black"
-        # Check if the background color is dark, then use white text
-        bg_color = color
-        # Convert hex to RGB if it's a hex color
-        if bg_color.startswith("#"):
-            r = int(bg_color[1:3], 16)
-            g = int(bg_color[3:5], 16)
-            b = int(bg_color[5:7], 16)
-            # Calculate perceived brightness (common formula)
-            brightness = (0.299 * r + 0.587 * g + 0.114 * b) / 255
-            if brightness < 0.5:  # If background is dark
-                bottom_text_color = "white"
-        font = ImageFont.truetype(data["bottom_bar"]["font_family"], data["bottom_bar"]["font_size"])
-        draw.text((IMAGE_WIDTH/2-date_width/2, IMAGE_HEIGHT-BOTTOM_BAR_HEIGHT+(BOTTOM_BAR_HEIGHT/2-date_height/2)), date_str, fill=bottom_text_color, font=font)
-        image.save(f"{os.path.join(data['audio_folder'], file_name)}")
-        return f"{os.path.join(data['audio_folder'], file_name)}"
-
-def wrap_text(text, font_family, font_size, max_width):
-    '''
-        This method wraps the text to the correct width
-    '''
-    max_width = max_width*0.9
-    words = text.split(" ")
-    lines = []
-    current_line = ""
-    for word in words:
-        if get_px_size(current_line + " " + word, font_family, font_size)[0] <= max_width:
-            current_line += " " + word
-        else:
-            lines.append(current_line)
-            current_line = word
-        current_line = current_line.strip()
-        print(current_line, get_px_size(current_line, font_family, font_size)[0])
-    if current_line:
-        lines.append(current_line)
-    return lines
-
-def draw_text_on_image(position, text, data, image):
-    draw = ImageDraw.Draw(image)
-    font = ImageFont.truetype(data["title"]["font_family"], data["title"]["font_size"])
-    draw.text(position, text, fill=data["title"]["color"], font=font)
-    return image, (position[0], position[1] + get_px_size(text, data["title"]["font_family"], data["title"]["font_size"])[1])
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate and embed artwork for a folder of audio files")
+    parser.add_argument("--log-level", default="WARNING", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="how much detail to log while running (default: WARNING)")
+    parser.add_argument("--timings-json", metavar="PATH",
+                        help="also write the per-stage timings of the batch to this JSON file")
+    parser.add_argument("--outputs", nargs="+", choices=sorted(OUTPUT_PRESETS),
+                        help="output sizes to write for every track (default: the 800px cover that gets embedded)")
+    parser.add_argument("--headless", action="store_true",
+                        help="skip the wizard and use the settings saved by the last run")
+    parser.add_argument("--folder", help="audio folder to use instead of the saved one (with --headless or --watch)")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running headless and add artwork to new or modified files in the folder")
+    parser.add_argument("--process-existing", action="store_true",
+                        help="with --watch, also process the files already in the folder when watching starts")
+    parser.add_argument("--poll-interval", type=float, default=2.0,
+                        help="seconds between folder scans when inotify is not available (default: 2)")
+    parser.add_argument("--settle-seconds", type=float, default=3.0,
+                        help="how long a file must stay unchanged before it is processed (default: 3)")
+    parser.add_argument("--jobs", metavar="FILE",
+                        help="headless: process every folder listed in this JSON file, each with the saved settings "
+                             "or its own profile")
+    parser.add_argument("--folders", nargs="+", metavar="FOLDER",
+                        help="headless: process these folders with the saved settings")
+    parser.add_argument("--render-cache-mb", type=int,
+                        help="disk budget of the render cache shared by all folders, 0 turns it off "
+                             f"(default: the RenderCache max_megabytes setting, or {DEFAULT_MAX_MEGABYTES})")
+    parser.add_argument("--memory-profile", action="store_true",
+                        help="track memory per stage during the batch and print a report at the end (slow)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="list what the batch would render, skip and write, with an estimated duration, "
+                             "without changing any file")
+    parser.add_argument("--backgrounds", metavar="PATH",
+                        help="headless: folder of images or JSON rules file picking a background per track "
+                             "(default: the saved one, if any)")
+    parser.add_argument("--title-from-tags", action="store_true",
+                        help="headless: read the title, speaker and date from the audio tags when present, "
+                             "for files named by a recorder")
+    parser.add_argument("--name-template", metavar="TEMPLATE",
+                        help="name the artwork files with these tokens instead of the audio file name, e.g. "
+                             "\"{YYYY}-{MM}-{DD} {title}\" or \"{index:03d} {stem}\"; tokens: "
+                             + ", ".join(NAME_TOKENS))
+    parser.add_argument("--cpu-profile", action="store_true",
+                        help="profile the batch and write pstats and collapsed stacks to the cache directory")
+    subparsers = parser.add_subparsers(dest="command")
+    query = subparsers.add_parser("query", help="answer a question about every track rendered so far, "
+                                                "from the catalog without opening the audio files")
+    query.add_argument("question", choices=list(QUERIES),
+                       help="no-artwork: tracks without artwork; old-style: tracks rendered with other settings "
+                            "than their folder's latest; failed: tracks whose last run failed; folders: per folder "
+                            "totals; search: tracks whose title, speaker or file name contains --text")
+    query.add_argument("--folder", help="only tracks of this audio folder")
+    query.add_argument("--text", default="", help="text to search for")
+    return parser.parse_args(argv)
 
-def place_text_on_image(data, heading_lines, subheading_lines, image_path):
+@contextmanager
+def profiled(args, gui=False):
     '''
-        "top-left",
-        "top-center",
-        "top-right",
-        "middle-left",
-        "middle-center",
-        "middle-right",
-        "bottom-left",
-        "bottom-center",
-        "bottom-right"
-        returns the position of the text in the image
-        returns a tuple of the x and y coordinates
-        (x, y)
+        Turns on the profilers asked for on the command line for the batch only, not the wizard
+        With gui the CPU profile leaves out this thread, which runs the Qt event loop while the workers render
     '''
+    memory_profiler = None
+    cpu_profiler = None
+    if args.memory_profile:
+        memory_profiler = MemoryProfiler()
+        memory_profiler.start()
+        timings.add_listener(memory_profiler)
+    if args.cpu_profile:
+        cpu_profiler = CpuProfiler(include_caller=not gui)
+        cpu_profiler.start()
+    try:
+        yield
+    finally:
+        if cpu_profiler:
+            cpu_profiler.stop()
+            print(cpu_profiler.report())
+            stats_path, collapsed_path = cpu_profiler.write(os.path.join(get_cache_dir(), "profiles"))
+            if stats_path:
+                print(f"CPU profile written to {stats_path} and {collapsed_path}")
+        if memory_profiler:
+            timings.remove_listener(memory_profiler)
+            memory_profiler.stop()
+            print(memory_profiler.report())
 
-    total_height = 0    
-    for line in heading_lines:
-        total_height += get_px_size(line, data["title"]["font_family"], data["title"]["font_size"])[1]
-    for line in subheading_lines:
-        total_height += get_px_size(line, data["title"]["font_family"], data["title"]["font_size"])[1]
+def get_render_cache(args):
+    cache_dir = get_cache_dir()
+    max_megabytes = args.render_cache_mb
+    if max_megabytes is None:
+        max_megabytes = get_component_cache(cache_dir, "RenderCache").get("max_megabytes", DEFAULT_MAX_MEGABYTES)
+    if max_megabytes <= 0:
+        return None
+    return RenderCache(os.path.join(cache_dir, "renders"), max_megabytes * 1024 * 1024)
 
-    with Image.open(image_path) as image:
-        if data["title"]["position"]["position_name"] == "top-left":
-            x,y = 0,0
-            for line in heading_lines:
-                image, (x,y) = draw_text_on_image((x,y), line, data, image)
-            for line in subheading_lines:
-                image, (x,y) = draw_text_on_image((x,y), line, data, image)
-        elif data["title"]["position"]["position_name"] == "top-center":
-            y=0
-            for line in heading_lines:
-                x = (IMAGE_WIDTH - get_px_size(line, data["title"]["font_family"], data["title"]["font_size"])[0])/2
-                image, (x,y) = draw_text_on_image((x,y), line, data, image)
-            for line in subheading_lines:
-                x = (IMAGE_WIDTH - get_px_size(line, data["title"]["font_family"], data["title"]["font_size"])[0])/2
-                image, (x,y) = draw_text_on_image((x,y), line, data, image)
-        elif data["title"]["position"]["position_name"] == "top-right":
-            y=0
-            for line in heading_lines:
-                x = IMAGE_WIDTH - get_px_size(line, data["title"]["font_family"], data["title"]["font_size"])[0]
-                image, (x,y) = draw_text_on_image((x,y), line, data, image)
-            for line in subheading_lines:
-                x = IMAGE_WIDTH - get_px_size(line, data["title"]["font_family"], data["title"]["font_size"])[0]
-                image, (x,y) = draw_text_on_image((x,y), line, data, image)
-        elif data["title"]["position"]["position_name"] == "middle-left":
-            x = 0
-            y = (IMAGE_HEIGHT - BOTTOM_BAR_HEIGHT - total_height)/2
-            for line in heading_lines:
-                image, (x,y) = draw_text_on_image((x,y), line, data, image)
-            for line in subheading_lines:
-                image, (x,y) = draw_text_on_image((x,y), line, data, image)
-        elif data["title"]["position"]["position_name"] == "middle-center":
-            y = (IMAGE_HEIGHT - BOTTOM_BAR_HEIGHT - total_height)/2
-            for line in heading_lines:
-                x = (IMAGE_WIDTH - get_px_size(line, data["title"]["font_family"], data["title"]["font_size"])[0])/2
-                image, (x,y) = draw_text_on_image((x,y), line, data, image)
-            for line in subheading_lines:
-                x = (IMAGE_WIDTH - get_px_size(line, data["title"]["font_family"], data["title"]["font_size"])[0])/2
-                image, (x,y) = draw_text_on_image((x,y), line, data, image)
-        elif data["title"]["position"]["position_name"] == "middle-right":
-            y = (IMAGE_HEIGHT - BOTTOM_BAR_HEIGHT - total_height)/2
-            for line in heading_lines:
-                x = IMAGE_WIDTH - get_px_size(line, data["title"]["font_family"], data["title"]["font_size"])[0]
-                image, (x,y) = draw_text_on_image((x,y), line, data, image)
-            for line in subheading_lines:
-                x = IMAGE_WIDTH - get_px_size(line, data["title"]["font_family"], data["title"]["font_size"])[0]
-                image, (x,y) = draw_text_on_image((x,y), line, data, image)
-        elif data["title"]["position"]["position_name"] == "bottom-left":
-            x,y = 0, IMAGE_HEIGHT - BOTTOM_BAR_HEIGHT - total_height
-            for line in heading_lines:
-                image, (x,y) = draw_text_on_image((x,y), line, data, image)
-            for line in subheading_lines:
-                image, (x,y) = draw_text_on_image((x,y), line, data, image)
-        elif data["title"]["position"]["position_name"] == "bottom-center":
-            y = IMAGE_HEIGHT - BOTTOM_BAR_HEIGHT - total_height
-            for line in heading_lines:
-                x = (IMAGE_WIDTH - get_px_size(line, data["title"]["font_family"], data["title"]["font_size"])[0])/2
-                image, (x,y) = draw_text_on_image((x,y), line, data, image)
-            for line in subheading_lines:
-                x = (IMAGE_WIDTH - get_px_size(line, data["title"]["font_family"], data["title"]["font_size"])[0])/2
-                image, (x,y) = draw_text_on_image((x,y), line, data, image)
-        elif data["title"]["position"]["position_name"] == "bottom-right":
-            y = IMAGE_HEIGHT - BOTTOM_BAR_HEIGHT - total_height
-            for line in heading_lines:
-                x = IMAGE_WIDTH - get_px_size(line, data["title"]["font_family"], data["title"]["font_size"])[0]
-                image, (x,y) = draw_text_on_image((x,y), line, data, image)
-            for line in subheading_lines:
-                x = IMAGE_WIDTH - get_px_size(line, data["title"]["font_family"], data["title"]["font_size"])[0]
-                image, (x,y) = draw_text_on_image((x,y), line, data, image)
-        image.save(image_path)
-        
-def get_casing_text(text, casing):
-    if casing == "Normal":
-        return text
-    elif casing == "UPPERCASE":
-        return text.upper()
-    elif casing == "lowercase":
-        return text.lower()
-    elif casing == "Capitalize":
-        data = text.split(" ")
-        for i in range(len(data)):
-            data[i] = data[i].capitalize()
-        return " ".join(data)
-    else:
-        return text
+def get_headless_data(args):
+    try:
+        data = get_saved_settings(get_cache_dir())
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    if args.folder:
+        data["audio_folder"] = os.path.abspath(args.folder)
+    if args.backgrounds:
+        data["backgrounds"] = os.path.abspath(args.backgrounds)
+    if args.title_from_tags:
+        data["title"]["from_tags"] = True
+    if not os.path.isdir(data["audio_folder"]):
+        print(f"Invalid folder path: {data['audio_folder']}")
+        sys.exit(1)
+    return data
 
 if __name__ == "__main__":
-    data = get_data()
+    args = parse_args()
+    logging.basicConfig(level=getattr(logging, args.log_level), format="%(levelname)s %(name)s: %(message)s")
+    try:
+        if args.name_template:
+            NameTemplate(args.name_template)
+        if args.outputs:
+            check_outputs([OUTPUT_PRESETS[name] for name in args.outputs])
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    if args.command == "query":
+        catalog = get_catalog()
+        if catalog is None:
+            sys.exit(1)
+        print_query(catalog.query(args.question, args.folder, args.text))
+        sys.exit()
+    if args.jobs or args.folders:
+        try:
+            shared_settings = get_saved_settings(get_cache_dir())
+            jobs = load_jobs(args.jobs, shared_settings) if args.jobs else []
+        except (OSError, ValueError) as e:
+            print(e)
+            sys.exit(1)
+        for folder in args.folders or []:
+            jobs.append(merge_settings(shared_settings, {"audio_folder": os.path.abspath(folder)}))
+        for job in jobs:
+            if args.name_template:
+                job["naming"] = args.name_template
+            if args.backgrounds:
+                job["backgrounds"] = os.path.abspath(args.backgrounds)
+            if args.title_from_tags:
+                job["title"]["from_tags"] = True
+        if args.outputs:
+            for job in jobs:
+                job["outputs"] = [OUTPUT_PRESETS[name] for name in args.outputs]
+        if args.dry_run:
+            render_cache = get_render_cache(args)
+            for job in jobs:
+                print_plan(plan_batch(job, get_cache_dir(), render_cache=render_cache))
+            sys.exit()
+        timings.reset()
+        with profiled(args):
+            result = run_jobs(jobs, render_cache=get_render_cache(args))
+        print_jobs_summary(result)
+        if not result["total"]["cancelled"]:
+            save_run_history(get_cache_dir(), timings.summary())
+        print(timings.report())
+        if args.timings_json:
+            timings.write_json(args.timings_json, extra={"summary": result})
+        sys.exit()
+    if args.watch or args.headless:
+        data = get_headless_data(args)
+    else:
+        data = get_data()
+    if args.outputs:
+        data["outputs"] = [OUTPUT_PRESETS[name] for name in args.outputs]
+    if args.name_template:
+        data["naming"] = args.name_template
     # print(data)
     # data = {
     #     'audio_folder': '/Users/vardan/Code/fiverr/Xjhon/audio-imager/dummy_data',
@@ -442,18 +347,27 @@ if __name__ == "__main__":
     #     'darkness': 0.25, 
     #     'aspect_ratio': 'do_nothing'
     # }
-    audio_files = [file for file in os.listdir(data["audio_folder"]) if file.endswith((".mp3", ".m4a"))]
-    for file in audio_files:
-        file_extention = file.split(".")[-1]
-        DD, MM, YYYY, [heading, subheading] = extract_date(file)
-        # data = apply_image_modifications(data)
-        file_path = write_on_bottom_bar(data, (DD, MM, YYYY, [heading, subheading]), f"{file.replace(file_extention,'png')}")
-
-        heading = get_casing_text(heading, data["title"]["casing"])
-        subheading = get_casing_text(subheading, data["title"]["casing"])
-
-        heading_lines = wrap_text(heading, data["title"]["font_family"], data["title"]["font_size"], IMAGE_WIDTH)
-        subheading_lines = wrap_text(subheading, data["title"]["font_family"], data["title"]["font_size"], IMAGE_WIDTH)
-        place_text_on_image(data, heading_lines, subheading_lines, file_path)
-        embed_artwork(data["audio_folder"])
-       
+    if args.dry_run:
+        print_plan(plan_batch(data, get_cache_dir(), render_cache=get_render_cache(args)))
+        sys.exit()
+    render_cache = get_render_cache(args)
+    if args.watch:
+        watch_folder(data, poll_interval=args.poll_interval, settle_seconds=args.settle_seconds,
+                     process_existing=args.process_existing, render_cache=render_cache)
+        sys.exit()
+    timings.reset()
+    with profiled(args, gui=not args.headless):
+        if args.headless:
+            try:
+                summary = run_batch(data, render_cache=render_cache)
+            except ValueError as e:
+                print(e)
+                sys.exit(1)
+        else:
+            summary = run_batch_with_progress(data, render_cache=render_cache)
+    print_summary(summary)
+    print(timings.report())
+    if summary["tracks"] and not summary["cancelled"]:
+        save_run_history(get_cache_dir(), timings.summary())
+    if args.timings_json:
+        timings.write_json(args.timings_json, extra={"summary": summary})
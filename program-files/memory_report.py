@@ -0,0 +1,132 @@
+import os
+import sys
+import threading
+import tracemalloc
+from instrumentation import STAGES
+
+def current_rss():
+    '''
+        Returns the resident set size of this process in bytes, or None where it cannot be read
+    '''
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    # Only the peak is available here, in bytes on macOS and kilobytes elsewhere
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def format_bytes(value):
+    if value is None:
+        return "-"
+    for unit in ["B", "KB", "MB"]:
+        if abs(value) < 1024:
+            return f"{value:.0f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB"
+
+class MemoryProfiler:
+    """
+    Timings listener that tracks memory around every span.
+    Per stage it records the Python allocations still held when the span ends (tracemalloc) and the highest RSS
+    sampled while the stage was running. A snapshot at start and stop shows where memory grew over the run.
+    Pillow allocates pixel buffers outside Python, so images show up in RSS but not in tracemalloc.
+    Spans of other worker threads overlap, so numbers are per stage rather than exact per call.
+    """
+    def __init__(self, sample_interval=0.05, frames=10):
+        self.sample_interval = sample_interval
+        self.frames = frames
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.active = {}  # thread id -> [(stage, traced memory at start)]
+        self.peak_rss = 0
+        self.start_snapshot = None
+        self.end_snapshot = None
+        self.stop_event = threading.Event()
+        self.sampler = None
+
+    def start(self):
+        tracemalloc.start(self.frames)
+        self.start_snapshot = tracemalloc.take_snapshot()
+        self.sampler = threading.Thread(target=self._sample, name="memory-sampler", daemon=True)
+        self.sampler.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.sampler.join()
+        self.end_snapshot = tracemalloc.take_snapshot()
+        self.traced_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    def _stage(self, name):
+        return self.stages.setdefault(name, {"calls": 0, "retained_total": 0, "retained_max": 0, "peak_rss": 0})
+
+    def _sample(self):
+        while not self.stop_event.wait(self.sample_interval):
+            rss = current_rss()
+            if rss is None:
+                return
+            with self.lock:
+                self.peak_rss = max(self.peak_rss, rss)
+                for spans in self.active.values():
+                    for name, _ in spans:
+                        stage = self._stage(name)
+                        stage["peak_rss"] = max(stage["peak_rss"], rss)
+
+    def span_started(self, name):
+        current = tracemalloc.get_traced_memory()[0]
+        with self.lock:
+            self.active.setdefault(threading.get_ident(), []).append((name, current))
+
+    def span_finished(self, name):
+        current = tracemalloc.get_traced_memory()[0]
+        with self.lock:
+            spans = self.active.get(threading.get_ident())
+            if not spans:
+                return
+            _, started = spans.pop()
+            retained = current - started
+            stage = self._stage(name)
+            stage["calls"] += 1
+            stage["retained_total"] += retained
+            stage["retained_max"] = max(stage["retained_max"], retained)
+
+    def summary(self, top=10):
+        '''
+            Returns the per-stage numbers and the allocation sites that grew the most between start and stop
+        '''
+        ordered = [name for name in STAGES if name in self.stages] + sorted(
+            name for name in self.stages if name not in STAGES)
+        # Imports done during the run are not interesting here
+        filters = [tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                   tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+                   tracemalloc.Filter(False, tracemalloc.__file__)]
+        growth = self.end_snapshot.filter_traces(filters).compare_to(
+            self.start_snapshot.filter_traces(filters), "lineno")[:top]
+        return {
+            "stages": {name: {**self.stages[name],
+                              "retained_mean": self.stages[name]["retained_total"] / max(1, self.stages[name]["calls"])}
+                       for name in ordered},
+            "peak_rss": self.peak_rss or current_rss(),
+            "traced_peak": self.traced_peak,
+            "growth": [{"site": str(stat.traceback[0]), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+                       for stat in growth],
+        }
+
+    def report(self, top=10):
+        summary = self.summary(top)
+        lines = [f"{'stage':<14}{'calls':>7}{'retained mean':>15}{'retained max':>15}{'peak RSS':>12}"]
+        for name, stats in summary["stages"].items():
+            lines.append(f"{name:<14}{stats['calls']:>7}{format_bytes(stats['retained_mean']):>15}"
+                         f"{format_bytes(stats['retained_max']):>15}{format_bytes(stats['peak_rss'] or None):>12}")
+        lines.append(f"Peak RSS {format_bytes(summary['peak_rss'])}, "
+                     f"peak traced Python allocations {format_bytes(summary['traced_peak'])}")
+        lines.append("Largest growth since start:")
+        for site in summary["growth"]:
+            lines.append(f"  {format_bytes(site['size_diff']):>10} {site['count_diff']:>+8} blocks  {site['site']}")
+        return "\n".join(lines)
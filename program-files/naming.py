@@ -0,0 +1,155 @@
+import json
+import logging
+import os
+import re
+import string
+import threading
+from renderer import extract_date
+
+logger = logging.getLogger(__name__)
+
+INDEXES_FILE = "file_indexes.json"
+
+# Artwork is named after its audio file unless the settings ask otherwise
+DEFAULT_NAME_TEMPLATE = "{stem}"
+
+# Tokens a name template can use, with what they stand for
+NAME_TOKENS = {
+    "stem": "the audio file name without its extension",
+    "ext": "the audio file extension without the dot, e.g. mp3",
+    "name": "the name the title is read from without its extension (the tag name with --title-from-tags)",
+    "YYYY": "year of the date in the name",
+    "MM": "month of the date in the name",
+    "DD": "day of the date in the name",
+    "speaker": "text before the date",
+    "title": "text after the date",
+    "index": "number of the file in its folder, from 1 in name order, later files get the next numbers, "
+             "e.g. {index:03d}",
+}
+DATE_TOKENS = {"YYYY", "MM", "DD", "speaker", "title"}
+
+# Characters that cannot be part of a file name on any of the platforms the app runs on
+UNSAFE_CHARACTERS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+class NameTemplate:
+    """
+    A naming template such as "{YYYY}-{MM}-{DD} {title}" or "{index:03d} {stem}", parsed once per run.
+    Unknown tokens and broken braces raise ValueError when the template is compiled rather than on the first track.
+    Tracks without a date in their name fall back to their file name when the template uses date tokens.
+    """
+    def __init__(self, template=None):
+        self.template = template or DEFAULT_NAME_TEMPLATE
+        try:
+            fields = [field for _, field, _, _ in string.Formatter().parse(self.template) if field is not None]
+        except ValueError as e:
+            raise ValueError(f"Invalid name template {self.template!r}: {e}")
+        for field in fields:
+            if field not in NAME_TOKENS:
+                raise ValueError(f"Unknown token {{{field}}} in the name template {self.template!r}, "
+                                 f"use one of {', '.join(NAME_TOKENS)}")
+        # A bad format spec such as {index:x3} only shows when formatting, try it on sample values
+        sample = dict.fromkeys(NAME_TOKENS, "")
+        sample["index"] = 1
+        try:
+            self.template.format(**sample)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid name template {self.template!r}: {e}")
+        self.uses_date = any(field in DATE_TOKENS for field in fields)
+        self.uses_index = "index" in fields
+        self.is_default = self.template == DEFAULT_NAME_TEMPLATE
+
+    def stem(self, file_name, name=None, index=None):
+        '''
+            Returns the artwork file name without extension for an audio file
+            name is what the title and date are read from, index the number of the file (see FileIndexes)
+        '''
+        stem, extension = os.path.splitext(file_name)
+        if self.is_default:
+            return stem
+        values = {"stem": stem, "ext": extension.lstrip("."), "name": os.path.splitext(name or file_name)[0],
+                  "index": index or 0}
+        if self.uses_date:
+            DD, MM, YYYY, [speaker, title] = extract_date(name or file_name)
+            if DD is None:
+                return stem
+            values.update(YYYY=YYYY, MM=MM, DD=DD, speaker=speaker, title=title.strip('"'))
+        result = UNSAFE_CHARACTERS.sub("-", self.template.format(**values)).strip(" .")
+        return result or stem
+
+class FileIndexes:
+    """
+    The {index} of every audio file, kept per folder in the cache directory so a number never moves.
+    The first run numbers the files in name order, files seen later get the next free numbers in name order,
+    so a file that sorts between two others does not shift their numbers onto each other's artwork.
+    Numbers of removed files are not given out again.
+    """
+    def __init__(self, cache_dir=None):
+        self.path = os.path.join(cache_dir, INDEXES_FILE) if cache_dir else None
+        self.lock = threading.Lock()
+        self.folders = {}  # absolute folder -> {file name: index}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.folders = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("Could not read the file indexes: %s", e)
+
+    def assign(self, folder, files):
+        '''
+            Returns {file name: index} for the files of a folder, numbering the new ones and saving them
+        '''
+        with self.lock:
+            indexes = self.folders.setdefault(os.path.abspath(folder), {})
+            new = sorted(file for file in files if file not in indexes)
+            if new:
+                start = max(indexes.values(), default=0) + 1
+                indexes.update({file: index for index, file in enumerate(new, start)})
+                self._save()
+            return {file: indexes[file] for file in files}
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump(self.folders, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning("Could not save the file indexes: %s", e)
+
+_indexes = None
+_indexes_lock = threading.Lock()
+
+def get_file_indexes():
+    '''
+        Returns the shared file indexes, loaded from the cache directory on first use
+    '''
+    global _indexes
+    if _indexes is None:
+        with _indexes_lock:
+            if _indexes is None:
+                from cached_data import get_cache_dir
+                _indexes = FileIndexes(get_cache_dir())
+    return _indexes
+
+def find_collisions(tracks):
+    '''
+        Returns {artwork path: [audio files]} for every artwork path more than one track would write
+        Paths are compared ignoring case, as two names that differ only in case are one file on macOS and Windows
+    '''
+    writers = {}
+    for track in tracks:
+        for path in track["artwork_paths"].values():
+            writers.setdefault(os.path.normcase(path).lower(), (path, []))[1].append(track["file"])
+    return {path: files for path, files in writers.values() if len(files) > 1}
+
+def collision_message(collisions, limit=5):
+    '''
+        Describes the first collisions in one message
+    '''
+    lines = [f"{os.path.basename(path)} would be written by {', '.join(files)}"
+             for path, files in sorted(collisions.items())[:limit]]
+    if len(collisions) > limit:
+        lines.append(f"and {len(collisions) - limit} more")
+    return f"{len(collisions)} artwork files would be overwritten, change the name template: " + "; ".join(lines)
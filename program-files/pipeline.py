@@ -0,0 +1,162 @@
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Put on a queue once per worker to tell it there is nothing left to do
+_DONE = object()
+
+class StageStats:
+    """
+    Counters for one pipeline stage
+    """
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.max_queue_depth = 0
+        self.started_at = None
+        self.finished_at = None
+        self.lock = threading.Lock()
+
+    def record(self, seconds, ok):
+        with self.lock:
+            self.busy_seconds += seconds
+            if ok:
+                self.processed += 1
+            else:
+                self.failed += 1
+
+    def record_depth(self, depth):
+        with self.lock:
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+
+    def as_dict(self, queue_depth):
+        with self.lock:
+            end = self.finished_at or time.perf_counter()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            done = self.processed + self.failed
+            return {
+                "workers": self.workers,
+                "processed": self.processed,
+                "failed": self.failed,
+                "busy_seconds": self.busy_seconds,
+                "throughput": done / elapsed if elapsed > 0 else 0.0,
+                "queue_depth": queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+            }
+
+class Pipeline:
+    """
+    Runs items through a chain of stages, each with its own worker threads.
+    Stages are connected by bounded queues, so a slow stage blocks the ones before it
+    instead of letting finished work pile up in memory.
+
+    stages is a list of (name, function, workers). Each function takes the item
+    returned by the previous stage and returns the item for the next one.
+    """
+    def __init__(self, stages, queue_size=8):
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self.stats = [StageStats(name, workers) for name, _, workers in stages]
+        self.skipped = 0
+        self.cancel_event = None
+        self.errors = []
+        self.errors_lock = threading.Lock()
+        self._remaining = [workers for _, _, workers in stages]
+        self._remaining_lock = threading.Lock()
+
+    def _put(self, index, item):
+        self.queues[index].put(item)
+        self.stats[index].record_depth(self.queues[index].qsize())
+
+    def _callback(self, callback, *args):
+        # A failing callback is logged, it must not stop the worker before it hands over to the next stage
+        try:
+            callback(*args)
+        except Exception:
+            logger.exception("Pipeline callback %s failed", getattr(callback, "__name__", callback))
+
+    def _worker(self, index, on_result, on_error):
+        name, func, _ = self.stages[index]
+        stats = self.stats[index]
+        is_last = index == len(self.stages) - 1
+        try:
+            while True:
+                item = self.queues[index].get()
+                if item is _DONE:
+                    break
+                # Once cancelled, items that have not started yet are dropped so nothing is left half done
+                if index == 0 and self.cancel_event is not None and self.cancel_event.is_set():
+                    with stats.lock:
+                        self.skipped += 1
+                    continue
+                start = time.perf_counter()
+                try:
+                    result = func(item)
+                except Exception as e:
+                    stats.record(time.perf_counter() - start, ok=False)
+                    with self.errors_lock:
+                        self.errors.append((name, item, e))
+                    if on_error:
+                        self._callback(on_error, name, item, e)
+                    continue
+                stats.record(time.perf_counter() - start, ok=True)
+                if is_last:
+                    if on_result:
+                        self._callback(on_result, result)
+                else:
+                    self._put(index + 1, result)
+        finally:
+            # The last worker of a stage to finish tells every worker of the next stage to stop
+            with self._remaining_lock:
+                self._remaining[index] -= 1
+                stage_finished = self._remaining[index] == 0
+            if stage_finished:
+                stats.finished_at = time.perf_counter()
+                if not is_last:
+                    for _ in range(self.stages[index + 1][2]):
+                        self.queues[index + 1].put(_DONE)
+
+    def run(self, items, on_result=None, on_error=None, cancel_event=None):
+        """
+        Feeds items into the first stage and blocks until every stage has drained.
+        If cancel_event is set, no new items are started; items already past the first stage still finish.
+        """
+        self.cancel_event = cancel_event
+        started = time.perf_counter()
+        for stats in self.stats:
+            stats.started_at = started
+
+        threads = []
+        for index, (name, _, workers) in enumerate(self.stages):
+            for n in range(workers):
+                thread = threading.Thread(target=self._worker, args=(index, on_result, on_error),
+                                          name=f"{name}-{n}", daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        try:
+            for item in items:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                self._put(0, item)
+        finally:
+            for _ in range(self.stages[0][2]):
+                self.queues[0].put(_DONE)
+            for thread in threads:
+                thread.join()
+
+    def queue_depths(self):
+        return {name: self.queues[i].qsize() for i, (name, _, _) in enumerate(self.stages)}
+
+    def get_stats(self):
+        """
+        Returns the per-stage counters, keyed by stage name
+        """
+        return {stats.name: stats.as_dict(self.queues[i].qsize()) for i, stats in enumerate(self.stats)}
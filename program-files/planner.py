@@ -0,0 +1,146 @@
+import logging
+import os
+from batch_runner import plan_tracks, default_render_workers, output_collisions, make_job, track_render_keys
+from cached_data import get_component_cache, update_component_cache
+from embed_artwork import read_embedded_cover, artwork_digest
+from renderer import (extract_date, get_casing_text, wrap_text, title_fits, fit_title, get_layout,
+                      scaled_font_size)
+
+logger = logging.getLogger(__name__)
+
+# Stages that run once per track, grouped by the pipeline stage they run in
+PIPELINE_STAGES = {"render": ["base_render", "text_layout"], "encode": ["encode"], "write": ["save", "tag_embed"]}
+
+def save_run_history(cache_dir, stage_summary, render_workers=None):
+    '''
+        Remembers the mean stage times of a run, for the estimates of later dry runs
+    '''
+    history = get_component_cache(cache_dir, "RunHistory")
+    # Settings signatures of earlier versions, up to date tracks are now told by their render cache keys
+    history.pop("folders", None)
+    if stage_summary:
+        history["stages"] = {name: stats["mean"] for name, stats in stage_summary.items()}
+        history["render_workers"] = render_workers or default_render_workers()
+    update_component_cache(cache_dir, "RunHistory", history)
+
+def estimate_seconds(history, track_count):
+    '''
+        Estimates how long rendering track_count tracks takes from the stage times of earlier runs
+        The pipeline runs at the speed of its slowest stage, so that stage decides the estimate
+        Returns None when no run has been recorded yet
+    '''
+    stages = history.get("stages")
+    if not stages:
+        return None
+    render_workers = history.get("render_workers") or default_render_workers()
+    workers = {"render": render_workers, "encode": max(1, render_workers // 2), "write": 2}
+    per_track = max(sum(stages.get(name, 0.0) for name in names) / workers[stage]
+                    for stage, names in PIPELINE_STAGES.items())
+    return stages.get("image_load", 0.0) + per_track * track_count
+
+def title_overflows(data, heading, subheading, layout):
+    '''
+        Returns True when the wrapped title at the chosen size does not fit above the bar
+        Titles with auto-fit on are shrunk instead, they only overflow if the smallest size does not fit
+    '''
+    font_family = data["title"]["font_family"]
+    font_size = scaled_font_size(data["title"]["font_size"], layout)
+    if data["title"].get("auto_fit"):
+        font_size, heading_lines, subheading_lines = fit_title(data, heading, subheading, layout)
+    else:
+        heading_lines = wrap_text(heading, font_family, font_size, layout["width"])
+        subheading_lines = wrap_text(subheading, font_family, font_size, layout["width"])
+    max_height = layout["height"] - layout["bar_height"]
+    position = data["title"]["position"]
+    if position.get("type") == "custom":
+        max_height -= position.get("top", 0) * layout["scale"]
+    return not title_fits(heading_lines + subheading_lines, font_family, font_size, layout["width"], max_height)
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return artwork_digest(f.read())
+
+def is_up_to_date(job, track):
+    '''
+        A track is up to date when the render cache holds what this run would produce for every output
+        (same settings, base image, fonts and name), each output file on disk is those bytes and the embedded
+        cover is the embedded output. Nothing is rendered: without the cached artwork a track is not up to date
+    '''
+    render_cache = job["render_cache"]
+    if render_cache is None:
+        return False
+    keys = track_render_keys(job, track)
+    if not all(keys):
+        return False
+    for key, output in zip(keys, job["outputs"]):
+        path = track["artwork_paths"][output["name"]]
+        if not os.path.exists(path):
+            return False
+        artwork = render_cache.peek(key)
+        if artwork is None:
+            return False
+        digest = artwork_digest(artwork)
+        if file_digest(path) != digest:
+            return False
+        if output.get("embed"):
+            cover = read_embedded_cover(track["audio_path"])
+            if cover is None or artwork_digest(cover) != digest:
+                return False
+    return True
+
+def plan_batch(data, cache_dir, files=None, render_cache=None):
+    '''
+        Works out what a batch would do without rendering or writing anything
+        With the render cache, tracks whose artwork and cover already are what this run would produce are
+        listed as up to date: the batch takes them from the cache and leaves their tags alone
+        Returns {"render": [...], "skip": [...], "overflow": [...], "collisions": {...}, "estimated_seconds": ...}
+    '''
+    folder = data["audio_folder"]
+    history = get_component_cache(cache_dir, "RunHistory")
+    layout = get_layout()
+    # Only the base images are prepared, to know the render cache keys
+    job = make_job(data, render_cache=render_cache, catalog=None, create_folders=False)
+    tracks = plan_tracks(data, files, job)
+    plan = {"folder": folder, "render": [], "skip": [], "overflow": [],
+            "collisions": output_collisions(data, tracks, files)}
+    for track in tracks:
+        DD, MM, YYYY, [heading, subheading] = extract_date(track["name"])
+        if DD is None:
+            plan["skip"].append({"file": track["file"], "reason": "no date in the name"})
+            continue
+        try:
+            if is_up_to_date(job, track):
+                plan["skip"].append({"file": track["file"], "reason": "up to date"})
+                continue
+        except Exception as e:
+            logger.debug("Could not compare the artwork of %s: %s", track["file"], e)
+        plan["render"].append({"file": track["file"], "outputs": track["artwork_paths"]})
+        heading = get_casing_text(heading, data["title"]["casing"])
+        subheading = get_casing_text(subheading, data["title"]["casing"])
+        if title_overflows(data, heading, subheading, layout):
+            plan["overflow"].append(track["file"])
+    plan["estimated_seconds"] = estimate_seconds(history, len(plan["render"]))
+    return plan
+
+def print_plan(plan):
+    print(f"{plan['folder']}: {len(plan['render'])} to render, {len(plan['skip'])} to skip")
+    for track in plan["render"]:
+        print(f"  render {track['file']}")
+        for path in track["outputs"].values():
+            print(f"      -> {path}")
+    for track in plan["skip"]:
+        print(f"  skip   {track['file']} ({track['reason']})")
+    if plan["collisions"]:
+        # The batch refuses to start with these, better to hear it now than after the renders
+        print(f"  {len(plan['collisions'])} artwork files would be written by more than one track:")
+        for path, files in sorted(plan["collisions"].items()):
+            print(f"    {path} <- {', '.join(files)}")
+    if plan["overflow"]:
+        print(f"  {len(plan['overflow'])} titles will not fit above the bar:")
+        for file in plan["overflow"]:
+            print(f"    {file}")
+    if plan["estimated_seconds"] is None:
+        print("  No earlier run recorded, cannot estimate the duration")
+    else:
+        minutes, seconds = divmod(int(round(plan["estimated_seconds"])), 60)
+        print(f"  Estimated duration {minutes:02d}:{seconds:02d}")
@@ -0,0 +1,180 @@
+import threading
+import time
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
+                             QProgressBar, QListWidget, QApplication)
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtGui import QFont
+from batch_runner import run_batch
+from renderer import list_audio_files
+
+class BatchWorker(QThread):
+    """
+    Runs the batch off the GUI thread and reports every finished track
+    """
+    trackDone = pyqtSignal(dict)
+    trackFailed = pyqtSignal(str, str, str)  # file, stage, error
+    batchFinished = pyqtSignal(dict)
+
+    def __init__(self, data, files=None, render_cache=None, parent=None):
+        super().__init__(parent)
+        self.data = data
+        self.files = files
+        self.render_cache = render_cache
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            summary = run_batch(
+                self.data,
+                files=self.files,
+                cancel_event=self.cancel_event,
+                render_cache=self.render_cache,
+                on_track_done=lambda track: self.trackDone.emit({"file": track["file"], "status": track["status"]}),
+                on_track_error=lambda track, stage, error: self.trackFailed.emit(track["file"], stage, str(error)),
+            )
+        except Exception as e:
+            # The batch could not start at all, e.g. the base image failed to load
+            summary = {"tracks": 0, "embedded": 0, "rewritten": 0, "unchanged": 0, "written": 0, "failed": 0,
+                       "skipped": 0, "cancelled": False, "elapsed": 0.0, "stages": {}, "rewritten_files": [],
+                       "errors": [{"file": "", "stage": "setup", "error": str(e)}]}
+        self.batchFinished.emit(summary)
+
+class BatchProgressDialog(QDialog):
+    """
+    Shows the progress of a batch run with a cancel button.
+    Cancelling stops at a track boundary: tracks already being written are finished, the rest are not started.
+    """
+    def __init__(self, data, total, files=None, render_cache=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Generating Images")
+        self.setMinimumSize(500, 400)
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.started_at = time.perf_counter()
+        self.summary = None
+
+        self.initUI()
+
+        self.worker = BatchWorker(data, files=files, render_cache=render_cache, parent=self)
+        self.worker.trackDone.connect(self.on_track_done)
+        self.worker.trackFailed.connect(self.on_track_failed)
+        self.worker.batchFinished.connect(self.on_batch_finished)
+        self.worker.start()
+
+    def initUI(self):
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(20, 20, 20, 20)
+        layout.setSpacing(12)
+
+        self.status_label = QLabel(f"0 / {self.total} tracks")
+        self.status_label.setFont(QFont("Arial", 12, QFont.Bold))
+        layout.addWidget(self.status_label)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, max(self.total, 1))
+        self.progress_bar.setValue(0)
+        layout.addWidget(self.progress_bar)
+
+        self.rate_label = QLabel("Starting...")
+        layout.addWidget(self.rate_label)
+
+        errors_label = QLabel("Errors")
+        errors_label.setFont(QFont("Arial", 10, QFont.Bold))
+        layout.addWidget(errors_label)
+        self.error_list = QListWidget()
+        layout.addWidget(self.error_list)
+
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setFixedSize(100, 35)
+        self.cancel_button.setStyleSheet("""
+            QPushButton {
+                background-color: #f44336;
+                color: white;
+                border: none;
+                border-radius: 4px;
+                font-size: 14px;
+            }
+            QPushButton:hover {
+                background-color: #d32f2f;
+            }
+            QPushButton:pressed {
+                background-color: #b71c1c;
+            }
+            QPushButton:disabled {
+                background-color: #cccccc;
+                color: #666666;
+            }
+        """)
+        self.cancel_button.clicked.connect(self.on_cancel_clicked)
+        button_layout.addWidget(self.cancel_button)
+        layout.addLayout(button_layout)
+
+    def update_labels(self):
+        finished = self.done + self.failed
+        self.progress_bar.setValue(finished)
+        self.status_label.setText(f"{finished} / {self.total} tracks")
+        elapsed = time.perf_counter() - self.started_at
+        rate = finished / elapsed if elapsed > 0 else 0.0
+        if rate > 0:
+            remaining = (self.total - finished) / rate
+            minutes, seconds = divmod(int(remaining), 60)
+            self.rate_label.setText(f"{rate:.1f} tracks/sec - ETA {minutes:02d}:{seconds:02d}")
+
+    def on_track_done(self, track):
+        self.done += 1
+        self.update_labels()
+
+    def on_track_failed(self, file, stage, error):
+        self.failed += 1
+        self.error_list.addItem(f"{file} ({stage}): {error}")
+        self.update_labels()
+
+    def on_cancel_clicked(self):
+        if self.summary is not None:
+            self.accept()
+            return
+        self.worker.cancel()
+        self.cancel_button.setEnabled(False)
+        self.rate_label.setText("Cancelling, finishing the tracks in progress...")
+
+    def on_batch_finished(self, summary):
+        self.summary = summary
+        for error in summary["errors"]:
+            if error["stage"] == "setup":
+                self.error_list.addItem(f"Could not start: {error['error']}")
+        if summary["cancelled"]:
+            self.rate_label.setText(f"Cancelled after {self.done + self.failed} tracks, "
+                                    f"{summary['skipped']} not started")
+        else:
+            self.rate_label.setText(f"Finished in {summary['elapsed']:.1f}s: {summary['embedded']} embedded, "
+                                    f"{summary['rewritten']} rewritten in full, {summary['unchanged']} unchanged, "
+                                    f"{summary['failed']} failed")
+        self.cancel_button.setText("Close")
+        self.cancel_button.setEnabled(True)
+
+    def reject(self):
+        # Closing the window while running cancels instead of abandoning the worker mid-track
+        if self.summary is None:
+            self.on_cancel_clicked()
+            return
+        super().reject()
+
+def run_batch_with_progress(data, files=None, render_cache=None):
+    """
+    Runs the batch with a progress dialog and returns the summary once the dialog is closed
+    """
+    app = QApplication.instance()
+    if app is None:
+        app = QApplication([])
+
+    files = files if files is not None else list_audio_files(data["audio_folder"])
+    dialog = BatchProgressDialog(data, total=len(files), files=files, render_cache=render_cache)
+    dialog.exec_()
+    dialog.worker.wait()
+    return dialog.summary
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from renderer import extract_date, text_runs
+
+logger = logging.getLogger(__name__)
+
+# Bump when a renderer change makes earlier renders of the same settings look different
+RENDER_CACHE_VERSION = 2
+DEFAULT_MAX_MEGABYTES = 512
+
+def image_digest(image):
+    '''
+        Hashes the pixels of a PIL image, so the same prepared base hashes the same whatever file it came from
+    '''
+    digest = hashlib.sha256(f"{image.mode}{image.size}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+def _font_identity(font_path):
+    try:
+        stat = os.stat(font_path)
+        return [font_path, stat.st_size, stat.st_mtime_ns]
+    except (OSError, TypeError):
+        return [font_path]
+
+def _canonical_hash(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+def settings_fingerprint(data, base_image, base_digest=None):
+    '''
+        Hashes everything that is the same for every track of a batch: the prepared base image,
+        the text and bar styles and the font files they use
+        Pass base_digest when image_digest(base_image) is already known
+    '''
+    return _canonical_hash({
+        "version": RENDER_CACHE_VERSION,
+        "base": base_digest or image_digest(base_image),
+        "title": data["title"],
+        "bottom_bar": data["bottom_bar"],
+        "fonts": [_font_identity(data["title"]["font_family"]), _font_identity(data["bottom_bar"]["font_family"])],
+    })
+
+def fallback_fonts(texts, font_paths):
+    '''
+        Returns the identities of the fallback fonts texts are drawn with in any casing, for characters the chosen
+        fonts do not have. Installing or updating a font can change them while the chosen fonts stay the same
+    '''
+    used = set()
+    for text in texts:
+        for cased in {text, text.upper(), text.lower()}:
+            for font_path in font_paths:
+                used.update(run_font for _, run_font in text_runs(cased, font_path) if run_font not in font_paths)
+    return [_font_identity(font_path) for font_path in sorted(used)]
+
+def render_key(fingerprint, file_name, output, font_paths=()):
+    '''
+        Returns the cache key of one output of one track, or None when the file name has no date to render
+        font_paths are the title and bar fonts, the fallback fonts the name needs with them are part of the key
+    '''
+    DD, MM, YYYY, text_parts = extract_date(file_name)
+    if DD is None:
+        return None
+    # Only the parts of the name that end up in the image, so copies of a recording in other folders hit
+    return _canonical_hash({"settings": fingerprint, "date": [DD, MM, YYYY], "text": text_parts, "output": output,
+                            "fallbacks": fallback_fonts(text_parts, list(font_paths))})
+
+class RenderCache:
+    """
+    Encoded artwork on disk keyed by render_key(), shared by every folder.
+    Least recently used entries are deleted once the folder grows past max_bytes.
+    Safe to use from several pipeline workers at once.
+    """
+    def __init__(self, folder, max_bytes=DEFAULT_MAX_MEGABYTES * 1024 * 1024):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = None  # key -> [size, last used] from least to most recently used, loaded on first use
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _load_index(self):
+        if self.entries is not None:
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        found = []
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    found.append((entry.name, [stat.st_size, stat.st_mtime]))
+        # Sorted once here, afterwards every use moves its entry to the end
+        self.entries = OrderedDict(sorted(found, key=lambda item: item[1][1]))
+        self.total_bytes = sum(size for size, _ in self.entries.values())
+
+    def peek(self, key):
+        '''
+            Returns the cached bytes or None without counting a hit or marking the entry as used, for dry runs
+        '''
+        with self.lock:
+            self._load_index()
+            if key not in self.entries:
+                return None
+        try:
+            with open(os.path.join(self.folder, key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def get(self, key):
+        '''
+            Returns the cached bytes or None, and marks the entry as recently used
+        '''
+        path = os.path.join(self.folder, key)
+        with self.lock:
+            self._load_index()
+            if key not in self.entries:
+                self.misses += 1
+                return None
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            # The file's mtime is the last use, so the order survives restarts
+            os.utime(path)
+        except OSError:
+            with self.lock:
+                self._forget(key)
+                self.misses += 1
+            return None
+        with self.lock:
+            if key in self.entries:
+                self.entries[key][1] = os.path.getmtime(path)
+                self.entries.move_to_end(key)
+            self.hits += 1
+        return content
+
+    def put(self, key, content):
+        path = os.path.join(self.folder, key)
+        with self.lock:
+            self._load_index()
+            if key in self.entries:
+                return
+        # Unique temp name, two workers may store the same key
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(content)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning("Could not store render in cache: %s", e)
+            return
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = [len(content), os.path.getmtime(path)]
+                self.total_bytes += len(content)
+            self._evict()
+
+    def _forget(self, key):
+        entry = self.entries.pop(key, None)
+        if entry:
+            self.total_bytes -= entry[0]
+
+    def _evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        while self.entries and self.total_bytes > self.max_bytes:
+            key = next(iter(self.entries))
+            try:
+                os.remove(os.path.join(self.folder, key))
+            except OSError:
+                pass
+            self._forget(key)
+        logger.debug("Render cache trimmed to %d bytes", self.total_bytes)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries or {}),
+                    "bytes": self.total_bytes}
@@ -0,0 +1,627 @@
+import io
+import logging
+import os
+import math
+import random
+import threading
+import weakref
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from instrumentation import span
+from glyph_coverage import get_glyph_coverage
+from smart_crop import content_crop_box, image_key
+
+logger = logging.getLogger(__name__)
+
+# Reference size the wizard settings are designed at: font sizes and custom positions are pixels of this size
+BOTTOM_BAR_HEIGHT = 143
+IMAGE_WIDTH = 800
+IMAGE_HEIGHT = 800
+AUDIO_EXTENSIONS = (".mp3", ".m4a")
+
+# Layout in units relative to the output size, so the same settings render at any resolution
+BOTTOM_BAR_RATIO = BOTTOM_BAR_HEIGHT / IMAGE_HEIGHT
+TEXT_WIDTH_RATIO = 0.9
+# Smallest title size auto-fit goes down to, in reference pixels
+MIN_TITLE_FONT_SIZE = 8
+# Auto color: mean luminance (0-255) behind the title between these gets a scrim, neither black nor white stands out
+SCRIM_LUMINANCE = (96, 160)
+# How much of the brightness the scrim keeps, and how far it reaches past the text as a share of the font size
+SCRIM_DARKNESS = 0.5
+SCRIM_PADDING = 0.2
+# Longest side the luminance of a base image is summed at, larger bases are averaged down first
+LUMINANCE_TABLE_SIZE = 1024
+
+# What the batch writes when data has no "outputs": the 800px PNG next to the audio file that gets embedded
+DEFAULT_OUTPUTS = [
+    {"name": "cover", "size": 800, "format": "PNG", "folder": "", "suffix": "", "embed": True},
+]
+
+# Common sizes that can be listed in data["outputs"] (or picked with main.py --outputs)
+OUTPUT_PRESETS = {
+    "cover": DEFAULT_OUTPUTS[0],
+    "directory": {"name": "directory", "size": 3000, "format": "JPEG", "quality": 90, "folder": "artwork-3000", "suffix": "", "embed": False},
+    "player": {"name": "player", "size": 1400, "format": "JPEG", "quality": 88, "folder": "artwork-1400", "suffix": "", "embed": False},
+    # Suffixed, so it can sit next to "cover" in the audio folder
+    "embed": {"name": "embed", "size": 600, "format": "PNG", "folder": "", "suffix": "-600", "embed": True},
+}
+
+FILE_EXTENSIONS = {"PNG": "png", "JPEG": "jpg", "WEBP": "webp"}
+
+# FreeType faces are not safe to share between threads, so every render worker keeps its own fonts
+_thread_fonts = threading.local()
+
+def load_font(font_family, font_size):
+    '''
+        Returns a font object, reusing the one already loaded by this thread
+    '''
+    fonts = getattr(_thread_fonts, "fonts", None)
+    if fonts is None:
+        fonts = _thread_fonts.fonts = {}
+    key = (font_family, font_size)
+    if key not in fonts:
+        fonts[key] = ImageFont.truetype(font_family, font_size)
+    return fonts[key]
+
+def load_run_font(font_family, font_size):
+    '''
+        Returns (font, scale) for drawing a run of text
+        Colour bitmap fonts (emoji) only load at their own sizes, those are drawn at the nearest size and scaled
+    '''
+    try:
+        return load_font(font_family, font_size), 1.0
+    except OSError:
+        sizes = get_glyph_coverage().bitmap_sizes(font_family)
+        if not sizes:
+            raise
+        native = min(sizes, key=lambda size: abs(size - font_size))
+        return load_font(font_family, native), font_size / native
+
+def text_runs(text, font_family):
+    '''
+        Splits text into [(run, font path)], characters the font does not have are drawn with a fallback font
+        Plain ASCII text never needs the glyph coverage index
+    '''
+    if text.isascii():
+        return [(text, font_family)]
+    return get_glyph_coverage().split_runs(text, font_family)
+
+def get_layout(size=None):
+    '''
+        Returns the pixel layout for an output size, given as (width, height)
+        scale converts reference pixels (font sizes, custom positions) to this size
+    '''
+    width, height = size or (IMAGE_WIDTH, IMAGE_HEIGHT)
+    return {
+        "width": width,
+        "height": height,
+        "bar_height": round(height * BOTTOM_BAR_RATIO),
+        "scale": width / IMAGE_WIDTH,
+    }
+
+def scaled_font_size(font_size, layout):
+    return max(1, round(font_size * layout["scale"]))
+
+def check_outputs(outputs):
+    '''
+        Raises ValueError when two outputs would write the same file for a track
+    '''
+    seen = {}
+    for output in outputs:
+        extension = FILE_EXTENSIONS.get(output.get("format", "PNG").upper(), "png")
+        target = (os.path.normpath(output.get("folder") or "."), output.get("suffix", "").lower(), extension)
+        if target in seen:
+            raise ValueError(f"The outputs {seen[target]} and {output['name']} would write the same file, "
+                             f"give one of them its own folder or suffix")
+        seen[target] = output["name"]
+
+def get_outputs(data):
+    '''
+        Returns the output sizes to write for every track, largest first
+        Raises ValueError for outputs that clash, see check_outputs
+        Only one cover is embedded, of several outputs marked for it the smallest is, e.g. "embed" next to "cover"
+    '''
+    outputs = sorted(data.get("outputs") or DEFAULT_OUTPUTS, key=lambda output: output["size"], reverse=True)
+    check_outputs(outputs)
+    embedded = [output for output in outputs if output.get("embed")]
+    if len(embedded) > 1:
+        outputs = [dict(output, embed=False) if output.get("embed") and output is not embedded[-1] else output
+                   for output in outputs]
+    return outputs
+
+def is_audio_file(file_name):
+    '''
+        Tells if we generate artwork for a file, the extension is compared ignoring case
+    '''
+    return file_name.lower().endswith(AUDIO_EXTENSIONS)
+
+def list_audio_files(folder):
+    '''
+        Returns the audio files in the folder that we generate artwork for
+    '''
+    return sorted(file for file in os.listdir(folder) if is_audio_file(file))
+
+# Brightness the background is multiplied by unless the settings say otherwise
+DEFAULT_DARKNESS = 0.75
+# One table per slider step, the darkness is rounded to whole percents before a table is picked
+_brightness_tables = {}
+
+def brightness_table(darkness):
+    '''
+        Returns the 256-entry lookup table that multiplies every channel value by darkness,
+        repeated for the three RGB bands as Image.point expects
+    '''
+    darkness = round(darkness, 2)
+    table = _brightness_tables.get(darkness)
+    if table is None:
+        table = [min(255, int(value * darkness + 0.5)) for value in range(256)] * 3
+        _brightness_tables[darkness] = table
+    return table
+
+def darken_image(image, darkness):
+    '''
+        Darkens an RGB image through the cached lookup table, the preview and the batch both use this
+    '''
+    return image.point(brightness_table(darkness))
+
+def smart_center_crop(image, new_size):
+    '''
+        new_size is a tuple (width, height)
+    '''
+    width, height = image.size
+    new_width, new_height = new_size
+
+    scale_w = new_width / width
+    scale_h = new_height / height
+    final_scale = max(scale_w, scale_h)
+    new_image = image.resize((int(width * final_scale), int(height * final_scale)))
+    extra_x = (width*final_scale - new_width) / 2
+    extra_y = (height*final_scale - new_height) / 2
+    new_image = new_image.crop((extra_x, extra_y, extra_x + new_width, extra_y + new_height))
+    return new_image
+
+def extract_date(string):
+    '''
+        This method extracts the date from the string
+        The allowed formats are as follows:
+            - MM-DD-YYYY
+            - YYYY-MM-DD
+            - MM_DD_YYYY
+            - YYYY_MM_DD
+        Returns (None, None, None, ["", ""]) when no date is found
+    '''
+    import re
+    file_extention = string.split(".")[-1]
+    string = string.strip().replace(f".{file_extention}", "")
+    pattern = r'(\d{2,4})[-_/](\d{2})[-_/](\d{2,4})'
+    match = re.search(pattern, string)
+    # Extract the date and split the text before and after the date
+    if match:
+        date_str = match.group(0)  # The entire matched date string
+        parts = string.split(date_str, 1)  # Split at the first occurrence of date
+        before_text = parts[0].strip().strip("-").strip(" ") if parts[0] else ""
+        after_text = parts[1].strip().strip("-").strip(" ") if len(parts) > 1 else ""
+        text_parts = [before_text, f"\"{after_text}\"" if after_text else ""]
+        if len(match.group(1)) == 4: # if the first is 4 digits, then it is the year, then it is in this format YYYY-MM-DD
+            return match.group(3), match.group(2), match.group(1), text_parts # return the day, month, year, and the text parts
+        elif len(match.group(1)) == 2: # if the first is 2 digits, then it is the month, then it is in this format MM-DD-YYYY
+            return match.group(2), match.group(1), match.group(3), text_parts # return the day, month, year, and the text parts
+    return None, None, None, ["", ""]
+
+def prepare_base_image(data, layout=None):
+    '''
+        This method darkens and crops the selected image to the layout size
+        It is done once per batch, the bottom bar is drawn per track on a copy of it
+    '''
+    layout = layout or get_layout()
+    width, height = layout["width"], layout["height"]
+    with span("image_load"), Image.open(data["image_path"]) as source:
+        source = source.convert("RGB")
+
+    with span("base_render"):
+        # crop the image first, so the darkening only touches the pixels that are kept
+        image = source
+        crop_method = data["aspect_ratio"]
+        if crop_method == "crop": # not actually crop
+            image = smart_center_crop(image, (width, height))
+        elif crop_method == "smart_crop":
+            # The window is picked on a small copy, then cut and resized from the full image in one pass
+            box = content_crop_box(source, width / height, image_key(data["image_path"]))
+            image = source.resize((width, height), box=box)
+        elif crop_method == "stretch":
+            image = image.resize((width, height))
+        elif crop_method == "do_nothing":
+            scale_factor = min(width/image.width, height/image.height)
+            if scale_factor < 1:
+                image = image.resize((int(image.width*scale_factor), int(image.height*scale_factor)))
+
+        # darken the image, the white canvas around an uncropped image stays white
+        image = darken_image(image, data["darkness"])
+
+        if crop_method == "do_nothing":
+            canvas = Image.new("RGB", (width, height), "white")
+            canvas.paste(image, (int(width/2-image.width/2), int(height/2-image.height/2 - layout["bar_height"]/2)))
+            image = canvas
+        return image
+
+def apply_image_modifications(data, base_image=None, layout=None):
+
+    '''
+        This method applies the image modifications to the image
+        The modifications are as follows:
+            - Darken the image
+            - Crop the image
+            - Add the bottom bar
+        This is the base image over which different titles will be written
+        Pass base_image (from prepare_base_image) to skip the darken and crop steps
+        Returns the image and the color used for the bottom bar
+    '''
+    layout = layout or get_layout()
+    if base_image is None:
+        image = prepare_base_image(data, layout)
+    else:
+        image = base_image.copy()
+
+    # Add the bottom bar
+    draw = ImageDraw.Draw(image)
+    color = data["bottom_bar"]["color"]
+    if color == "random":
+        color = genRandomColor()
+    draw.rectangle((0, layout["height"]-layout["bar_height"], layout["width"], layout["height"]), fill=color)
+    return image, color
+
+# Text sizes shared by every thread, the same words and titles are measured again for every track and folder
+_text_sizes = {}
+MAX_CACHED_TEXT_SIZES = 100000
+
+def get_px_size(text, font_family, font_size):
+    '''
+        This method returns the size of the font in pixels
+    '''
+    key = (text, font_family, font_size)
+    size = _text_sizes.get(key)
+    if size is not None:
+        return size
+    runs = text_runs(text, font_family)
+    if len(runs) == 1 and runs[0][1] == font_family:
+        font = load_font(font_family, font_size)
+        box = font.getbbox(text)
+        height = box[3] + box[1]  # we are adding because there is margin at top and bottom and margin is equal to the top value
+        width = box[2] + box[0]
+    else:
+        # Runs are laid out one after the other, the width ends at the last run's ink
+        width, height, x = 0, 0, 0
+        for run, run_font in runs:
+            font, scale = load_run_font(run_font, font_size)
+            box = font.getbbox(run)
+            width = x + (box[2] + box[0]) * scale
+            height = max(height, (box[3] + box[1]) * scale)
+            x += font.getlength(run) * scale
+        width, height = round(width), round(height)
+    if len(_text_sizes) >= MAX_CACHED_TEXT_SIZES:
+        _text_sizes.clear()
+    _text_sizes[key] = (width, height)
+    return width, height
+
+# Summed-area tables of base images by id(), each is dropped when its image is freed
+_luminance_tables = {}
+
+def luminance_table(image):
+    '''
+        Returns (summed-area table of the image luminance, scale from image pixels to table cells)
+        Built once per base image, after that the mean of any box costs four lookups
+    '''
+    key = id(image)
+    entry = _luminance_tables.get(key)
+    if entry is None:
+        scale = min(1.0, LUMINANCE_TABLE_SIZE / max(image.size))
+        gray = image.convert("L")
+        if scale < 1.0:
+            gray = gray.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.BOX)
+        table = np.zeros((gray.height + 1, gray.width + 1), dtype=np.int64)
+        table[1:, 1:] = np.asarray(gray, dtype=np.int64).cumsum(axis=0).cumsum(axis=1)
+        entry = _luminance_tables[key] = (table, scale)
+        weakref.finalize(image, _luminance_tables.pop, key, None)
+    return entry
+
+def mean_luminance(image, box):
+    '''
+        Returns the mean luminance (0-255) of image inside box (left, top, right, bottom), or None if the box is outside
+    '''
+    table, scale = luminance_table(image)
+    rows, columns = table.shape
+    left = min(columns - 1, max(0, int(box[0] * scale)))
+    top = min(rows - 1, max(0, int(box[1] * scale)))
+    right = min(columns - 1, max(0, math.ceil(box[2] * scale)))
+    bottom = min(rows - 1, max(0, math.ceil(box[3] * scale)))
+    if right <= left or bottom <= top:
+        return None
+    total = table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left]
+    return float(total) / ((right - left) * (bottom - top))
+
+def contrast_color(luminance):
+    return "black" if luminance >= 128 else "white"
+
+def genRandomColor():
+    '''
+        This method generates a random color
+    '''
+    color=  "#" + ''.join([random.choice('0123456789abcdef') for _ in range(6)])
+    logger.debug("Random bottom bar color %s", color)
+    return color
+
+def write_on_bottom_bar(data, date : tuple, image, color, layout=None):
+    '''
+        This method writes the date on the bottom bar of the image
+    '''
+    layout = layout or get_layout()
+    width, height, bar_height = layout["width"], layout["height"], layout["bar_height"]
+    font_size = scaled_font_size(data["bottom_bar"]["font_size"], layout)
+    draw = ImageDraw.Draw(image)
+    DD, MM, YYYY, [heading, subheading] = date
+    date_str=f"{MM}-{DD}-{YYYY}"
+    date_width, date_height = get_px_size(date_str, data["bottom_bar"]["font_family"], font_size)
+
+    ## Printing the date on the bottom bar
+    bottom_text_color = "black"
+    # Check if the background color is dark, then use white text
+    bg_color = color
+    # Convert hex to RGB if it's a hex color
+    if bg_color.startswith("#"):
+        r = int(bg_color[1:3], 16)
+        g = int(bg_color[3:5], 16)
+        b = int(bg_color[5:7], 16)
+        # Calculate perceived brightness (common formula)
+        brightness = (0.299 * r + 0.587 * g + 0.114 * b) / 255
+        if brightness < 0.5:  # If background is dark
+            bottom_text_color = "white"
+    font = load_font(data["bottom_bar"]["font_family"], font_size)
+    draw.text((width/2-date_width/2, height-bar_height+(bar_height/2-date_height/2)), date_str, fill=bottom_text_color, font=font)
+    return image
+
+def wrap_text(text, font_family, font_size, max_width):
+    '''
+        This method wraps the text to the correct width
+    '''
+    max_width = max_width*TEXT_WIDTH_RATIO
+    words = text.split(" ")
+    lines = []
+    current_line = ""
+    for word in words:
+        if get_px_size(current_line + " " + word, font_family, font_size)[0] <= max_width:
+            current_line += " " + word
+        else:
+            lines.append(current_line)
+            current_line = word
+        current_line = current_line.strip()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s %s", current_line, get_px_size(current_line, font_family, font_size)[0])
+    if current_line:
+        lines.append(current_line)
+    return lines
+
+def title_fits(lines, font_family, font_size, max_width, max_height):
+    total_height = 0
+    for line in lines:
+        line_width, line_height = get_px_size(line, font_family, font_size)
+        # wrap_text leaves a word wider than the line on a line of its own
+        if line_width > max_width * TEXT_WIDTH_RATIO:
+            return False
+        total_height += line_height
+    return total_height <= max_height
+
+def fit_title(data, heading, subheading, layout):
+    '''
+        Finds the largest title size, up to the chosen font size, at which the wrapped title fits above the bar
+        Binary search over sizes, so a track costs a few wraps and the measurements come from the shared cache
+        Returns (font_size, heading_lines, subheading_lines)
+    '''
+    font_family = data["title"]["font_family"]
+    width = layout["width"]
+    max_height = layout["height"] - layout["bar_height"]
+    position = data["title"]["position"]
+    if position.get("type") == "custom":
+        max_height -= position.get("top", 0) * layout["scale"]
+
+    def wrap(font_size):
+        return (wrap_text(heading, font_family, font_size, width), wrap_text(subheading, font_family, font_size, width))
+
+    low = min(scaled_font_size(MIN_TITLE_FONT_SIZE, layout), scaled_font_size(data["title"]["font_size"], layout))
+    high = scaled_font_size(data["title"]["font_size"], layout)
+    best = (low, *wrap(low))
+    while low <= high:
+        middle = (low + high) // 2
+        heading_lines, subheading_lines = wrap(middle)
+        if title_fits(heading_lines + subheading_lines, font_family, middle, width, max_height):
+            best = (middle, heading_lines, subheading_lines)
+            low = middle + 1
+        else:
+            high = middle - 1
+    return best
+
+def draw_text_on_image(position, text, data, image, font_size=None):
+    font_size = font_size or data["title"]["font_size"]
+    draw = ImageDraw.Draw(image)
+    font_family = data["title"]["font_family"]
+    runs = text_runs(text, font_family)
+    if len(runs) == 1 and runs[0][1] == font_family:
+        draw.text(position, text, fill=data["title"]["color"], font=load_font(font_family, font_size))
+    else:
+        x, y = position
+        for run, run_font in runs:
+            font, scale = load_run_font(run_font, font_size)
+            if scale == 1.0:
+                draw.text((x, y), run, fill=data["title"]["color"], font=font, embedded_color=True)
+            else:
+                # Draw the bitmap font at its own size and scale the result into place
+                box = font.getbbox(run)
+                run_image = Image.new("RGBA", (max(1, box[2]), max(1, box[3])))
+                ImageDraw.Draw(run_image).text((0, 0), run, fill=data["title"]["color"], font=font, embedded_color=True)
+                run_image = run_image.resize((max(1, round(box[2] * scale)), max(1, round(box[3] * scale))), Image.LANCZOS)
+                image.paste(run_image, (round(x), round(y)), run_image)
+            x += font.getlength(run) * scale
+    return image, (position[0], position[1] + get_px_size(text, data["title"]["font_family"], font_size)[1])
+
+def place_text_on_image(data, heading_lines, subheading_lines, image, layout=None, font_size=None, background=None):
+    '''
+        "top-left",
+        "top-center",
+        "top-right",
+        "middle-left",
+        "middle-center",
+        "middle-right",
+        "bottom-left",
+        "bottom-center",
+        "bottom-right"
+        or a custom position with "left" and "top" in reference pixels
+        draws the title lines at the selected position and returns the image
+        font_size is in layout pixels and defaults to the title's font size scaled to the layout
+        background is the image the title color is picked from with auto color on, by default the image itself
+    '''
+    layout = layout or get_layout()
+    width, height, bar_height = layout["width"], layout["height"], layout["bar_height"]
+    font_family = data["title"]["font_family"]
+    font_size = font_size or scaled_font_size(data["title"]["font_size"], layout)
+    lines = list(heading_lines) + list(subheading_lines)
+
+    total_height = 0
+    for line in lines:
+        total_height += get_px_size(line, font_family, font_size)[1]
+
+    # (x, y) of every line, worked out before drawing so auto color knows the box the title covers
+    positions = []
+    position = data["title"]["position"]
+    if position.get("type") == "custom":
+        x, y = position.get("left", 0) * layout["scale"], position.get("top", 0) * layout["scale"]
+        for line in lines:
+            positions.append((x, y))
+            y += get_px_size(line, font_family, font_size)[1]
+    else:
+        vertical, horizontal = position["position_name"].split("-")
+        if vertical == "top":
+            y = 0
+        elif vertical == "middle":
+            y = (height - bar_height - total_height)/2
+        else: # bottom, just above the bar
+            y = height - bar_height - total_height
+
+        for line in lines:
+            line_width, line_height = get_px_size(line, font_family, font_size)
+            if horizontal == "left":
+                x = 0
+            elif horizontal == "center":
+                x = (width - line_width)/2
+            else: # right
+                x = width - line_width
+            positions.append((x, y))
+            y += line_height
+
+    if data["title"].get("auto_color") and lines:
+        data = pick_title_color(data, lines, positions, image, background or image, font_size)
+
+    for line, (x, y) in zip(lines, positions):
+        image, _ = draw_text_on_image((x, y), line, data, image, font_size)
+    return image
+
+def pick_title_color(data, lines, positions, image, background, font_size):
+    '''
+        Returns data with the title color set to black or white, whichever stands out from the mean luminance
+        of the box the title covers on background
+        With the scrim on, a title over mid-tones gets the box darkened on image and white text
+    '''
+    font_family = data["title"]["font_family"]
+    boxes = []
+    for line, (x, y) in zip(lines, positions):
+        line_width, line_height = get_px_size(line, font_family, font_size)
+        boxes.append((x, y, x + line_width, y + line_height))
+    box = (min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes))
+    luminance = mean_luminance(background, box)
+    if luminance is None:
+        return data
+    color = contrast_color(luminance)
+    if data["title"].get("scrim") and SCRIM_LUMINANCE[0] <= luminance <= SCRIM_LUMINANCE[1]:
+        padding = font_size * SCRIM_PADDING
+        scrim_box = tuple(round(value) for value in (max(0, box[0] - padding), max(0, box[1] - padding),
+                                                     min(image.width, box[2] + padding),
+                                                     min(image.height, box[3] + padding)))
+        image.paste(darken_image(image.crop(scrim_box), SCRIM_DARKNESS), scrim_box[:2])
+        color = "white"
+    return {**data, "title": {**data["title"], "color": color}}
+
+def get_casing_text(text, casing):
+    if casing == "Normal":
+        return text
+    elif casing == "UPPERCASE":
+        return text.upper()
+    elif casing == "lowercase":
+        return text.lower()
+    elif casing == "Capitalize":
+        data = text.split(" ")
+        for i in range(len(data)):
+            data[i] = data[i].capitalize()
+        return " ".join(data)
+    else:
+        return text
+
+def render_track(data, file_name, base_image=None, layout=None):
+    '''
+        Renders the artwork for one audio file at the layout size and returns it as a PIL image
+        Raises ValueError if no date can be found in the file name
+    '''
+    layout = layout or get_layout()
+    title_font_size = scaled_font_size(data["title"]["font_size"], layout)
+    DD, MM, YYYY, [heading, subheading] = extract_date(file_name)
+    if DD is None:
+        raise ValueError(f"No date found in {file_name}")
+    if base_image is None:
+        # Outside the span below, prepare_base_image records its own image_load and base_render spans
+        base_image = prepare_base_image(data, layout)
+    with span("base_render"):
+        image, color = apply_image_modifications(data, base_image, layout)
+
+    with span("text_layout"):
+        image = write_on_bottom_bar(data, (DD, MM, YYYY, [heading, subheading]), image, color, layout)
+
+        heading = get_casing_text(heading, data["title"]["casing"])
+        subheading = get_casing_text(subheading, data["title"]["casing"])
+
+        if data["title"].get("auto_fit"):
+            title_font_size, heading_lines, subheading_lines = fit_title(data, heading, subheading, layout)
+        else:
+            heading_lines = wrap_text(heading, data["title"]["font_family"], title_font_size, layout["width"])
+            subheading_lines = wrap_text(subheading, data["title"]["font_family"], title_font_size, layout["width"])
+        # The luminance table is built once per shared base image rather than per track
+        return place_text_on_image(data, heading_lines, subheading_lines, image, layout, title_font_size, base_image)
+
+def encode_image(image, format="PNG", **options):
+    '''
+        Encodes the rendered image and returns the bytes, options are passed to the PIL encoder
+    '''
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **options)
+    return buffer.getvalue()
+
+def encode_outputs(image, outputs):
+    '''
+        Encodes one rendered image for every output size
+        image is rendered at the largest size, smaller sizes are downsampled from it instead of laid out again
+        Returns a list of (output, bytes)
+    '''
+    results = []
+    for output in outputs:
+        size = (output["size"], output["size"])
+        resized = image if image.size == size else image.resize(size, Image.LANCZOS)
+        options = {"quality": output["quality"]} if "quality" in output else {}
+        results.append((output, encode_image(resized, output.get("format", "PNG"), **options)))
+    return results
+
+def output_path(audio_folder, file_name, output, stem=None):
+    '''
+        Returns where the artwork for an audio file is written for one output size
+        A relative output folder is resolved against the audio folder
+        stem replaces the audio file name, see naming.NameTemplate
+    '''
+    folder = os.path.join(audio_folder, output.get("folder") or "")
+    extension = FILE_EXTENSIONS.get(output.get("format", "PNG").upper(), "png")
+    stem = stem if stem is not None else os.path.splitext(file_name)[0]
+    return os.path.join(folder, f"{stem}{output.get('suffix', '')}.{extension}")
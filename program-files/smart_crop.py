@@ -0,0 +1,80 @@
+import os
+import threading
+from PIL import Image, ImageFilter
+
+# Long side of the copy the crop window is picked on, the analysis cost does not grow with the photo
+PROXY_SIZE = 160
+# Windows within this share of the best edge energy count as equally good, the most central one wins
+TIE_TOLERANCE = 0.03
+
+_crop_windows = {}
+_crop_windows_lock = threading.Lock()
+
+def image_key(image_path):
+    '''
+        Identifies an image file by path, size and modification time, so an edited image is analysed again
+    '''
+    stat = os.stat(image_path)
+    return os.path.abspath(image_path), stat.st_size, stat.st_mtime_ns
+
+def edge_profile(image, axis):
+    '''
+        Returns the mean edge strength of every column (axis 0) or row (axis 1) of a small grayscale image
+    '''
+    edges = image.filter(ImageFilter.FIND_EDGES)
+    # The filter leaves the outermost pixels unfiltered, they would look like strong edges
+    edges = edges.crop((1, 1, edges.width - 1, edges.height - 1))
+    # A box resize down to one row or column averages the other axis in C
+    if axis == 0:
+        values = list(edges.resize((edges.width, 1), Image.BOX).getdata())
+    else:
+        values = list(edges.resize((1, edges.height), Image.BOX).getdata())
+    return [values[0]] + values + [values[-1]]
+
+def best_offset(profile, window):
+    '''
+        Returns where a window of the given length covers the most edge energy,
+        preferring the most central of near-equal windows so flat images stay centred
+    '''
+    prefix = [0]
+    for value in profile:
+        prefix.append(prefix[-1] + value)
+    sums = [prefix[start + window] - prefix[start] for start in range(len(profile) - window + 1)]
+    best = max(sums)
+    centre = (len(sums) - 1) / 2
+    return min((start for start, total in enumerate(sums) if total >= best * (1 - TIE_TOLERANCE)),
+               key=lambda start: abs(start - centre))
+
+def find_crop_window(image, ratio):
+    '''
+        Picks the largest window of the given width/height ratio over the most detailed part of the image
+        Returns (left, top, right, bottom) as fractions of the image size
+    '''
+    scale = PROXY_SIZE / max(image.size)
+    proxy_size = (max(3, round(image.width * scale)), max(3, round(image.height * scale)))
+    proxy = image.resize(proxy_size, Image.BOX).convert("L")
+    if image.width / image.height > ratio:
+        # Wider than the output, slide the window horizontally
+        window = max(1, min(proxy.width, round(proxy.height * ratio)))
+        width = image.height * ratio / image.width
+        left = min(best_offset(edge_profile(proxy, 0), window) / proxy.width, 1.0 - width)
+        return left, 0.0, left + width, 1.0
+    window = max(1, min(proxy.height, round(proxy.width / ratio)))
+    height = image.width / ratio / image.height
+    top = min(best_offset(edge_profile(proxy, 1), window) / proxy.height, 1.0 - height)
+    return 0.0, top, 1.0, top + height
+
+def content_crop_box(image, ratio, key=None):
+    '''
+        Returns the crop box in pixels of image for the given width/height ratio
+        Windows are cached by key (see image_key) and ratio, so the analysis runs once per image and settings
+    '''
+    cache_key = (key, round(ratio, 4)) if key is not None else None
+    window = _crop_windows.get(cache_key) if cache_key else None
+    if window is None:
+        window = find_crop_window(image, ratio)
+        if cache_key:
+            with _crop_windows_lock:
+                _crop_windows[cache_key] = window
+    left, top, right, bottom = window
+    return left * image.width, top * image.height, right * image.width, bottom * image.height
@@ -1,20 +1,22 @@
 from PyQt5.QtWidgets import (QDialog, QWidget, QVBoxLayout, QHBoxLayout,
-                            QPushButton, QLabel, QFrame)
+                            QPushButton, QLabel, QFrame, QCheckBox)
 from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QFont, QColor
 from ColorPicker import ColorPicker
 from font_style_selector import FontStyleSelector
 from text_position_selector import TextPositionSelector
+from live_preview import LivePreview
 
 class ImageTitleFormatter(QDialog):
     # Signal to emit the data when OK is clicked
     dataReady = pyqtSignal(dict)
     
-    def __init__(self, parent=None, cached_data=None):
+    def __init__(self, parent=None, cached_data=None, preview_data=None):
         super().__init__(parent)
         self.setWindowTitle("Podcast Title Formatter")
-        self.setMinimumSize(900, 700)  # Set a reasonable minimum size
+        self.setMinimumSize(1150, 700)  # Set a reasonable minimum size
         self.cached_data = cached_data
+        self.preview_data = preview_data
         self.initUI()
         
     def initUI(self):
@@ -51,6 +53,16 @@ class ImageTitleFormatter(QDialog):
         
         self.color_picker = ColorPicker(cached_data=self.cached_data)
         left_layout.addWidget(self.color_picker)
+        
+        # With auto color the title is black or white, whichever stands out from the image behind it
+        self.auto_color_checkbox = QCheckBox("Pick black or white from the image behind the title")
+        self.auto_color_checkbox.setChecked(bool(self.cached_data and self.cached_data.get("auto_color")))
+        left_layout.addWidget(self.auto_color_checkbox)
+        self.scrim_checkbox = QCheckBox("Darken behind the title when neither stands out")
+        self.scrim_checkbox.setChecked(bool(self.cached_data and self.cached_data.get("scrim")))
+        self.scrim_checkbox.setEnabled(self.auto_color_checkbox.isChecked())
+        self.auto_color_checkbox.toggled.connect(self.scrim_checkbox.setEnabled)
+        left_layout.addWidget(self.scrim_checkbox)
         left_layout.addStretch()
         
         # Right column (Font Style and Text Position)
@@ -72,6 +84,15 @@ class ImageTitleFormatter(QDialog):
         
         self.font_selector = FontStyleSelector(cached_data=self.cached_data)
         right_layout.addWidget(self.font_selector)
+
+        # With auto-fit the font size is the largest size, long titles are shrunk until they fit above the bar
+        self.auto_fit_checkbox = QCheckBox("Shrink long titles to fit above the bar")
+        self.auto_fit_checkbox.setChecked(bool(self.cached_data and self.cached_data.get("auto_fit")))
+        right_layout.addWidget(self.auto_fit_checkbox)
+        # For files named by a recorder (REC0012.mp3), the title and date can come from the tags instead
+        self.from_tags_checkbox = QCheckBox("Read the title, speaker and date from the audio tags when present")
+        self.from_tags_checkbox.setChecked(bool(self.cached_data and self.cached_data.get("from_tags")))
+        right_layout.addWidget(self.from_tags_checkbox)
         
         # Add some spacing between components
         spacer = QFrame()
@@ -88,9 +109,28 @@ class ImageTitleFormatter(QDialog):
         right_layout.addWidget(self.position_selector)
         right_layout.addStretch()
         
+        # Live preview column, rendered by the same code as the batch
+        preview_column = QFrame()
+        preview_column.setFrameStyle(QFrame.StyledPanel)
+        preview_column.setStyleSheet("""
+            QFrame {
+                background-color: #f8f8f8;
+                border: 1px solid #ddd;
+                border-radius: 8px;
+            }
+        """)
+        preview_layout = QVBoxLayout(preview_column)
+        preview_label = QLabel("Live Preview")
+        preview_label.setFont(QFont("Arial", 12, QFont.Bold))
+        preview_layout.addWidget(preview_label)
+        self.live_preview = LivePreview(preview_data=self.preview_data)
+        preview_layout.addWidget(self.live_preview)
+        preview_layout.addStretch()
+
         # Add columns to layout
         columns_layout.addWidget(left_column)
         columns_layout.addWidget(right_column)
+        columns_layout.addWidget(preview_column)
         
         # Add columns layout to main layout
         main_layout.addLayout(columns_layout)
@@ -155,6 +195,25 @@ class ImageTitleFormatter(QDialog):
         # Apply cached settings if available
         if self.cached_data:
             self.apply_cached_settings()
+
+        # Re-render the preview whenever a setting changes
+        self.color_picker.colorChanged.connect(self.update_preview)
+        self.font_selector.fontChanged.connect(self.update_preview)
+        self.position_selector.positionChanged.connect(self.update_preview)
+        self.auto_fit_checkbox.toggled.connect(self.update_preview)
+        self.auto_color_checkbox.toggled.connect(self.update_preview)
+        self.scrim_checkbox.toggled.connect(self.update_preview)
+        self.update_preview()
+
+    def update_preview(self, *args):
+        """Send the current settings to the live preview"""
+        self.live_preview.update_settings(title=self.get_all_data())
+
+    def done(self, result):
+        """Stop the preview workers before the dialog closes"""
+        self.live_preview.shutdown()
+        self.font_selector.shutdown()
+        super().done(result)
             
     def apply_cached_settings(self):
         """Apply cached settings to UI components"""
@@ -218,6 +277,11 @@ class ImageTitleFormatter(QDialog):
         self.font_selector.spacing_spin.setValue(1.0)
         # Reset text case to Normal
         self.font_selector.casing_combo.setCurrentText("Normal")
+        # Reset auto-fit, auto color and scrim to off
+        self.auto_fit_checkbox.setChecked(False)
+        self.from_tags_checkbox.setChecked(False)
+        self.auto_color_checkbox.setChecked(False)
+        self.scrim_checkbox.setChecked(False)
         
         # Reset position selector
         # Select preset position option
@@ -247,7 +311,11 @@ class ImageTitleFormatter(QDialog):
             'font_size': self.font_selector.get_current_font()['size'],
             'word_spacing': self.font_selector.spacing_spin.value(),
             'casing': self.font_selector.casing_combo.currentText(),
-            'position': self.position_selector.get_current_position()
+            'position': self.position_selector.get_current_position(),
+            'auto_fit': self.auto_fit_checkbox.isChecked(),
+            'from_tags': self.from_tags_checkbox.isChecked(),
+            'auto_color': self.auto_color_checkbox.isChecked(),
+            'scrim': self.auto_color_checkbox.isChecked() and self.scrim_checkbox.isChecked()
         }
         return data
     
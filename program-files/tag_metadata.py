@@ -0,0 +1,158 @@
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from mutagen import MutagenError
+from mutagen.id3 import ID3
+from mutagen.mp4 import MP4
+from renderer import extract_date
+
+logger = logging.getLogger(__name__)
+
+METADATA_FILE = "tag_metadata.json"
+# Tag frames (ID3) and atoms (MP4) of each field
+ID3_FIELDS = {"title": "TIT2", "artist": "TPE1", "album": "TALB", "date": "TDRC"}
+MP4_FIELDS = {"title": "\xa9nam", "artist": "\xa9ART", "album": "\xa9alb", "date": "\xa9day"}
+
+def read_tag_metadata(audio_path):
+    '''
+        Returns {"title", "artist", "album", "date"} from the tags of an audio file, missing fields are left out
+        Only the tag is parsed, never the audio frames
+    '''
+    metadata = {}
+    try:
+        if audio_path.lower().endswith(".m4a"):
+            tags = MP4(audio_path).tags or {}
+            for field, atom in MP4_FIELDS.items():
+                if tags.get(atom):
+                    metadata[field] = str(tags[atom][0]).strip()
+        elif audio_path.lower().endswith(".mp3"):
+            tags = ID3(audio_path)
+            for field, frame_id in ID3_FIELDS.items():
+                frame = tags.get(frame_id)
+                if frame is not None and frame.text:
+                    metadata[field] = str(frame.text[0]).strip()
+    except (MutagenError, OSError) as e:
+        logger.debug("No tags read from %s: %s", audio_path, e)
+    return {field: value for field, value in metadata.items() if value}
+
+def tag_date(value):
+    '''
+        Returns (YYYY, MM, DD) of a tag date such as "2024-01-05" or "2024-01-05T10:00:00", or None for a partial date
+    '''
+    match = re.match(r"(\d{4})-(\d{2})-(\d{2})", value or "")
+    return match.groups() if match else None
+
+def metadata_name(file_name, metadata):
+    '''
+        Returns a name in the "Speaker - YYYY-MM-DD - Title.ext" form the renderer reads, built from the tags
+        Fields missing from the tags come from the file name; without a full date in either the file name is kept
+    '''
+    DD, MM, YYYY, [heading, subheading] = extract_date(file_name)
+    date = tag_date(metadata.get("date"))
+    if date is not None:
+        YYYY, MM, DD = date
+    if DD is None:
+        return file_name
+    heading = metadata.get("artist") or metadata.get("album") or heading
+    title = metadata.get("title") or subheading.strip('"')
+    extension = os.path.splitext(file_name)[1]
+    return " - ".join(part for part in [heading, f"{YYYY}-{MM}-{DD}", title] if part) + extension
+
+class MetadataIndex:
+    """
+    Tag metadata of audio files kept in the cache directory, keyed by path with the size and modification time
+    the tags were read at, so reruns only read files that changed.
+    Files are read in parallel. Safe to use from several pipeline workers at once.
+    """
+    def __init__(self, cache_dir=None, workers=8):
+        self.path = os.path.join(cache_dir, METADATA_FILE) if cache_dir else None
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.entries = {}  # absolute path -> {"size", "mtime", "tags"}
+        self.changed = False
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("Could not read the tag metadata cache: %s", e)
+
+    def _cached(self, path, stat):
+        entry = self.entries.get(path)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            return entry["tags"]
+        return None
+
+    def get_many(self, audio_paths):
+        '''
+            Returns {audio path: metadata} for every path, reading the tags of new or changed files in parallel
+        '''
+        result = {}
+        missing = []
+        for audio_path in audio_paths:
+            path = os.path.abspath(audio_path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                result[audio_path] = {}
+                continue
+            tags = self._cached(path, stat)
+            if tags is None:
+                missing.append((audio_path, path, stat))
+            else:
+                result[audio_path] = tags
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(missing))) as executor:
+                read = list(executor.map(read_tag_metadata, [path for _, path, _ in missing]))
+            with self.lock:
+                for (audio_path, path, stat), tags in zip(missing, read):
+                    self.entries[path] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "tags": tags}
+                    result[audio_path] = tags
+                self.changed = True
+        return result
+
+    def refresh(self, audio_path):
+        '''
+            Records the new size and modification time of a file whose cover was just embedded
+            Embedding leaves the title, artist and date alone, so the next run does not read the tags again
+        '''
+        path = os.path.abspath(audio_path)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None:
+                return
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return
+            entry["size"], entry["mtime"] = stat.st_size, stat.st_mtime_ns
+            self.changed = True
+
+    def save(self):
+        with self.lock:
+            if not self.path or not self.changed:
+                return
+            try:
+                with open(self.path, "w") as f:
+                    json.dump(self.entries, f)
+                self.changed = False
+            except OSError as e:
+                logger.warning("Could not save the tag metadata cache: %s", e)
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_metadata_index():
+    '''
+        Returns the shared metadata index, loaded from the cache directory on first use
+    '''
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                from cached_data import get_cache_dir
+                _index = MetadataIndex(get_cache_dir())
+    return _index
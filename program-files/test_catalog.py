@@ -0,0 +1,33 @@
+from catalog import Catalog, track_row
+
+
+def make_track(folder):
+    audio_path = str(folder / "Bob - 2024-01-02 - Talk.mp3")
+    return {"file": "Bob - 2024-01-02 - Talk.mp3", "audio_path": audio_path, "status": "embedded",
+            "style": "style-1"}
+
+
+def test_failed_rerender_keeps_artwork_hash(tmp_path):
+    catalog = Catalog(str(tmp_path / "catalog.sqlite"))
+    track = make_track(tmp_path)
+    catalog.record(track_row(track, [({"name": "embed", "embed": True}, b"cover")]))
+    [row] = catalog.query("search", text="Talk")
+    assert row["status"] == "embedded"
+    hash_before = catalog.connection.execute("SELECT artwork_hash FROM tracks").fetchone()[0]
+    assert hash_before is not None
+
+    track["style"] = "style-2"
+    catalog.record(track_row(track, error="render: font missing"))
+    row = dict(catalog.connection.execute("SELECT artwork_hash, style, status, error FROM tracks").fetchone())
+    assert row == {"artwork_hash": hash_before, "style": "style-1", "status": "failed",
+                   "error": "render: font missing"}
+    assert catalog.query("no-artwork") == []
+    assert len(catalog.query("failed")) == 1
+    catalog.close()
+
+
+def test_first_failure_has_no_artwork(tmp_path):
+    catalog = Catalog(str(tmp_path / "catalog.sqlite"))
+    catalog.record(track_row(make_track(tmp_path), error="render: No date found"))
+    assert [row["status"] for row in catalog.query("no-artwork")] == ["failed"]
+    catalog.close()
@@ -0,0 +1,56 @@
+import os
+import pytest
+from benchmark import write_silent_mp3, write_silent_m4a
+from embed_artwork import embed_artwork_file, read_embedded_cover
+
+MP3_FRAME = bytes([0xFF, 0xFB, 0x90, 0x64])
+
+
+def cover(size, fill=b"\x01"):
+    return b"\x89PNG\r\n\x1a\n" + fill * size
+
+
+def audio_offset(path):
+    with open(path, "rb") as f:
+        return f.read().index(MP3_FRAME)
+
+
+def snapshot(path):
+    with open(path, "rb") as f:
+        return os.stat(path).st_mtime_ns, f.read()
+
+
+@pytest.mark.parametrize("write_audio, name", [(write_silent_mp3, "track.mp3"), (write_silent_m4a, "track.m4a")])
+def test_same_cover_leaves_the_file_untouched(tmp_path, write_audio, name):
+    path = str(tmp_path / name)
+    write_audio(path)
+    assert embed_artwork_file(path, cover(1000)) in ("embedded", "rewritten")
+    before = snapshot(path)
+    assert embed_artwork_file(path, cover(1000)) == "unchanged"
+    assert snapshot(path) == before
+
+
+@pytest.mark.parametrize("write_audio, name", [(write_silent_mp3, "track.mp3"), (write_silent_m4a, "track.m4a")])
+def test_changed_cover_is_written(tmp_path, write_audio, name):
+    path = str(tmp_path / name)
+    write_audio(path)
+    embed_artwork_file(path, cover(1000))
+    assert embed_artwork_file(path, cover(1000, b"\x02")) in ("embedded", "rewritten")
+    assert read_embedded_cover(path) == cover(1000, b"\x02")
+
+
+def test_cover_that_fits_the_padding_is_written_in_place(tmp_path):
+    path = str(tmp_path / "track.mp3")
+    write_silent_mp3(path)
+    # The first cover moves the audio data and reserves padding for the next one
+    assert embed_artwork_file(path, cover(20000)) == "rewritten"
+    offset = audio_offset(path)
+    size = os.path.getsize(path)
+    # A somewhat larger cover, as after changing the darkness, fits the padding
+    assert embed_artwork_file(path, cover(24000, b"\x02")) == "embedded"
+    assert audio_offset(path) == offset
+    assert os.path.getsize(path) == size
+    assert read_embedded_cover(path) == cover(24000, b"\x02")
+    # A much larger one does not, the file is written again with new padding
+    assert embed_artwork_file(path, cover(200000, b"\x03")) == "rewritten"
+    assert audio_offset(path) > offset
@@ -0,0 +1,47 @@
+import os
+import naming
+from batch_runner import plan_tracks, output_collisions
+from watch_folder import scan_audio_files
+
+
+def touch(folder, *names):
+    for name in names:
+        open(os.path.join(folder, name), "wb").close()
+
+
+def plan(folder, files=None):
+    data = {"audio_folder": str(folder), "title": {}, "naming": "{index:03d}"}
+    return {track["file"]: os.path.basename(track["artwork_paths"]["cover"]) for track in plan_tracks(data, files)}
+
+
+def use_indexes(monkeypatch, tmp_path):
+    monkeypatch.setattr(naming, "_indexes", naming.FileIndexes(str(tmp_path / "cache")))
+
+
+def test_index_stays_when_a_file_sorts_between(tmp_path, monkeypatch):
+    (tmp_path / "cache").mkdir()
+    use_indexes(monkeypatch, tmp_path)
+    folder = tmp_path / "audio"
+    folder.mkdir()
+    touch(folder, "a.mp3", "c.mp3")
+    assert plan(folder) == {"a.mp3": "001.png", "c.mp3": "002.png"}
+
+    touch(folder, "b.mp3")
+    # A new process reads the numbers back from the cache directory
+    use_indexes(monkeypatch, tmp_path)
+    assert plan(folder) == {"a.mp3": "001.png", "b.mp3": "003.png", "c.mp3": "002.png"}
+    assert plan(folder, ["b.mp3"]) == {"b.mp3": "003.png"}
+    data = {"audio_folder": str(folder), "title": {}, "naming": "{index:03d}"}
+    assert output_collisions(data, plan_tracks(data, ["b.mp3"]), ["b.mp3"]) == {}
+
+
+def test_upper_case_extensions_are_numbered_like_the_watcher_finds_them(tmp_path, monkeypatch):
+    (tmp_path / "cache").mkdir()
+    use_indexes(monkeypatch, tmp_path)
+    folder = tmp_path / "audio"
+    folder.mkdir()
+    touch(folder, "a.mp3", "B.MP3", "notes.txt")
+    assert sorted(scan_audio_files(str(folder))) == ["B.MP3", "a.mp3"]
+    whole = plan(folder)
+    assert whole == {"B.MP3": "001.png", "a.mp3": "002.png"}
+    assert plan(folder, ["B.MP3"]) == {"B.MP3": "001.png"}
@@ -0,0 +1,22 @@
+import os
+import pytest
+from renderer import OUTPUT_PRESETS, get_outputs, output_path
+
+
+def test_cover_and_embed_presets_write_different_files():
+    outputs = get_outputs({"outputs": [OUTPUT_PRESETS["cover"], OUTPUT_PRESETS["embed"]]})
+    paths = {output["name"]: output_path("/music", "song.mp3", output) for output in outputs}
+    assert paths == {"cover": os.path.join("/music", "song.png"), "embed": os.path.join("/music", "song-600.png")}
+    assert [output["name"] for output in outputs if output.get("embed")] == ["embed"]
+
+
+def test_every_preset_combination_writes_distinct_files():
+    outputs = get_outputs({"outputs": list(OUTPUT_PRESETS.values())})
+    paths = [output_path("/music", "song.mp3", output) for output in outputs]
+    assert len(set(paths)) == len(paths)
+
+
+def test_clashing_outputs_are_rejected():
+    clash = dict(OUTPUT_PRESETS["cover"], name="small", size=300)
+    with pytest.raises(ValueError, match="cover and small"):
+        get_outputs({"outputs": [OUTPUT_PRESETS["cover"], clash]})
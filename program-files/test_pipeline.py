@@ -0,0 +1,93 @@
+import threading
+import time
+from pipeline import Pipeline
+
+
+def run_in_thread(pipeline, items, **kwargs):
+    thread = threading.Thread(target=pipeline.run, args=(items,), kwargs=kwargs, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_items_pass_through_every_stage():
+    results = []
+    pipeline = Pipeline([("double", lambda x: x * 2, 2), ("add", lambda x: x + 1, 2)], queue_size=2)
+    pipeline.run(range(20), on_result=results.append)
+    assert sorted(results) == [x * 2 + 1 for x in range(20)]
+    assert pipeline.get_stats()["add"]["processed"] == 20
+
+
+def test_slow_stage_bounds_the_queues():
+    release = threading.Event()
+    results = []
+
+    def slow(item):
+        release.wait()
+        return item
+
+    pipeline = Pipeline([("fast", lambda x: x, 1), ("slow", slow, 1)], queue_size=2)
+    thread = run_in_thread(pipeline, range(50), on_result=results.append)
+    time.sleep(0.2)
+    # The slow stage holds one item, its queue and the first stage's are full and the feeder waits
+    assert pipeline.queues[0].qsize() <= 2 and pipeline.queues[1].qsize() <= 2
+    assert len(results) == 0
+    release.set()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert len(results) == 50
+    assert all(stats["max_queue_depth"] <= 2 for stats in pipeline.get_stats().values())
+
+
+def test_cancel_drops_items_not_started_and_finishes():
+    cancel_event = threading.Event()
+    results = []
+    pipeline = Pipeline([("first", lambda x: x, 1), ("second", lambda x: x, 1)], queue_size=4)
+
+    def first(item):
+        # Cancel once the feeder has filled the first queue, those items were queued but never started
+        while not pipeline.queues[0].full():
+            time.sleep(0.01)
+        cancel_event.set()
+        return item
+
+    pipeline.stages[0] = ("first", first, 1)
+    thread = run_in_thread(pipeline, range(100), on_result=results.append, cancel_event=cancel_event)
+    thread.join(5)
+    assert not thread.is_alive()
+    assert results == [0]
+    # The four queued items, and the one the feeder was waiting to put when the queue was full
+    assert 4 <= pipeline.skipped <= 5
+    assert pipeline.get_stats()["first"]["processed"] == 1
+
+
+def test_errors_reach_on_error_and_other_items_finish():
+    errors = []
+    results = []
+
+    def fail_odd(item):
+        if item % 2:
+            raise ValueError(f"odd {item}")
+        return item
+
+    pipeline = Pipeline([("check", fail_odd, 2), ("pass", lambda x: x, 1)])
+    pipeline.run(range(10), on_result=results.append, on_error=lambda stage, item, error: errors.append(item))
+    assert sorted(results) == [0, 2, 4, 6, 8]
+    assert sorted(errors) == [1, 3, 5, 7, 9]
+    assert [(stage, item) for stage, item, _ in sorted(pipeline.errors, key=lambda e: e[1])][:1] == [("check", 1)]
+    assert pipeline.get_stats()["check"]["failed"] == 5
+
+
+def test_failing_callbacks_do_not_hang_the_run():
+    def raise_error(*args):
+        raise RuntimeError("callback failed")
+
+    def fail_some(item):
+        if item % 3 == 0:
+            raise ValueError("bad item")
+        return item
+
+    pipeline = Pipeline([("first", fail_some, 2), ("last", lambda x: x, 2)], queue_size=2)
+    thread = run_in_thread(pipeline, range(30), on_result=raise_error, on_error=raise_error)
+    thread.join(5)
+    assert not thread.is_alive()
+    assert pipeline.get_stats()["last"]["processed"] == 20
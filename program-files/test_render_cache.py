@@ -0,0 +1,59 @@
+import os
+import naming
+import render_cache
+import tag_metadata
+from benchmark import find_font, make_settings, make_source_image, write_silent_mp3
+from batch_runner import run_batch
+from render_cache import RenderCache, render_key
+
+NAME = "Speaker - 2024-03-10 - Morning Service.mp3"
+
+
+def test_oldest_entry_is_evicted_past_the_cap(tmp_path):
+    cache = RenderCache(str(tmp_path), max_bytes=250)
+    cache.put("a", b"a" * 100)
+    cache.put("b", b"b" * 100)
+    # Using "a" makes "b" the least recently used
+    assert cache.get("a") == b"a" * 100
+    cache.put("c", b"c" * 100)
+    assert cache.peek("b") is None
+    assert not os.path.exists(tmp_path / "b")
+    assert cache.peek("a") == b"a" * 100
+    assert cache.peek("c") == b"c" * 100
+    assert cache.stats()["bytes"] == 200
+
+
+def test_fallback_fonts_are_part_of_the_key(monkeypatch):
+    fallback = {"path": "NotoSans-A.ttf"}
+
+    def text_runs(text, font_family):
+        if text.isascii():
+            return [(text, font_family)]
+        return [(text, fallback["path"])]
+    monkeypatch.setattr(render_cache, "text_runs", text_runs)
+
+    output = {"name": "cover"}
+    name = "Speaker - 2024-03-10 - Café Worship.mp3"
+    before = render_key("settings", name, output, ["Title.ttf", "Bar.ttf"])
+    ascii_before = render_key("settings", NAME, output, ["Title.ttf", "Bar.ttf"])
+    fallback["path"] = "NotoSans-B.ttf"
+    assert render_key("settings", name, output, ["Title.ttf", "Bar.ttf"]) != before
+    assert render_key("settings", NAME, output, ["Title.ttf", "Bar.ttf"]) == ascii_before
+
+
+def test_random_bar_color_never_uses_the_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(tag_metadata, "_index", tag_metadata.MetadataIndex(str(tmp_path)))
+    monkeypatch.setattr(naming, "_indexes", naming.FileIndexes(str(tmp_path)))
+    audio_folder = tmp_path / "audio"
+    audio_folder.mkdir()
+    write_silent_mp3(str(audio_folder / NAME))
+    image_path = str(tmp_path / "source.jpg")
+    make_source_image(image_path, (400, 300))
+    data = make_settings(str(audio_folder), image_path, find_font())
+    data["bottom_bar"]["color"] = "random"
+
+    cache = RenderCache(str(tmp_path / "renders"))
+    for _ in range(2):
+        summary = run_batch(data, render_cache=cache, catalog=None)
+        assert summary["failed"] == 0
+    assert cache.stats() == {"hits": 0, "misses": 0, "entries": 0, "bytes": 0}
@@ -0,0 +1,62 @@
+import pytest
+from PIL import Image, ImageStat
+from benchmark import find_font, make_settings, make_source_image
+from renderer import (MIN_TITLE_FONT_SIZE, TEXT_WIDTH_RATIO, fit_title, get_layout, get_px_size, mean_luminance,
+                      pick_title_color, scaled_font_size, title_fits, wrap_text)
+
+
+def title_settings(font_size):
+    data = make_settings("/music", "source.jpg", find_font())
+    data["title"]["font_size"] = font_size
+    return data
+
+
+def test_long_title_shrinks_to_fit():
+    data, layout = title_settings(200), get_layout()
+    title = "Walking In The Light Of The Gospel Through The Sunday Evening Prayer Service " * 2
+    font_size, heading_lines, subheading_lines = fit_title(data, title, "", layout)
+    assert MIN_TITLE_FONT_SIZE < font_size < scaled_font_size(200, layout)
+    lines = heading_lines + subheading_lines
+    font_family = data["title"]["font_family"]
+    assert all(get_px_size(line, font_family, font_size)[0] <= layout["width"] * TEXT_WIDTH_RATIO for line in lines)
+    assert title_fits(lines, font_family, font_size, layout["width"], layout["height"] - layout["bar_height"])
+    # One size up would no longer fit
+    larger = wrap_text(title, font_family, font_size + 1, layout["width"])
+    assert not title_fits(larger, font_family, font_size + 1, layout["width"], layout["height"] - layout["bar_height"])
+
+
+def test_short_title_keeps_the_chosen_size():
+    data, layout = title_settings(60), get_layout()
+    font_size, heading_lines, _ = fit_title(data, "Hope", "", layout)
+    assert font_size == scaled_font_size(60, layout)
+    assert heading_lines == ["Hope"]
+
+
+def test_size_never_goes_below_the_minimum():
+    data, layout = title_settings(200), get_layout()
+    font_size, _, _ = fit_title(data, "Gospel " * 2000, "", layout)
+    assert font_size == scaled_font_size(MIN_TITLE_FONT_SIZE, layout)
+
+
+@pytest.mark.parametrize("size, tolerance", [((800, 600), 1e-9), ((3000, 2000), 2.0)])
+def test_mean_luminance_matches_imagestat(tmp_path, size, tolerance):
+    # Images larger than the table are measured on a downscaled copy, so only roughly
+    path = str(tmp_path / "source.jpg")
+    make_source_image(path, size)
+    image = Image.open(path)
+    width, height = size
+    for box in [(0, 0, width, height), (10, 20, 210, 120), (width // 2, height // 3, width, height - 8)]:
+        expected = ImageStat.Stat(image.convert("L").crop(box)).mean[0]
+        assert mean_luminance(image, box) == pytest.approx(expected, abs=tolerance)
+    assert mean_luminance(image, (width, 0, width + 50, 50)) is None
+
+
+@pytest.mark.parametrize("fill, color", [((235, 235, 220), "black"), ((20, 25, 40), "white")])
+def test_title_color_contrasts_with_the_background(fill, color):
+    data = make_settings("/music", "source.jpg", find_font())
+    # Only the crop under the title counts, the rest of the image is the opposite
+    image = Image.new("RGB", (1000, 1000), tuple(255 - value for value in fill))
+    image.paste(fill, (100, 100, 900, 300))
+    result = pick_title_color(data, ["Morning Service"], [(150, 150)], image, image, 50)
+    assert result["title"]["color"] == color
+    assert data["title"]["color"] == "#ffffff"
@@ -0,0 +1,241 @@
+import json
+import logging
+import os
+import stat
+import threading
+import time
+from batch_runner import plan_tracks, make_job, process_track, TemplateCache, output_collisions
+from tag_metadata import get_metadata_index
+from catalog import record_track
+from cached_data import get_cache_dir
+from renderer import is_audio_file
+
+try:
+    # Linux only, without it the folder is polled
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+logger = logging.getLogger(__name__)
+
+WATCH_INDEX_FILE = "watch_index.json"
+
+def scan_audio_files(folder):
+    '''
+        Returns {file name: (size, mtime_ns)} for the audio files in folder
+    '''
+    signatures = {}
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file() and is_audio_file(entry.name):
+                file_stat = entry.stat()
+                signatures[entry.name] = (file_stat.st_size, file_stat.st_mtime_ns)
+    return signatures
+
+class FolderWatcher:
+    """
+    Renders and embeds artwork for audio files as they appear or change in data["audio_folder"].
+    Files are only processed once their size and modification time have stopped changing for settle_seconds,
+    so a recording that is still being copied is never tagged halfway.
+    Fonts, the prepared base image and the settings stay loaded between files.
+    With inotify only the files named in its events are looked at, the folder is scanned again only when the
+    event queue overflowed. Without it the folder is scanned every poll_interval.
+    With a cache_dir the signatures of the processed files are saved when watching stops, a restart then only
+    processes the files that are new or changed since, whatever process_existing says.
+    """
+    def __init__(self, data, poll_interval=2.0, settle_seconds=3.0, process_existing=False, on_track_done=None,
+                 on_track_error=None, render_cache=None, cache_dir=None):
+        self.data = data
+        self.folder = data["audio_folder"]
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.on_track_done = on_track_done
+        self.on_track_error = on_track_error
+        self.render_cache = render_cache
+        self.stop_event = threading.Event()
+        self.job_key = None
+        self.job = None
+        # Kept across jobs, so a settings change only prepares the images that changed
+        self.templates = TemplateCache()
+        self.index_path = os.path.join(cache_dir, WATCH_INDEX_FILE) if cache_dir else None
+        # Signatures of files as we last processed them, embedding changes the file so we record it afterwards
+        self.processed = self.load_index()
+        if self.processed is None:
+            self.processed = {} if process_existing else scan_audio_files(self.folder)
+        # file name -> (signature, monotonic time it was first seen with that signature)
+        self.pending = {}
+        self.inotify = None
+        if INotify is not None:
+            self.inotify = INotify()
+            self.inotify.add_watch(self.folder, inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO
+                                   | inotify_flags.MOVED_FROM | inotify_flags.CREATE | inotify_flags.MODIFY
+                                   | inotify_flags.DELETE)
+        logger.info("Watching %s (%s)", self.folder, "inotify" if self.inotify else "polling")
+
+    def stop(self):
+        self.stop_event.set()
+
+    def load_index(self):
+        '''
+            Returns the saved {file name: signature} of the folder, or None when it was never watched
+        '''
+        if not self.index_path or not os.path.exists(self.index_path):
+            return None
+        try:
+            with open(self.index_path) as f:
+                folder = json.load(f).get(os.path.abspath(self.folder))
+        except (OSError, ValueError) as e:
+            logger.warning("Could not read the watch index: %s", e)
+            return None
+        return {name: tuple(signature) for name, signature in folder.items()} if folder is not None else None
+
+    def save_index(self):
+        if not self.index_path:
+            return
+        try:
+            folders = {}
+            if os.path.exists(self.index_path):
+                with open(self.index_path) as f:
+                    folders = json.load(f)
+            folders[os.path.abspath(self.folder)] = self.processed
+            temp_path = self.index_path + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump(folders, f)
+            os.replace(temp_path, self.index_path)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not save the watch index: %s", e)
+
+    def get_job(self):
+        '''
+            Prepares the base image again only when the source image or the image settings changed
+        '''
+        image_path = self.data["image_path"]
+        key = (image_path, os.stat(image_path).st_mtime_ns, self.data["darkness"], self.data["aspect_ratio"],
+               repr(self.data.get("outputs")), self.data.get("backgrounds"))
+        if key != self.job_key:
+            self.job = make_job(self.data, render_cache=self.render_cache, templates=self.templates)
+            self.job_key = key
+        return self.job
+
+    def wait_for_changes(self, timeout):
+        '''
+            Blocks until the folder may have changed or timeout seconds passed
+            Returns the names of the files inotify saw change, or None when the whole folder has to be scanned
+        '''
+        if self.inotify is None:
+            self.stop_event.wait(timeout)
+            return None
+        events = self.inotify.read(timeout=int(timeout * 1000))
+        if any(event.mask & inotify_flags.Q_OVERFLOW for event in events):
+            logger.info("Missed changes in %s, scanning it again", self.folder)
+            return None
+        return {event.name for event in events}
+
+    def stat_files(self, names):
+        '''
+            Returns {file name: (size, mtime_ns)} of the audio files among names that still exist
+        '''
+        signatures = {}
+        for name in names:
+            if not is_audio_file(name):
+                continue
+            try:
+                file_stat = os.stat(os.path.join(self.folder, name))
+            except OSError:
+                continue
+            if stat.S_ISREG(file_stat.st_mode):
+                signatures[name] = (file_stat.st_size, file_stat.st_mtime_ns)
+        return signatures
+
+    def find_ready_files(self, changed=None):
+        '''
+            Returns the new or modified files whose signature has been stable for settle_seconds
+            changed names the files that may have changed since the last call, None scans the whole folder
+        '''
+        now = time.monotonic()
+        if changed is None:
+            current = scan_audio_files(self.folder)
+            gone = [name for name in self.processed if name not in current]
+        else:
+            # Settling files are looked at again even without events, to see that they stopped changing
+            names = set(changed) | set(self.pending)
+            current = self.stat_files(names)
+            gone = [name for name in names if name not in current]
+        for name in gone:
+            self.processed.pop(name, None)
+        ready = []
+        for name, signature in current.items():
+            if self.processed.get(name) == signature:
+                self.pending.pop(name, None)
+                continue
+            seen = self.pending.get(name)
+            if seen is None or seen[0] != signature:
+                self.pending[name] = (signature, now)
+            elif now - seen[1] >= self.settle_seconds:
+                ready.append(name)
+        for name in list(self.pending):
+            if name not in current:
+                del self.pending[name]
+        return sorted(ready)
+
+    def process(self, files):
+        job = self.get_job()
+        tracks = plan_tracks(self.data, files, job)
+        clashing = {file: path for path, writers in output_collisions(self.data, tracks, files).items()
+                    for file in writers}
+        for track in tracks:
+            try:
+                if track["file"] in clashing:
+                    raise ValueError(f"{os.path.basename(clashing[track['file']])} is also the artwork of another "
+                                     f"file, change the name template")
+                process_track(job, track)
+                logger.info("%s: %s", track["file"], track["status"])
+                if self.on_track_done:
+                    self.on_track_done(track)
+            except Exception as e:
+                logger.warning("Error processing %s: %s", track["file"], e)
+                record_track(track, error=e)
+                if self.on_track_error:
+                    self.on_track_error(track, e)
+            finally:
+                self.pending.pop(track["file"], None)
+                try:
+                    file_stat = os.stat(track["audio_path"])
+                    self.processed[track["file"]] = (file_stat.st_size, file_stat.st_mtime_ns)
+                except OSError:
+                    pass
+        get_metadata_index().save()
+
+    def run(self):
+        '''
+            Watches until stop() is called
+        '''
+        # The first pass scans the whole folder, later ones only what changed when inotify tells us
+        changed = None
+        try:
+            while not self.stop_event.is_set():
+                ready = self.find_ready_files(changed)
+                if ready:
+                    self.process(ready)
+                    changed = set()
+                    continue
+                # While files are settling wake up in time to pick them up, otherwise wait for the next change
+                timeout = min(self.poll_interval, self.settle_seconds) if self.pending else self.poll_interval
+                changed = self.wait_for_changes(timeout)
+        finally:
+            # Also on Ctrl+C, so a restart does not process the same files again
+            self.save_index()
+            get_metadata_index().save()
+            if self.inotify is not None:
+                self.inotify.close()
+
+def watch_folder(data, poll_interval=2.0, settle_seconds=3.0, process_existing=False, render_cache=None):
+    '''
+        Watches data["audio_folder"] until interrupted with Ctrl+C
+    '''
+    watcher = FolderWatcher(data, poll_interval=poll_interval, settle_seconds=settle_seconds,
+                            process_existing=process_existing, render_cache=render_cache, cache_dir=get_cache_dir())
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        logger.info("Stopped watching %s", watcher.folder)